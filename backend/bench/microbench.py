@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the per-request retrieval hot path.
+
+Runs keyword_context, extract_links, select_context, merge_links and
+RuleBasedProvider.answer against synthetic portfolios of growing size,
+recording ns/op and peak bytes allocated per call.
+
+Usage (from backend/):
+    python -m bench.microbench                      # run and print results
+    python -m bench.microbench --save               # store as new baselines
+    python -m bench.microbench --check              # fail on regressions
+    python -m bench.microbench --sizes tiny,large --only keyword_context
+"""
+import argparse
+import contextlib
+import gc
+import json
+import pathlib
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from bench.synthetic import SIZES, make_portfolio
+from retrieval import store
+from providers.rule_based import RuleBasedProvider
+
+BASELINE_PATH = pathlib.Path(__file__).resolve().parent / "baselines.json"
+
+QUESTIONS = [
+    "What projects have you built?",
+    "What is your tech stack?",
+    "Where did you work?",
+    "Tell me about yourself",
+]
+
+
+# ========================================
+# Measurement helpers
+# ========================================
+
+def _run_coroutine(coro):
+    """Drive a coroutine that never suspends, without an event loop."""
+    try:
+        coro.send(None)
+    except StopIteration as stop:
+        return stop.value
+    raise RuntimeError("Benchmarked coroutine suspended unexpectedly")
+
+
+def _time_per_op(fn: Callable[[], object], min_time: float, repeats: int) -> float:
+    """Return the best ns/op over `repeats` timed runs of at least `min_time` seconds."""
+    # Calibrate loop count so one run takes roughly min_time
+    loops = 1
+    while True:
+        start = time.perf_counter_ns()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter_ns() - start
+        if elapsed >= min_time * 1e9 or loops >= 1 << 20:
+            break
+        loops *= 2
+
+    best = elapsed / loops
+    for _ in range(repeats - 1):
+        start = time.perf_counter_ns()
+        for _ in range(loops):
+            fn()
+        best = min(best, (time.perf_counter_ns() - start) / loops)
+    return best
+
+
+def _peak_alloc_per_op(fn: Callable[[], object], calls: int = 5) -> int:
+    """Return the average peak bytes allocated by a single call."""
+    fn()  # warm caches so one-time loads are not counted
+    tracemalloc.start()
+    try:
+        total = 0
+        for _ in range(calls):
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+            total += peak - base
+        return total // calls
+    finally:
+        tracemalloc.stop()
+
+
+# ========================================
+# Benchmark cases
+# ========================================
+
+def _cases() -> Dict[str, Callable[[], object]]:
+    """Build the benchmark closures for the currently loaded portfolio."""
+    provider = RuleBasedProvider()
+    contexts = [store.keyword_context(None, q) for q in QUESTIONS]
+    context_links = [store.extract_links(c) for c in contexts]
+    provider_links = [
+        {"label": f"Project {i} - GitHub", "url": f"https://github.com/example/project-{i}"}
+        for i in range(0, 8, 2)
+    ]
+
+    def keyword_context():
+        for q in QUESTIONS:
+            store.keyword_context(None, q)
+
+    def select_context():
+        for q in QUESTIONS:
+            store.select_context(None, q)
+
+    def extract_links():
+        for c in contexts:
+            store.extract_links(c)
+
+    def merge_links():
+        for links in context_links:
+            store.merge_links(provider_links, links)
+
+    def rule_based_answer():
+        for q, c in zip(QUESTIONS, contexts):
+            _run_coroutine(provider.answer(q, c))
+
+    return {
+        "keyword_context": keyword_context,
+        "select_context": select_context,
+        "extract_links": extract_links,
+        "merge_links": merge_links,
+        "rule_based_answer": rule_based_answer,
+    }
+
+
+@contextlib.contextmanager
+def _synthetic_portfolio(size: str):
+    """Point the store at a temporary synthetic portfolio.json."""
+    original_path = store.PORTFOLIO_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        path = pathlib.Path(tmp) / "portfolio.json"
+        path.write_text(json.dumps(make_portfolio(size), ensure_ascii=False), encoding="utf-8")
+        store.PORTFOLIO_PATH = path
+        try:
+            store.reload_portfolio()
+            yield
+        finally:
+            store.PORTFOLIO_PATH = original_path
+            store.reload_portfolio()
+
+
+def run(sizes: List[str], only: List[str], min_time: float, repeats: int) -> Dict[str, Dict]:
+    """Run every case for every size. Keys look like 'keyword_context[large]'."""
+    results = {}
+    for size in sizes:
+        with _synthetic_portfolio(size):
+            for name, fn in _cases().items():
+                if only and name not in only:
+                    continue
+                gc.collect()
+                # Each case runs once per question, report per call
+                ns = _time_per_op(fn, min_time, repeats) / len(QUESTIONS)
+                alloc = _peak_alloc_per_op(fn) // len(QUESTIONS)
+                results[f"{name}[{size}]"] = {
+                    "ns_per_op": round(ns, 1),
+                    "alloc_peak_bytes": alloc,
+                }
+                print(f"{name + '[' + size + ']':<32} {ns:>14,.0f} ns/op {alloc:>12,} B/op", flush=True)
+    return results
+
+
+# ========================================
+# Baselines and regression gate
+# ========================================
+
+def save_baselines(results: Dict[str, Dict], path: pathlib.Path = BASELINE_PATH):
+    payload = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    path.write_text(json.dumps(payload, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+
+
+def check_regressions(
+    results: Dict[str, Dict],
+    baselines: Dict[str, Dict],
+    threshold: float,
+    alloc_threshold: float,
+) -> List[str]:
+    """Return human-readable regression messages (empty list means pass)."""
+    failures = []
+    for key, current in results.items():
+        base = baselines.get(key)
+        if not base:
+            continue
+        ratio = current["ns_per_op"] / max(base["ns_per_op"], 1.0)
+        if ratio > 1 + threshold:
+            failures.append(
+                f"{key}: {current['ns_per_op']:,.0f} ns/op vs baseline "
+                f"{base['ns_per_op']:,.0f} ({ratio:.2f}x)"
+            )
+        alloc_ratio = current["alloc_peak_bytes"] / max(base["alloc_peak_bytes"], 1)
+        if alloc_ratio > 1 + alloc_threshold:
+            failures.append(
+                f"{key}: {current['alloc_peak_bytes']:,} B/op vs baseline "
+                f"{base['alloc_peak_bytes']:,} ({alloc_ratio:.2f}x)"
+            )
+    return failures
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Retrieval hot-path microbenchmarks")
+    parser.add_argument("--sizes", default=",".join(SIZES), help="Comma-separated sizes")
+    parser.add_argument("--only", default="", help="Comma-separated case names")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds per timed run")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per case")
+    parser.add_argument("--baseline", type=pathlib.Path, default=BASELINE_PATH)
+    parser.add_argument("--save", action="store_true", help="Store results as baselines")
+    parser.add_argument("--check", action="store_true", help="Fail on regression vs baselines")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed ns/op slowdown")
+    parser.add_argument("--alloc-threshold", type=float, default=0.25, help="Allowed B/op growth")
+    parser.add_argument("--json", type=pathlib.Path, help="Also write results to this file")
+    args = parser.parse_args(argv)
+
+    sizes = [s for s in args.sizes.split(",") if s]
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        parser.error(f"Unknown sizes: {', '.join(unknown)}")
+    only = [o for o in args.only.split(",") if o]
+
+    results = run(sizes, only, args.min_time, args.repeats)
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+
+    if args.save:
+        save_baselines(results, args.baseline)
+        print(f"✓ Saved {len(results)} baselines to {args.baseline}")
+
+    if args.check:
+        if not args.baseline.exists():
+            print(f"❌ No baselines at {args.baseline}. Run with --save first.")
+            return 2
+        baselines = json.loads(args.baseline.read_text(encoding="utf-8"))["results"]
+        failures = check_regressions(results, baselines, args.threshold, args.alloc_threshold)
+        if failures:
+            print("\n❌ Regressions beyond threshold:")
+            for failure in failures:
+                print(f"   {failure}")
+            return 1
+        print(f"\n✅ No regressions (threshold {args.threshold:.0%})")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+End-to-end LLM provider benchmark.
+
+Drives providers through the same code the server uses (select_context
+for the context, then BaseProvider.stream(), which shares its request
+with answer()) on a fixed set of portfolio questions, and reports per
+provider and model:
+
+    - time to first token (TTFT) and total latency percentiles
+    - decode tokens/second (completion tokens after the first one)
+    - prompt / completion token counts (from the provider when it reports
+      them, else estimated at ~4 chars per token and marked as such)
+    - a cold run (fresh provider, first request) and warm runs at each
+      concurrency level of the sweep
+
+Usage (from backend/):
+    python -m bench.providers_bench --provider ollama:llama3.2:1b --provider ollama:llama3.2
+    python -m bench.providers_bench --provider hf_local --concurrency 1,2,4 --repeats 3
+    python -m bench.providers_bench --provider ollama --cold --json results/ollama.json
+    python -m bench.providers_bench --provider ollama --compare results/ollama.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import pathlib
+import platform
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from providers.registry import PROVIDERS, create_provider
+from retrieval import store
+
+# (question, section) pairs covering every section plus open questions
+QUESTIONS: List[Tuple[str, Optional[str]]] = [
+    ("What is your core tech stack?", "SKILLS"),
+    ("Tell me about your most impactful project", "PROJECTS"),
+    ("What did you do in your most recent role?", "EXPERIENCE"),
+    ("Where did you study and what did you focus on?", "EDUCATION"),
+    ("Which certifications do you hold?", "CERTIFICATIONS"),
+    ("Which cloud platforms have you used in production?", None),
+    ("What measurable impact did your data pipelines have?", None),
+    ("Summarize your background in three sentences", None),
+]
+
+
+# ========================================
+# Providers
+# ========================================
+
+def parse_spec(spec: str) -> Tuple[str, Optional[str]]:
+    """'ollama:llama3.2:1b' -> ('ollama', 'llama3.2:1b'); the model part is optional."""
+    name, _, model = spec.partition(":")
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown provider: {name} (choose from {', '.join(PROVIDERS)})")
+    return name, model or None
+
+
+def build_provider(name: str, model: Optional[str]):
+    """Instantiate a provider with its model env var pointed at `model`."""
+    model_var = PROVIDERS[name].model_env
+    previous = os.environ.get(model_var) if model_var else None
+    if model_var and model:
+        os.environ[model_var] = model
+    try:
+        return create_provider(name)
+    finally:
+        if model_var and model:
+            if previous is None:
+                os.environ.pop(model_var, None)
+            else:
+                os.environ[model_var] = previous
+
+
+def model_label(provider) -> str:
+    return getattr(provider, "model", None) or getattr(provider, "model_name", None) or "-"
+
+
+async def unload_ollama(provider) -> None:
+    """Ask Ollama to drop the model from memory so the next request is cold."""
+    async with httpx.AsyncClient(timeout=30) as client:
+        await client.post(f"{provider.host}/api/generate", json={"model": provider.model, "keep_alive": 0})
+
+
+# ========================================
+# Measurement
+# ========================================
+
+async def measure(provider, question: str, context: str) -> Dict:
+    """One streamed answer: TTFT, total time and token counts."""
+    usage: Dict[str, int] = {}
+    pieces: List[str] = []
+    ttft = None
+    started = time.perf_counter()
+    async for piece in provider.stream(question, context, usage=usage):
+        if ttft is None and piece:
+            ttft = time.perf_counter() - started
+        pieces.append(piece)
+    total = time.perf_counter() - started
+    text = "".join(pieces)
+
+    estimated = "completion_tokens" not in usage
+    completion = usage.get("completion_tokens") or max(1, math.ceil(len(text) / 4))
+    prompt = usage.get("prompt_tokens") or math.ceil(len(provider._build_prompt(question, context)) / 4)
+    ttft = ttft if ttft is not None else total
+    decode_time = total - ttft
+    streamed = sum(1 for piece in pieces if piece) > 1  # else TTFT == total and there's no decode rate
+    return {
+        "ttft_s": ttft,
+        "total_s": total,
+        "prompt_tokens": prompt,
+        "completion_tokens": completion,
+        "tokens_estimated": estimated,
+        # First token arrives at TTFT; the rest are decode
+        "decode_tps": (completion - 1) / decode_time if streamed and completion > 1 and decode_time > 0 else None,
+        "error": text.startswith("⚠️"),
+    }
+
+
+async def run_level(provider, items: List[Tuple[str, str]], concurrency: int, repeats: int) -> Dict:
+    """Every item `repeats` times with at most `concurrency` in flight."""
+    semaphore = asyncio.Semaphore(concurrency)
+    jobs = [item for _ in range(repeats) for item in items]
+
+    async def one(question: str, context: str) -> Dict:
+        async with semaphore:
+            return await measure(provider, question, context)
+
+    started = time.perf_counter()
+    samples = await asyncio.gather(*(one(q, c) for q, c in jobs))
+    wall = time.perf_counter() - started
+    return summarize(samples, wall)
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def summarize(samples: List[Dict], wall: float) -> Dict:
+    ok = [s for s in samples if not s["error"]]
+    ttft = [s["ttft_s"] for s in ok]
+    total = [s["total_s"] for s in ok]
+    tps = [s["decode_tps"] for s in ok if s["decode_tps"] is not None]
+    completion = sum(s["completion_tokens"] for s in ok)
+
+    def ms(value):
+        return round(value * 1000, 1) if value is not None else None
+
+    return {
+        "requests": len(samples),
+        "errors": len(samples) - len(ok),
+        "ttft_ms": {f"p{int(q * 100)}": ms(_percentile(ttft, q)) for q in (0.5, 0.9, 0.99)},
+        "total_ms": {f"p{int(q * 100)}": ms(_percentile(total, q)) for q in (0.5, 0.9, 0.99)},
+        "decode_tps_p50": round(_percentile(tps, 0.5), 1) if tps else None,
+        "prompt_tokens_mean": round(sum(s["prompt_tokens"] for s in ok) / len(ok), 1) if ok else None,
+        "completion_tokens_mean": round(completion / len(ok), 1) if ok else None,
+        "tokens_estimated": any(s["tokens_estimated"] for s in ok),
+        "throughput_rps": round(len(ok) / wall, 3) if wall else None,
+        "throughput_tps": round(completion / wall, 1) if wall else None,
+    }
+
+
+async def bench_provider(
+    spec: str, items: List[Tuple[str, str]], levels: List[int], repeats: int, warmup: int, cold: bool
+) -> Dict:
+    name, model = parse_spec(spec)
+    result: Dict = {"provider": name}
+
+    started = time.perf_counter()
+    provider = build_provider(name, model)
+    init_s = time.perf_counter() - started
+    result["model"] = model_label(provider)
+
+    if cold:
+        if name == "ollama":
+            await unload_ollama(provider)
+        first = await measure(provider, *items[0])
+        result["cold"] = {
+            "init_ms": round(init_s * 1000, 1),
+            "ttft_ms": round(first["ttft_s"] * 1000, 1),
+            "total_ms": round(first["total_s"] * 1000, 1),
+            "error": first["error"],
+        }
+
+    for i in range(warmup):
+        await measure(provider, *items[i % len(items)])
+
+    result["warm"] = {}
+    for level in levels:
+        result["warm"][str(level)] = summary = await run_level(provider, items, level, repeats)
+        print(_row(spec, level, summary), flush=True)
+    return result
+
+
+# ========================================
+# Output
+# ========================================
+
+HEADER = (
+    f"{'provider':<28} {'conc':>4} {'TTFT p50':>9} {'p90':>8} {'total p50':>10} {'p90':>8} "
+    f"{'p99':>8} {'tok/s':>7} {'prompt':>7} {'compl':>6} {'req/s':>6} {'err':>4}"
+)
+
+
+def _fmt(value, width: int) -> str:
+    return f"{value:>{width}}" if value is not None else f"{'-':>{width}}"
+
+
+def _row(spec: str, level: int, s: Dict) -> str:
+    estimated = "~" if s["tokens_estimated"] else ""
+    return (
+        f"{spec:<28} {level:>4} {_fmt(s['ttft_ms']['p50'], 9)} {_fmt(s['ttft_ms']['p90'], 8)} "
+        f"{_fmt(s['total_ms']['p50'], 10)} {_fmt(s['total_ms']['p90'], 8)} {_fmt(s['total_ms']['p99'], 8)} "
+        f"{_fmt(s['decode_tps_p50'], 7)} {_fmt(s['prompt_tokens_mean'], 7)} "
+        f"{estimated + str(s['completion_tokens_mean']):>6} {_fmt(s['throughput_rps'], 6)} {s['errors']:>4}"
+    )
+
+
+def compare(current: Dict, previous: Dict) -> List[str]:
+    """p50 TTFT/total and tokens/s deltas for (provider, model, concurrency) in both runs."""
+    def index(run: Dict) -> Dict:
+        return {
+            (r["provider"], r["model"], level): summary
+            for r in run["results"] for level, summary in r.get("warm", {}).items()
+        }
+
+    before, lines = index(previous), []
+    for key, now in index(current).items():
+        then = before.get(key)
+        if not then:
+            continue
+        parts = []
+        for label, new, old in (
+            ("TTFT p50", now["ttft_ms"]["p50"], then["ttft_ms"]["p50"]),
+            ("total p50", now["total_ms"]["p50"], then["total_ms"]["p50"]),
+            ("tok/s", now["decode_tps_p50"], then["decode_tps_p50"]),
+        ):
+            if new is not None and old:
+                parts.append(f"{label} {old} -> {new} ({(new - old) / old:+.0%})")
+        if parts:
+            lines.append(f"{key[0]}:{key[1]} @{key[2]}: " + ", ".join(parts))
+    return lines
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="LLM provider latency/throughput benchmark")
+    parser.add_argument("--provider", action="append", required=True,
+                        help="name[:model], e.g. ollama:llama3.2:1b or hf_local (repeatable)")
+    parser.add_argument("--concurrency", default="1", help="Comma-separated concurrency levels")
+    parser.add_argument("--repeats", type=int, default=1, help="Passes over the questions per level")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured requests before the warm runs")
+    parser.add_argument("--cold", action="store_true", help="Also time init + first request (unloads Ollama models)")
+    parser.add_argument("--limit", type=int, help="Use only the first N questions")
+    parser.add_argument("--json", type=pathlib.Path, help="Write results to this file")
+    parser.add_argument("--compare", type=pathlib.Path, help="Print deltas against an earlier --json file")
+    args = parser.parse_args(argv)
+
+    try:
+        levels = [int(c) for c in args.concurrency.split(",") if c]
+        for spec in args.provider:
+            parse_spec(spec)
+    except ValueError as e:
+        parser.error(str(e))
+
+    # Contexts come from the same retrieval path as /api/chat, built once up front
+    questions = QUESTIONS[:args.limit] if args.limit else QUESTIONS
+    items = [(question, store.select_context(section, question)) for question, section in questions]
+
+    print(HEADER)
+    results = []
+    for spec in args.provider:
+        try:
+            results.append(asyncio.run(bench_provider(spec, items, levels, args.repeats, args.warmup, args.cold)))
+        except Exception as e:
+            print(f"❌ {spec}: {type(e).__name__}: {e}")
+
+    run = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "timestamp": round(time.time()),
+        "questions": len(items),
+        "repeats": args.repeats,
+        "results": results,
+    }
+    if args.json:
+        args.json.parent.mkdir(parents=True, exist_ok=True)
+        args.json.write_text(json.dumps(run, indent=2) + "\n", encoding="utf-8")
+        print(f"✓ Wrote {args.json}")
+    if args.compare:
+        previous = json.loads(args.compare.read_text(encoding="utf-8"))
+        print("\nChange vs", args.compare)
+        for line in compare(run, previous) or ["(no matching provider/model/concurrency)"]:
+            print(f"   {line}")
+    return 0 if results else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
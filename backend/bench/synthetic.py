@@ -0,0 +1,102 @@
+"""
+Synthetic portfolio generator for benchmarks.
+Produces portfolio.json-shaped dicts from tiny to very large.
+"""
+import random
+from typing import Dict
+
+# Named sizes used by the benchmark suite
+SIZES = {
+    "tiny": {"skills": 5, "projects": 2, "experience": 1, "education": 1, "certifications": 1},
+    "small": {"skills": 20, "projects": 6, "experience": 4, "education": 2, "certifications": 3},
+    "medium": {"skills": 200, "projects": 60, "experience": 15, "education": 3, "certifications": 20},
+    "large": {"skills": 1000, "projects": 400, "experience": 40, "education": 4, "certifications": 100},
+    "xlarge": {"skills": 5000, "projects": 2000, "experience": 100, "education": 6, "certifications": 400},
+}
+
+_CATEGORIES = ["data", "database", "cloud", "ai", "analytics", "devops", "web"]
+_LEVELS = ["beginner", "intermediate", "advanced"]
+_WORDS = (
+    "pipeline model api dashboard warehouse stream feature latency forecast "
+    "anomaly ingestion quality schema cluster query report service metric"
+).split()
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words)).capitalize() + "."
+
+
+def make_portfolio(size: str = "small", seed: int = 0) -> Dict:
+    """
+    Build a deterministic synthetic portfolio of the given named size.
+    Same size + seed always yields the same data.
+    """
+    counts = SIZES[size]
+    rng = random.Random(seed)
+
+    skills = [
+        {
+            "name": f"Skill {i}",
+            "lastUsed": f"202{rng.randint(0, 5)}-{rng.randint(1, 12):02d}",
+            "level": rng.choice(_LEVELS),
+            "category": rng.choice(_CATEGORIES),
+        }
+        for i in range(counts["skills"])
+    ]
+
+    projects = []
+    for i in range(counts["projects"]):
+        project = {
+            "id": f"proj_{i}",
+            "name": f"Project {i}",
+            "stack": [f"Skill {rng.randrange(max(counts['skills'], 1))}" for _ in range(5)],
+            "summary": _sentence(rng, 14),
+            "impact": _sentence(rng, 10),
+            "repo": f"https://github.com/example/project-{i}" if i % 2 == 0 else "",
+            "demo": f"https://example.com/demo/{i}" if i % 3 == 0 else "",
+            "highlights": [_sentence(rng, 8) for _ in range(3)],
+        }
+        projects.append(project)
+
+    experience = [
+        {
+            "company": f"Company {i}",
+            "role": rng.choice(["Data Engineer", "Data Scientist", "Analyst"]),
+            "duration": f"20{10 + i % 15}-20{11 + i % 15}",
+            "location": "Remote",
+            "description": _sentence(rng, 16),
+            "achievements": [_sentence(rng, 10) for _ in range(3)],
+        }
+        for i in range(counts["experience"])
+    ]
+
+    education = [
+        {
+            "institution": f"University {i}",
+            "degree": "M.S.",
+            "field": "Information Systems",
+            "graduation": f"20{15 + i}",
+            "relevant_courses": [f"Course {j}" for j in range(6)],
+        }
+        for i in range(counts["education"])
+    ]
+
+    certifications = [
+        {
+            "name": f"Certification {i}",
+            "issuer": rng.choice(["AWS", "Snowflake", "Microsoft"]),
+            "date": f"202{rng.randint(0, 5)}",
+            "url": f"https://example.com/cert/{i}",
+        }
+        for i in range(counts["certifications"])
+    ]
+
+    return {
+        "about": _sentence(rng, 30),
+        "skills": skills,
+        "projects": projects,
+        "experience": experience,
+        "education": education,
+        "certifications": certifications,
+        "links": {"github": "https://github.com/example"},
+    }
@@ -7,8 +7,12 @@ Features:
 - Multiple LLM providers
 """
 import os
-from fastapi import FastAPI, Depends, HTTPException
+import asyncio
+import json
+import time
+from fastapi import FastAPI, Depends, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from typing import Optional
@@ -16,16 +20,42 @@ from typing import Optional
 # Load environment variables
 load_dotenv()
 
+# Route logging through the non-blocking queue before anything logs
+from observability.logs import setup_logging, get_logger, RequestContextMiddleware
+setup_logging()
+logger = get_logger("main")
+
+# Start tracemalloc before the heavy imports when MEMORY_TRACE=true
+from observability import memory, profiling, telemetry
+from observability.metrics import render as render_metrics
+from observability.debug import router as debug_router
+memory.setup_from_env()
+
 # Import providers
 from providers.base import BaseProvider
 from providers.rule_based import RuleBasedProvider
-from providers.ollama_local import OllamaProvider
-from providers.openai_provider import OpenAIProvider
-from providers.hf_inference import HFInferenceProvider, HFReplicateProvider
+from providers.registry import create_provider, provider_name_of
+from providers.prompting import usage_stats
 
 # Import retrieval
 from retrieval.router import router as retrieval_router
-from retrieval.store import select_context, extract_links, reload_portfolio, load_portfolio
+from retrieval.store import (
+    select_context, select_contexts, extract_links, merge_links,
+    reload_portfolio, load_portfolio, preload_retriever, reset_retriever
+)
+from retrieval.intent import current_intent_router, get_intent_router, reset_intent_router
+from retrieval.search_index import get_search_index
+
+# Import conversation memory and materialized answers
+from serving.conversations import get_conversation_store
+from serving.materialize import get_materializer
+from serving.deadlines import (
+    DeadlineExceeded, ClientDisconnected,
+    route_budget, request_budget, deadline_scope, remaining, run_cancellable
+)
+from serving.admission import (
+    Overloaded, LANE_CHEAP, LANE_INTERACTIVE, LANE_BATCH, get_admission
+)
 
 # ========================================
 # App setup
@@ -45,50 +75,74 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
 
+# Opt-in request profiling (PROFILE_SECRET / PROFILE_SAMPLE_RATE); inside
+# RequestContextMiddleware so profiles carry the request ID
+if profiling.enabled():
+    app.add_middleware(profiling.ProfilingMiddleware)
+
+# Request ID + log sampling for every request
+app.add_middleware(RequestContextMiddleware)
+
 # Include retrieval routes
 app.include_router(retrieval_router, prefix="/api")
 
+# Operator routes (/debug/*, need DEBUG_TOKEN)
+app.include_router(debug_router)
+
 # ========================================
 # Provider factory
 # ========================================
 
+# Provider instances are built once per process and reused across requests
+_provider_cache: dict[str, BaseProvider] = {}
+memory.register_component(
+    "providers",
+    lambda: {
+        f"{name}.{part}": size
+        for name, provider in list(_provider_cache.items())
+        for part, size in memory.provider_size(provider).items()
+    }
+)
+
+
 def get_provider() -> BaseProvider:
     """
-    Factory function to get the configured LLM provider.
+    Return the configured LLM provider, creating it on first use.
     """
     provider_name = os.getenv("PROVIDER", "ollama").lower()
     
+    provider = _provider_cache.get(provider_name)
+    if provider is None:
+        provider = _provider_cache[provider_name] = _create_provider(provider_name)
+    return provider
+
+
+def _create_provider(provider_name: str) -> BaseProvider:
+    """
+    Build the named LLM provider. Its module (and dependencies such as
+    httpx or transformers) is imported here, not at startup; see
+    providers/registry.py.
+    """
     try:
-        if provider_name == "rule_based":
-            return RuleBasedProvider()
-        
-        elif provider_name == "ollama":
-            return OllamaProvider()
-        
-        elif provider_name == "openai":
-            return OpenAIProvider()
-        
-        elif provider_name == "replicate":
-            return HFReplicateProvider()
-        
-        elif provider_name == "hf_inference":
-            return HFInferenceProvider()
-        
-        elif provider_name == "hf_local":
-            from providers.hf_local import HFLocalProvider
-            return HFLocalProvider()
-        
-        else:
-            raise ValueError(f"Unknown provider: {provider_name}")
+        return create_provider(provider_name)
     
     except Exception as e:
-        print(f"❌ Error initializing provider '{provider_name}': {e}")
-        print("ℹ️  Falling back to rule_based provider")
+        logger.error(
+            "Error initializing provider, falling back to rule_based",
+            extra={"fields": {"provider": provider_name, "error": str(e)}}
+        )
         return RuleBasedProvider()
 
 
+def _admitted_answer(provider: BaseProvider, lane: str, *args):
+    """provider.answer(*args), once the provider's admission control lets it run."""
+    admission = get_admission(provider_name_of(provider))
+    return admission.run(LANE_CHEAP if provider.cheap else lane, provider.answer, *args)
+
+
 # ========================================
 # Request/Response models
 # ========================================
@@ -105,54 +159,237 @@ class ChatResponse(BaseModel):
     chips: list[str]
 
 
+class BatchChatRequest(BaseModel):
+    requests: list[ChatRequest]
+    stream: bool = False
+
+
+class BatchChatResult(BaseModel):
+    index: int
+    answer: str = ""
+    links: list[dict] = []
+    chips: list[str] = []
+    error: Optional[str] = None
+
+
+class BatchChatResponse(BaseModel):
+    results: list[BatchChatResult]
+
+
+def _build_response(
+    body: ChatRequest, context: str, answer_text: str, provider_links: list[dict]
+) -> ChatResponse:
+    """Attach links and chips to a provider answer."""
+    # Extract links from context
+    context_links = extract_links(context)
+    
+    # Combine links (prefer provider links, then context links)
+    unique_links = merge_links(provider_links, context_links)
+    
+    # Create chips (section tags)
+    chips = [body.section] if body.section else ["Overview"]
+    
+    return ChatResponse(
+        answer=answer_text,
+        links=unique_links,
+        chips=chips
+    )
+
+
 # ========================================
 # Main chat endpoint
 # ========================================
 
+CHAT_DEADLINE = route_budget("CHAT_DEADLINE", 120.0)
+
+# Intent router: confident lookups are answered from templates (no LLM call)
+INTENT_THRESHOLD = float(os.getenv("INTENT_THRESHOLD", "0.85"))
+INTENT_ROUTE_THRESHOLD = float(os.getenv("INTENT_ROUTE_THRESHOLD", "0.6"))
+_template_provider = RuleBasedProvider()
+
+
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat(
     body: ChatRequest,
+    request: Request,
     provider: BaseProvider = Depends(get_provider)
 ):
     """
     Main chat endpoint.
+    
+    Generation is cancelled when the client disconnects or the request's
+    budget (CHAT_DEADLINE, or a shorter X-Request-Timeout) runs out. The
+    budget covers the whole request, retrieval included.
     """
+    arrived = time.monotonic()
+    budget = request_budget(request, CHAT_DEADLINE)
     try:
-        # Get relevant context (auto-reloads if portfolio.json changed)
-        context = select_context(body.section, body.question)
+        # Canonical prompts are answered ahead of time
+        materializer = get_materializer(_materialize_answer)
+        cached = materializer.lookup(body.question, body.section) if materializer else None
+        if cached is not None:
+            if body.conversationId:
+                await asyncio.to_thread(
+                    get_conversation_store().append, body.conversationId, body.question, cached["answer"]
+                )
+            return ChatResponse(**cached)
         
-        # Generate answer using provider
-        answer_text, provider_links = await provider.answer(body.question, context)
+        conversations = get_conversation_store()
         
-        # Extract links from context
-        context_links = extract_links(context)
+        # Pure lookups ("list your certifications") don't need the LLM;
+        # for everything else the predicted section narrows retrieval
+        section = body.section
+        generation_profile = telemetry.DEFAULT_PROFILE
+        router = current_intent_router()
+        if router is not None:
+            intent = router.predict(body.question)
+            if intent.lookup and min(intent.confidence, intent.lookup_confidence) >= INTENT_THRESHOLD:
+                router.template_answers += 1
+                answer_text, provider_links = _template_provider.answer_intent(intent.section)
+                logger.debug(
+                    "Answered from template",
+                    extra={"fields": {"intent": intent.section, "confidence": round(intent.confidence, 3)}}
+                )
+                if body.conversationId:
+                    await asyncio.to_thread(conversations.append, body.conversationId, body.question, answer_text)
+                return _build_response(body, "", answer_text, provider_links)
+            if intent.confidence >= INTENT_ROUTE_THRESHOLD:
+                # Short lookups get a smaller token budget than deep-dives
+                generation_profile = telemetry.profile_for(intent.section, intent.lookup)
+                if section is None:
+                    section = intent.route_section
         
-        # Combine links (prefer provider links, then context links)
-        all_links = provider_links + context_links
-        unique_links = []
-        seen_urls = set()
-        for link in all_links:
-            if link["url"] not in seen_urls:
-                unique_links.append(link)
-                seen_urls.add(link["url"])
+        # Get relevant context (auto-reloads if portfolio.json changed)
+        context = select_context(section, body.question)
         
-        # Create chips (section tags)
-        chips = [body.section] if body.section else ["Overview"]
+        # Bounded history for follow-up questions (a file read with CONVERSATION_DB)
+        history = await asyncio.to_thread(conversations.history, body.conversationId) if body.conversationId else ""
         
-        return ChatResponse(
-            answer=answer_text,
-            links=unique_links[:4],
-            chips=chips
-        )
+        # Generate answer using provider (after admission control);
+        # providers size their own timeouts from what is left of the budget
+        with deadline_scope(budget, started=arrived), telemetry.profile_scope(generation_profile):
+            answer_text, provider_links = await run_cancellable(
+                request,
+                _admitted_answer(provider, LANE_INTERACTIVE, body.question, context, history),
+                timeout=remaining()
+            )
+        
+        if body.conversationId:
+            await asyncio.to_thread(conversations.append, body.conversationId, body.question, answer_text)
+        
+        return _build_response(body, context, answer_text, provider_links)
     
+    except DeadlineExceeded:
+        logger.warning("Chat deadline exceeded", extra={"fields": {"budget": budget}})
+        raise HTTPException(
+            status_code=504,
+            detail=f"No answer within {budget:g}s"
+        )
+    except ClientDisconnected:
+        logger.info("Client disconnected, generation cancelled")
+        # Nobody is listening; 499 only shows up in access logs
+        return Response(status_code=499)
+    except Overloaded as e:
+        logger.warning("Chat request shed", extra={"fields": {"reason": e.reason, "retry_after": e.retry_after}})
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests in progress, please retry shortly",
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
-        print(f"❌ Error in chat endpoint: {e}")
+        logger.exception("Error in chat endpoint")
         raise HTTPException(
             status_code=500,
             detail=f"Error generating response: {str(e)}"
         )
 
 
+async def _materialize_answer(question: str, section: Optional[str]) -> dict:
+    """Generate one canonical answer the same way /api/chat would."""
+    body = ChatRequest(question=question, section=section)
+    context = select_context(section, question)
+    # Background work: waits behind interactive requests
+    answer_text, provider_links = await _admitted_answer(get_provider(), LANE_BATCH, question, context)
+    return _build_response(body, context, answer_text, provider_links).model_dump()
+
+
+# ========================================
+# Batch chat endpoint (offline jobs)
+# ========================================
+
+# Shared by every batch request, so bulk jobs can't take over the provider
+_batch_slots = asyncio.Semaphore(int(os.getenv("BATCH_CONCURRENCY", "4")))
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "500"))
+BATCH_ITEM_DEADLINE = route_budget("BATCH_ITEM_DEADLINE", CHAT_DEADLINE)
+
+
+@app.post("/api/chat/batch", response_model=BatchChatResponse)
+async def chat_batch(
+    body: BatchChatRequest,
+    request: Request,
+    provider: BaseProvider = Depends(get_provider)
+):
+    """
+    Answer many questions in one call.
+    
+    Retrieval runs once for the whole batch (one encode + one index search
+    with RAG on), then provider calls fan out with at most BATCH_CONCURRENCY
+    in flight across all batch requests. Results come back in input order,
+    or as NDJSON lines in completion order when "stream" is true.
+    Batch items don't read or write conversation memory. Each item gets
+    BATCH_ITEM_DEADLINE seconds; everything is cancelled if the client leaves.
+    """
+    if len(body.requests) > BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large ({len(body.requests)} > {BATCH_MAX_SIZE})"
+        )
+    
+    # Encoding and searching up to BATCH_MAX_SIZE questions would block the loop
+    contexts = await asyncio.to_thread(select_contexts, [(r.section, r.question) for r in body.requests])
+    
+    async def answer_one(index: int) -> BatchChatResult:
+        item, context = body.requests[index], contexts[index]
+        async with _batch_slots:
+            try:
+                with deadline_scope(BATCH_ITEM_DEADLINE):
+                    answer_text, provider_links = await asyncio.wait_for(
+                        _admitted_answer(provider, LANE_BATCH, item.question, context), BATCH_ITEM_DEADLINE
+                    )
+            except (asyncio.TimeoutError, DeadlineExceeded):
+                return BatchChatResult(index=index, error="Deadline exceeded")
+            except Exception as e:
+                logger.warning(
+                    "Batch item failed",
+                    extra={"fields": {"index": index, "error": str(e)}}
+                )
+                return BatchChatResult(index=index, error=str(e))
+        response = _build_response(item, context, answer_text, provider_links)
+        return BatchChatResult(index=index, **response.model_dump())
+    
+    if body.stream:
+        async def lines():
+            tasks = [asyncio.ensure_future(answer_one(i)) for i in range(len(body.requests))]
+            try:
+                for finished in asyncio.as_completed(tasks):
+                    result = await finished
+                    yield json.dumps(result.model_dump(), ensure_ascii=False) + "\n"
+            finally:
+                for task in tasks:
+                    task.cancel()
+        
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+    
+    try:
+        results = await run_cancellable(
+            request, asyncio.gather(*(answer_one(i) for i in range(len(body.requests)))), timeout=None
+        )
+    except ClientDisconnected:
+        logger.info("Client disconnected, batch cancelled")
+        return Response(status_code=499)
+    return BatchChatResponse(results=list(results))
+
+
 # ========================================
 # Reload endpoint - NEW!
 # ========================================
@@ -187,16 +424,31 @@ async def health():
     """Health check endpoint."""
     provider_name = os.getenv("PROVIDER", "ollama")
     portfolio_data = load_portfolio()
+    materializer = get_materializer(_materialize_answer)
+    router = current_intent_router()
+    provider = _provider_cache.get(provider_name.lower())
     
     return {
         "status": "ok",
         "provider": provider_name,
         "rag_enabled": os.getenv("ENABLE_RAG", "false"),
         "portfolio_sections": list(portfolio_data.keys()) if portfolio_data else [],
-        "timeout": os.getenv("OLLAMA_TIMEOUT", "120")
+        "timeout": os.getenv("OLLAMA_TIMEOUT", "120"),
+        "materialized": materializer.stats() if materializer else None,
+        "intent_router": router.stats() if router else None,
+        "prompt_cache": usage_stats(),
+        "decoding": provider.stats() if hasattr(provider, "stats") else None,
+        "admission": get_admission(provider_name_of(provider)).stats() if provider else None,
+        "generation": telemetry.stats()
     }
 
 
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text format: admission queues and waits, and other counters."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/")
 async def root():
     """Root endpoint with API info."""
@@ -205,7 +457,9 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "chat": "/api/chat",
+            "chat_batch": "/api/chat/batch (POST)",
             "sections": "/api/sections",
+            "search": "/api/search?q=",
             "health": "/api/health",
             "reload": "/api/reload (POST)"
         },
@@ -220,6 +474,47 @@ async def root():
     }
 
 
+# ========================================
+# Preload (production server)
+# ========================================
+
+def preload():
+    """
+    Load the portfolio snapshot, vector index, search index, intent router
+    and provider models.
+    serve.py calls this in the parent process before forking workers,
+    so every worker shares these pages copy-on-write.
+    """
+    portfolio_data = load_portfolio()
+    preload_retriever()
+    get_search_index()
+    get_intent_router()
+    provider = get_provider()
+    logger.info(
+        "Preloaded shared state",
+        extra={"fields": {
+            "sections": len(portfolio_data),
+            "provider": type(provider).__name__,
+        }}
+    )
+
+
+def reload_shared_state():
+    """
+    Rebuild everything preload() loads from the current files and .env:
+    the portfolio, the vector index and its encoder, the intent router and
+    the provider (e.g. a new OLLAMA_MODEL or HF_MODEL). serve.py calls this
+    on SIGHUP before replacing workers. Settings read at import time
+    (thresholds, deadlines, pool sizes) still need a full restart.
+    """
+    load_dotenv(override=True)
+    reload_portfolio()
+    reset_retriever()
+    reset_intent_router()
+    _provider_cache.clear()
+    preload()
+
+
 # ========================================
 # Startup event
 # ========================================
@@ -244,9 +539,19 @@ async def startup_event():
     # Load portfolio on startup
     portfolio_data = load_portfolio()
     print(f"📦 Loaded {len(portfolio_data)} portfolio sections")
+    
+    # Load (or train) the intent router before the first request, off the loop
+    await asyncio.to_thread(get_intent_router)
+    
+    # Start answering canonical prompts in the background
+    materializer = get_materializer(_materialize_answer)
+    if materializer:
+        materializer.ensure_fresh()
 
 
 if __name__ == "__main__":
+    # Development server (single process, auto-reload).
+    # For production use: python serve.py --workers N
     import uvicorn
     uvicorn.run(
         "main:app",
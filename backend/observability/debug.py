@@ -0,0 +1,76 @@
+"""
+Operator-only debug routes.
+
+Disabled (404) unless DEBUG_TOKEN is set; requests must then send the
+token in an X-Debug-Token header.
+
+Env vars:
+    DEBUG_TOKEN: Shared secret for /debug/* (default: unset = routes disabled)
+"""
+import hmac
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+
+from . import memory
+from .profiling import get_profiler
+
+
+def require_debug_token(x_debug_token: Optional[str] = Header(default=None)) -> None:
+    expected = os.getenv("DEBUG_TOKEN", "")
+    if not expected:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_debug_token or not hmac.compare_digest(x_debug_token.encode(), expected.encode()):
+        raise HTTPException(status_code=403, detail="Invalid debug token")
+
+
+router = APIRouter(prefix="/debug", dependencies=[Depends(require_debug_token)])
+
+
+class TraceRequest(BaseModel):
+    """Switch tracemalloc on or off, or move the diff baseline to now."""
+    enabled: Optional[bool] = None
+    frames: int = 1
+    reset_baseline: bool = False
+
+
+@router.get("/memory")
+def memory_report(top: int = 20, diff: bool = True):
+    """
+    RSS, per-component estimates, live HTTP clients and (with tracing on)
+    the top allocation sites, by growth since the baseline when `diff`.
+    Walks the heap, so it runs in the threadpool rather than the event loop.
+    """
+    return memory.report(top=max(1, min(top, 200)), diff=diff)
+
+
+@router.post("/memory/trace")
+async def memory_trace(body: TraceRequest):
+    """Runtime switch for tracemalloc."""
+    if body.enabled is True:
+        memory.start_tracing(max(1, min(body.frames, 50)))
+    elif body.enabled is False:
+        memory.stop_tracing()
+    elif body.reset_baseline:
+        memory.reset_baseline()
+    return memory.tracing_stats()
+
+
+@router.get("/profiles")
+async def list_profiles():
+    """Recent request profiles, newest first (see profiling.py to trigger one)."""
+    profiler = get_profiler()
+    return {"enabled": profiler is not None, "profiles": profiler.list() if profiler else []}
+
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: str):
+    """Collapsed stacks, one "frame;frame;frame count" line each (flamegraph.pl, speedscope)."""
+    profiler = get_profiler()
+    profile = profiler.get(profile_id) if profiler else None
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Unknown profile: {profile_id}")
+    return PlainTextResponse(profile.collapsed())
@@ -0,0 +1,230 @@
+"""
+Non-blocking structured logging for the request path.
+
+Records are handed to a bounded in-memory queue and written as JSON lines
+by a background thread, so a slow stdout or pipe never stalls the event
+loop. When the queue is full new records are dropped (and counted)
+instead of blocking the caller.
+
+Env vars:
+    LOG_LEVEL: Minimum level (default: INFO)
+    LOG_FORMAT: json or text (default: json)
+    LOG_SAMPLE_RATE: Fraction of requests whose sub-WARNING lines are kept (default: 1.0)
+    LOG_QUEUE_SIZE: Max records waiting to be written (default: 10000)
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+from typing import Optional
+
+# Per-request state, set by RequestContextMiddleware and visible to
+# retrieval and providers through contextvars
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+_sampled_var: contextvars.ContextVar[bool] = contextvars.ContextVar("log_sampled", default=True)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional["DroppingQueueHandler"] = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Return a logger; records flow through the shared queue once set up."""
+    return logging.getLogger(name)
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def current_request_id() -> str:
+    return request_id_var.get()
+
+
+# ========================================
+# Formatting and filtering
+# ========================================
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line. Extra fields go in `extra={"fields": {...}}`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            payload.update(fields)
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines for local development."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = (
+            f"{time.strftime('%H:%M:%S', time.localtime(record.created))} "
+            f"{record.levelname:<7} [{getattr(record, 'request_id', '-')}] "
+            f"{record.name}: {record.getMessage()}"
+        )
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Stamp the request ID on the record and apply per-request sampling.
+    Runs in the caller's thread, where the contextvars are visible.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        if record.levelno < logging.WARNING and not _sampled_var.get():
+            return False
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks: drops records when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve %-args now so the record no longer references caller state.
+        # Formatting itself happens on the listener thread.
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+# ========================================
+# Setup
+# ========================================
+
+def setup_logging() -> None:
+    """
+    Route all logging through the background queue. Safe to call twice.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    level = os.getenv("LOG_LEVEL", "INFO").upper()
+    fmt = os.getenv("LOG_FORMAT", "json").lower()
+    queue_size = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(TextFormatter() if fmt == "text" else JsonFormatter())
+
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    _queue_handler = DroppingQueueHandler(log_queue)
+    _queue_handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def _restart_after_fork() -> None:
+    """
+    The writer thread does not survive fork(). Give the child a fresh
+    queue (the old one's lock may have been held mid-fork) and thread.
+    """
+    global _listener
+    if _listener is None or _queue_handler is None:
+        return
+    log_queue: queue.Queue = queue.Queue(maxsize=_queue_handler.queue.maxsize)
+    _queue_handler.queue = log_queue
+    _listener = logging.handlers.QueueListener(log_queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def dropped_records() -> int:
+    return _queue_handler.dropped if _queue_handler else 0
+
+
+# ========================================
+# ASGI middleware
+# ========================================
+
+class RequestContextMiddleware:
+    """
+    Assign a request ID (from X-Request-ID or a new one) and a sampling
+    decision to every HTTP request, and echo the ID in the response.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.sample_rate = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or new_request_id()
+
+        id_token = request_id_var.set(request_id)
+        sampled_token = _sampled_var.set(
+            self.sample_rate >= 1.0 or random.random() < self.sample_rate
+        )
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", request_id.encode("latin-1")))
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(id_token)
+            _sampled_var.reset(sampled_token)
@@ -0,0 +1,330 @@
+"""
+Memory accounting for the long-lived parts of the backend.
+
+Every component that stays resident (portfolio data, encoded payloads,
+the vector index and its encoder, the intent router, conversations,
+provider models and caches) has an estimator returning its approximate
+footprint in bytes. Estimates come from the objects themselves (array
+and tensor sizes, a bounded walk over Python containers), so they are
+cheap enough to call from a debug endpoint but are not exact.
+
+tracemalloc can be switched on at runtime to see where Python
+allocations come from and how they grew since a baseline snapshot.
+It costs CPU and memory while on, so it is off unless asked for.
+
+Env vars:
+    MEMORY_TRACE: Start tracemalloc at startup (default: false)
+    MEMORY_TRACE_FRAMES: Stack frames stored per allocation (default: 1)
+"""
+import gc
+import os
+import sys
+import threading
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Union
+
+Estimate = Union[int, Dict[str, int]]
+
+_components: Dict[str, Callable[[], Estimate]] = {}
+_baseline: Optional[tracemalloc.Snapshot] = None
+_lock = threading.Lock()
+
+
+# ========================================
+# Size estimates
+# ========================================
+
+def deep_size(obj, limit: int = 200_000) -> int:
+    """
+    Bytes held by `obj` and everything it references through containers
+    and instance dicts, counting shared objects once. Stops after `limit`
+    objects so a huge structure can't stall the caller; numpy arrays count
+    their buffers.
+    """
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack and len(seen) < limit:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, type):
+            continue
+        seen.add(id(item))
+        nbytes = getattr(item, "nbytes", None)
+        if isinstance(nbytes, int) and hasattr(item, "dtype"):
+            total += nbytes if getattr(item, "base", None) is None else 0
+            continue
+        total += sys.getsizeof(item, 0)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)) or type(item).__name__ == "deque":
+            stack.extend(item)
+        elif hasattr(item, "__dict__"):
+            stack.append(vars(item))
+        elif hasattr(item, "__slots__"):
+            stack.extend(getattr(item, slot) for slot in item.__slots__ if hasattr(item, slot))
+    return total
+
+
+def torch_model_size(model) -> int:
+    """Parameters + buffers of a torch module."""
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+def encoder_size(encoder) -> int:
+    """Torch encoders count their weights; ONNX sessions count the model file."""
+    if getattr(encoder, "backend", "") == "torch":
+        return torch_model_size(encoder.model)
+    session = getattr(encoder, "session", None)
+    path = getattr(session, "_model_path", None)
+    return os.path.getsize(path) if path and os.path.exists(path) else 0
+
+
+def provider_size(provider) -> Dict[str, int]:
+    """Model weights and caches held by one provider instance."""
+    parts: Dict[str, int] = {}
+    pipe = getattr(provider, "pipe", None)
+    if pipe is not None:
+        parts["model"] = torch_model_size(pipe.model)
+    speculative = getattr(provider, "speculative", None)
+    if speculative is not None:
+        parts["draft_model"] = torch_model_size(speculative.draft)
+    prefix_states = getattr(provider, "_prefix_states", None)
+    if prefix_states is not None:
+        parts["prefix_states"] = deep_size(prefix_states)
+    parts["other"] = deep_size({
+        k: v for k, v in vars(provider).items() if k not in ("pipe", "speculative", "_prefix_states", "tokenizer")
+    })
+    return parts
+
+
+# ========================================
+# Components
+# ========================================
+
+def register_component(name: str, estimator: Callable[[], Estimate]) -> None:
+    """Add a component; `estimator` returns bytes or {part: bytes}."""
+    _components[name] = estimator
+
+
+def _module(name: str):
+    # Only look at modules the app already imported, never import for a report
+    return sys.modules.get(name)
+
+
+def _portfolio() -> Estimate:
+    store, snapshot = _module("retrieval.store"), _module("retrieval.snapshot")
+    return {
+        "data": deep_size(store._portfolio_cache) if store else 0,
+        "snapshot": deep_size(snapshot._snapshot) if snapshot else 0,
+    }
+
+
+def _payloads() -> Estimate:
+    payloads = _module("retrieval.payloads")
+    if payloads is None:
+        return 0
+    return sum(
+        sum(len(body) for body in payload.bodies.values())
+        for payload in list(payloads._payload_cache.values())
+    )
+
+
+def _dense_retriever() -> Estimate:
+    store = _module("retrieval.store")
+    retriever = store._dense_retriever if store else None
+    if retriever is None:
+        return 0
+    return {
+        "encoder": encoder_size(retriever.model),
+        "vectors": retriever.vectors.nbytes,
+        "chunks": deep_size(retriever.chunks),
+    }
+
+
+def _intent_router() -> Estimate:
+    intent = _module("retrieval.intent")
+    router = intent._router if intent else None
+    if router is None:
+        return 0
+    return router.weights.nbytes + router.bias.nbytes
+
+
+def _conversations() -> Estimate:
+    conversations = _module("serving.conversations")
+    store = conversations._store if conversations else None
+    return store.stats()["bytes"] if store else 0
+
+
+def _materialized() -> Estimate:
+    materialize = _module("serving.materialize")
+    materializer = materialize._materializer if materialize else None
+    return deep_size(materializer._answers) if materializer else 0
+
+
+for _name, _estimator in (
+    ("portfolio", _portfolio),
+    ("payloads", _payloads),
+    ("dense_retriever", _dense_retriever),
+    ("intent_router", _intent_router),
+    ("conversations", _conversations),
+    ("materialized", _materialized),
+):
+    register_component(_name, _estimator)
+
+
+def component_sizes() -> Dict[str, Dict[str, int]]:
+    """{component: {part: bytes, "total": bytes}}; failures are reported, not raised."""
+    sizes = {}
+    for name, estimator in list(_components.items()):
+        try:
+            estimate = estimator()
+        except Exception as e:
+            sizes[name] = {"total": 0, "error": str(e)}
+            continue
+        if isinstance(estimate, dict):
+            sizes[name] = dict(estimate, total=sum(estimate.values()))
+        else:
+            sizes[name] = {"total": int(estimate)}
+    return sizes
+
+
+def live_objects(type_names=("httpx.AsyncClient", "httpx.Client", "torch.Tensor")) -> Dict[str, int]:
+    """
+    Count live instances of a few types worth watching, as
+    "<top-level package>.<class>" (an HTTP client that is never closed
+    shows up here as a growing count). Walks the GC heap, so only call it
+    from debug tooling.
+    """
+    counts = dict.fromkeys(type_names, 0)
+    for obj in gc.get_objects():
+        cls = type(obj)
+        name = f"{cls.__module__.split('.')[0]}.{cls.__name__}"
+        if name in counts:
+            counts[name] += 1
+    return counts
+
+
+def rss_bytes() -> Dict[str, int]:
+    """Current and peak resident set size of this process (0 when unknown)."""
+    current = 0
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    current = int(line.split()[1]) * 1024
+                    break
+    except OSError:
+        pass
+
+    try:
+        import resource  # Unix only
+    except ImportError:
+        resource = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak *= 1 if sys.platform == "darwin" else 1024  # macOS reports bytes, Linux KiB
+        return {"rss": current or peak, "peak_rss": peak}
+
+    try:
+        import psutil  # optional: pip install psutil
+    except ImportError:
+        return {"rss": current, "peak_rss": current}
+    info = psutil.Process().memory_info()
+    # Windows reports the peak working set; elsewhere fall back to the current one
+    return {"rss": current or info.rss, "peak_rss": getattr(info, "peak_wset", 0) or current or info.rss}
+
+
+# ========================================
+# tracemalloc
+# ========================================
+
+def start_tracing(frames: int = 1) -> None:
+    """Start tracemalloc and take the baseline for later diffs."""
+    global _baseline
+    with _lock:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        _baseline = tracemalloc.take_snapshot()
+
+
+def stop_tracing() -> None:
+    global _baseline
+    with _lock:
+        tracemalloc.stop()
+        _baseline = None
+
+
+def reset_baseline() -> bool:
+    """Diff against now from here on. False if tracing is off."""
+    global _baseline
+    with _lock:
+        if not tracemalloc.is_tracing():
+            return False
+        _baseline = tracemalloc.take_snapshot()
+        return True
+
+
+def top_allocations(limit: int = 20, diff: bool = False, group_by: str = "lineno") -> List[Dict]:
+    """
+    Largest allocation sites (or the largest growth since the baseline
+    when `diff` is set). Empty when tracing is off.
+    """
+    if not tracemalloc.is_tracing():
+        return []
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    ))
+    with _lock:
+        baseline = _baseline
+    if diff and baseline is not None:
+        return [
+            {
+                "site": _site(stat.traceback),
+                "size": stat.size, "size_diff": stat.size_diff,
+                "count": stat.count, "count_diff": stat.count_diff,
+            }
+            for stat in snapshot.compare_to(baseline, group_by)[:limit]
+        ]
+    return [
+        {"site": _site(stat.traceback), "size": stat.size, "count": stat.count}
+        for stat in snapshot.statistics(group_by)[:limit]
+    ]
+
+
+def _site(traceback: tracemalloc.Traceback) -> str:
+    return " <- ".join(f"{frame.filename}:{frame.lineno}" for frame in traceback)
+
+
+def tracing_stats() -> Dict:
+    if not tracemalloc.is_tracing():
+        return {"enabled": False}
+    current, peak = tracemalloc.get_traced_memory()
+    return {
+        "enabled": True,
+        "frames": tracemalloc.get_traceback_limit(),
+        "traced": current,
+        "traced_peak": peak,
+        "overhead": tracemalloc.get_tracemalloc_memory(),
+        "baseline": _baseline is not None,
+    }
+
+
+def report(top: int = 20, diff: bool = True) -> Dict:
+    """Everything /debug/memory returns."""
+    components = component_sizes()
+    return {
+        "process": rss_bytes(),
+        "components": components,
+        "accounted": sum(c["total"] for c in components.values()),
+        "gc": {"counts": gc.get_count(), "objects": live_objects()},
+        "tracemalloc": tracing_stats(),
+        "top_allocations": top_allocations(top, diff=diff),
+    }
+
+
+def setup_from_env() -> None:
+    if os.getenv("MEMORY_TRACE", "false").lower() == "true":
+        start_tracing(int(os.getenv("MEMORY_TRACE_FRAMES", "1")))
@@ -0,0 +1,88 @@
+"""
+Prometheus text exposition for /api/metrics.
+
+Components register a collector that returns metric families; nothing
+is aggregated between scrapes beyond the counters components keep anyway.
+"""
+import bisect
+import math
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from .logs import get_logger
+
+logger = get_logger("observability.metrics")
+
+Labels = Dict[str, str]
+
+
+@dataclass
+class Family:
+    """One metric: name, type, help text and (sample suffix, labels, value) rows."""
+    name: str
+    kind: str  # counter | gauge | histogram
+    help: str
+    samples: List[Tuple[str, Labels, float]] = field(default_factory=list)
+
+    def add(self, value: float, suffix: str = "", **labels: str) -> "Family":
+        self.samples.append((suffix, labels, value))
+        return self
+
+
+class Histogram:
+    """Cumulative-bucket histogram; observe() is O(log buckets)."""
+
+    def __init__(self, buckets: Iterable[float] = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)):
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def add_to(self, family: Family, **labels: str) -> None:
+        running = 0
+        for bound, count in zip(self.buckets + [math.inf], self.counts):
+            running += count
+            family.add(running, "_bucket", **labels, le="+Inf" if bound == math.inf else f"{bound:g}")
+        family.add(self.sum, "_sum", **labels)
+        family.add(self.count, "_count", **labels)
+
+
+_collectors: List[Callable[[], Iterable[Family]]] = []
+
+
+def register_collector(collector: Callable[[], Iterable[Family]]) -> None:
+    _collectors.append(collector)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    value = float(value)
+    if value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def render() -> str:
+    lines = []
+    for collector in list(_collectors):
+        try:
+            families = list(collector())
+        except Exception as e:
+            logger.warning("Metrics collector failed", extra={"fields": {"error": str(e)}})
+            continue
+        for family in families:
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            for suffix, labels, value in family.samples:
+                label_text = ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items())
+                series = f"{family.name}{suffix}{{{label_text}}}" if labels else f"{family.name}{suffix}"
+                lines.append(f"{series} {_number(value)}")
+    return "\n".join(lines) + "\n"
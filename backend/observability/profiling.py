@@ -0,0 +1,347 @@
+"""
+On-demand per-request sampling profiler.
+
+A request is profiled when it carries a valid signed X-Profile header or
+is picked by PROFILE_SAMPLE_RATE. While at least one profile is running,
+a background thread samples Python stacks every PROFILE_INTERVAL_MS and
+attributes them to the request:
+
+    - event-loop thread: when the running task is the request's task or
+      one it spawned (tracked by a task factory)
+    - executor threads: while running work submitted from the request
+      (run_in_executor / asyncio.to_thread on the default executor)
+
+Stacks are stored in collapsed format ("frame;frame;frame count"), which
+flamegraph.pl, inferno and speedscope read directly, in a bounded ring
+buffer listed at /debug/profiles.
+
+With neither env var set nothing is installed: no middleware, task
+factory, executor wrapper or sampler thread.
+
+Env vars:
+    PROFILE_SECRET: HMAC key for the X-Profile header (default: unset = header ignored)
+    PROFILE_SAMPLE_RATE: Fraction of /api requests to profile (default: 0)
+    PROFILE_INTERVAL_MS: Sampling interval (default: 5)
+    PROFILE_RING_SIZE: Profiles kept for /debug/profiles (default: 50)
+    PROFILE_MAX_ACTIVE: Concurrent profiles; extra requests run unprofiled (default: 4)
+
+Usage:
+    PROFILE_SECRET=... python -m observability.profiling --sign --ttl 300
+    curl -H "X-Profile: <value>" ...    # response carries X-Profile-Id
+"""
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import contextvars
+import hashlib
+import hmac
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+import weakref
+from typing import Deque, Dict, List, Optional
+
+from .logs import current_request_id, get_logger
+
+logger = get_logger("observability.profiling")
+
+MAX_HEADER_TTL = 3600  # signed headers can't be minted for longer than this
+MAX_DEPTH = 128
+
+_profile_var: contextvars.ContextVar[Optional["Profile"]] = contextvars.ContextVar("profile", default=None)
+
+
+def enabled() -> bool:
+    return bool(os.getenv("PROFILE_SECRET")) or float(os.getenv("PROFILE_SAMPLE_RATE", "0")) > 0
+
+
+# ========================================
+# Signed trigger header
+# ========================================
+
+def sign_header(secret: str, ttl: int = 300) -> str:
+    """X-Profile value valid for `ttl` seconds: "<expires>.<hmac>"."""
+    expires = str(int(time.time()) + min(ttl, MAX_HEADER_TTL))
+    digest = hmac.new(secret.encode(), expires.encode(), hashlib.sha256).hexdigest()
+    return f"{expires}.{digest}"
+
+
+def verify_header(secret: str, value: str) -> bool:
+    expires, _, digest = value.partition(".")
+    if not expires.isdigit():
+        return False
+    now = time.time()
+    if not now < int(expires) <= now + MAX_HEADER_TTL:
+        return False
+    expected = hmac.new(secret.encode(), expires.encode(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(digest, expected)
+
+
+# ========================================
+# Profiles
+# ========================================
+
+class Profile:
+    """Samples collected for one request."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, request_id: str, method: str, path: str, trigger: str):
+        self.id = f"p{next(self._ids)}"
+        self.request_id = request_id
+        self.method = method
+        self.path = path
+        self.trigger = trigger
+        self.started = time.time()
+        self.duration_ms = 0.0
+        self.status: Optional[int] = None
+        self.samples = 0
+        self.stacks: Dict[str, int] = collections.Counter()
+        self.tasks: "weakref.WeakSet[asyncio.Task]" = weakref.WeakSet()
+        self.threads: Dict[int, int] = collections.Counter()  # executor thread id -> active jobs
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "request_id": self.request_id,
+            "method": self.method,
+            "path": self.path,
+            "trigger": self.trigger,
+            "started": round(self.started, 3),
+            "duration_ms": round(self.duration_ms, 2),
+            "status": self.status,
+            "samples": self.samples,
+            "stacks": len(self.stacks),
+        }
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    # Keep the path from the package root, e.g. retrieval/store.py
+    for marker in ("site-packages/", "/lib/python3", "/backend/"):
+        idx = filename.rfind(marker)
+        if idx >= 0:
+            filename = filename[idx + len(marker):]
+            if marker == "/lib/python3":
+                filename = filename.partition("/")[2]  # drop ".11/"
+            break
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def _collapse(frame, root: str) -> str:
+    names = []
+    while frame is not None and len(names) < MAX_DEPTH:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    names.append(root)
+    return ";".join(reversed(names))
+
+
+class Profiler:
+    """Owns the active profiles, the sampler thread and the ring buffer."""
+
+    def __init__(self, interval: float, ring_size: int, max_active: int):
+        self.interval = interval
+        self.max_active = max_active
+        self.finished: Deque[Profile] = collections.deque(maxlen=ring_size)
+        self._active: List[Profile] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+
+    # ---- lifecycle of one profile ----
+
+    def start(self, profile: Profile) -> bool:
+        with self._lock:
+            if len(self._active) >= self.max_active:
+                return False
+            self._active.append(profile)
+        self._wake.set()
+        return True
+
+    def stop(self, profile: Profile) -> None:
+        with self._lock:
+            if profile in self._active:
+                self._active.remove(profile)
+            profile.tasks = weakref.WeakSet()
+            self.finished.append(profile)
+
+    def get(self, profile_id: str) -> Optional[Profile]:
+        with self._lock:
+            return next((p for p in self.finished if p.id == profile_id), None)
+
+    def list(self) -> List[dict]:
+        with self._lock:
+            return [p.summary() for p in reversed(self.finished)]
+
+    # ---- hooks installed on the event loop ----
+
+    def install(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Task factory + executor wrapper + sampler; once per loop."""
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._loop_thread = threading.get_ident()
+
+        previous = loop.get_task_factory()
+
+        def task_factory(loop, coro, **kwargs):
+            task = previous(loop, coro, **kwargs) if previous else asyncio.Task(coro, loop=loop, **kwargs)
+            profile = _profile_var.get()
+            if profile is not None:
+                profile.tasks.add(task)
+            return task
+
+        loop.set_task_factory(task_factory)
+        loop.set_default_executor(_ProfilingExecutor())
+
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+            self._thread.start()
+
+    # ---- sampler ----
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait()
+            with self._lock:
+                active = list(self._active)
+                if not active:
+                    self._wake.clear()  # start() sets it again after appending
+                    continue
+            self._sample(active)
+            time.sleep(self.interval)
+
+    def _sample(self, active: List[Profile]) -> None:
+        frames = sys._current_frames()
+        loop_task = asyncio.current_task(self._loop) if self._loop is not None else None
+        for profile in active:
+            if loop_task is not None and loop_task in profile.tasks:
+                frame = frames.get(self._loop_thread)
+                if frame is not None:
+                    profile.stacks[_collapse(frame, "event-loop")] += 1
+                    profile.samples += 1
+            for thread_id, jobs in list(profile.threads.items()):
+                frame = frames.get(thread_id) if jobs > 0 else None
+                if frame is not None:
+                    profile.stacks[_collapse(frame, "executor")] += 1
+                    profile.samples += 1
+
+
+class _ProfilingExecutor(concurrent.futures.ThreadPoolExecutor):
+    """Default executor that tells the profiler which thread runs whose work."""
+
+    def __init__(self):
+        super().__init__(thread_name_prefix="asyncio")
+
+    def submit(self, fn, /, *args, **kwargs):
+        profile = _profile_var.get()
+        if profile is None:
+            return super().submit(fn, *args, **kwargs)
+
+        def run():
+            thread_id = threading.get_ident()
+            profile.threads[thread_id] += 1
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profile.threads[thread_id] -= 1
+
+        return super().submit(run)
+
+
+_profiler: Optional[Profiler] = None
+
+
+def get_profiler() -> Optional[Profiler]:
+    """The process-wide profiler, or None when profiling is not configured."""
+    global _profiler
+    if _profiler is None and enabled():
+        _profiler = Profiler(
+            interval=float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000,
+            ring_size=int(os.getenv("PROFILE_RING_SIZE", "50")),
+            max_active=int(os.getenv("PROFILE_MAX_ACTIVE", "4")),
+        )
+    return _profiler
+
+
+# ========================================
+# ASGI middleware
+# ========================================
+
+class ProfilingMiddleware:
+    """
+    Decide per request whether to profile it; add only when enabled().
+    Must sit inside RequestContextMiddleware so the request ID is set.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.profiler = get_profiler()
+        self.secret = os.getenv("PROFILE_SECRET", "")
+        self.sample_rate = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+
+    def _trigger(self, scope) -> Optional[str]:
+        if self.secret:
+            for name, value in scope.get("headers", []):
+                if name == b"x-profile":
+                    return "header" if verify_header(self.secret, value.decode("latin-1")) else None
+        if self.sample_rate > 0 and scope["path"].startswith("/api/") and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        trigger = self._trigger(scope) if scope["type"] == "http" else None
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        self.profiler.install(asyncio.get_running_loop())
+        profile = Profile(current_request_id(), scope["method"], scope["path"], trigger)
+        if not self.profiler.start(profile):
+            await self.app(scope, receive, send)
+            return
+
+        profile.tasks.add(asyncio.current_task())
+        token = _profile_var.set(profile)
+        started = time.perf_counter()
+
+        async def send_with_profile(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", profile.id.encode("latin-1")))
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            _profile_var.reset(token)
+            profile.duration_ms = (time.perf_counter() - started) * 1000
+            self.profiler.stop(profile)
+            logger.info(
+                "Request profiled",
+                extra={"fields": {"profile": profile.id, "samples": profile.samples, "ms": round(profile.duration_ms, 1)}}
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mint an X-Profile header value")
+    parser.add_argument("--sign", action="store_true", required=True)
+    parser.add_argument("--ttl", type=int, default=300, help=f"Seconds the value stays valid (max {MAX_HEADER_TTL})")
+    args = parser.parse_args()
+    secret = os.getenv("PROFILE_SECRET")
+    if not secret:
+        sys.exit("PROFILE_SECRET is not set")
+    print(sign_header(secret, args.ttl))
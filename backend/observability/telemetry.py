@@ -0,0 +1,247 @@
+"""
+Generation telemetry and per-intent token budgets.
+
+Providers report every generation (token counts, and the load / prefill /
+decode timings when the backend returns them) with record(). The last
+GEN_WINDOW calls are kept per provider and generation profile.
+
+A generation profile is picked from the question's intent before the
+provider is called (profile_scope()) and decides how long the answer may
+get: short lookups ("what's your email?") don't need the 300-400 tokens
+that a project deep-dive does, and decode time is most of the latency on
+CPU. Once a profile has GEN_MIN_SAMPLES answers, its max tokens follows
+the observed length distribution (p95 plus headroom, within the
+profile's floor and ceiling); if answers keep hitting the cap, the cap
+grows instead.
+
+Env vars:
+    GEN_ADAPTIVE: Size max tokens from observed answers (default: true)
+    GEN_WINDOW: Generations kept per provider and profile (default: 200)
+    GEN_MIN_SAMPLES: Answers needed before adapting a profile (default: 20)
+"""
+import collections
+import contextlib
+import contextvars
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Tuple
+
+from .metrics import Family, Histogram, register_collector
+
+ADAPTIVE = os.getenv("GEN_ADAPTIVE", "true").lower() == "true"
+WINDOW = int(os.getenv("GEN_WINDOW", "200"))
+MIN_SAMPLES = int(os.getenv("GEN_MIN_SAMPLES", "20"))
+
+HEADROOM = 1.25          # budget = p95 * HEADROOM
+TRUNCATED_GROW = 0.1     # more than this share of answers hit the cap -> grow it
+
+# The prompt ends with "Question: ...\n\nAnswer:"; models that keep going
+# start inventing the next turn
+STOP = ("\nQuestion:", "\nConversation so far:")
+
+
+@dataclass(frozen=True)
+class GenerationProfile:
+    name: str
+    max_tokens: int    # before there is data
+    floor: int
+    ceiling: int
+    stop: Tuple[str, ...] = STOP
+
+
+PROFILES: Dict[str, GenerationProfile] = {
+    "short": GenerationProfile("short", max_tokens=160, floor=64, ceiling=300),
+    "standard": GenerationProfile("standard", max_tokens=300, floor=128, ceiling=400),
+    "deep": GenerationProfile("deep", max_tokens=400, floor=200, ceiling=600),
+}
+DEFAULT_PROFILE = "standard"
+
+# Intent router label -> profile
+INTENT_PROFILES = {
+    "contact": "short",
+    "certifications": "short",
+    "education": "short",
+    "skills": "standard",
+    "overview": "standard",
+    "projects": "deep",
+    "experience": "deep",
+}
+
+
+@dataclass(frozen=True)
+class GenerationBudget:
+    profile: str
+    max_tokens: int
+    stop: Tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class Sample:
+    at: float
+    prompt_tokens: Optional[int]
+    completion_tokens: Optional[int]
+    total_s: Optional[float]
+    load_s: Optional[float]
+    prefill_s: Optional[float]
+    decode_s: Optional[float]
+    truncated: bool
+
+
+profile_var: contextvars.ContextVar[str] = contextvars.ContextVar("generation_profile", default=DEFAULT_PROFILE)
+
+
+def profile_for(intent: Optional[str], lookup: bool = False) -> str:
+    """Profile for an intent router prediction; lookups shorten the standard profile."""
+    profile = INTENT_PROFILES.get(intent or "", DEFAULT_PROFILE)
+    if lookup and profile == DEFAULT_PROFILE:
+        return "short"
+    return profile
+
+
+@contextlib.contextmanager
+def profile_scope(profile: str):
+    """Generations inside the block use (and are recorded under) `profile`."""
+    token = profile_var.set(profile if profile in PROFILES else DEFAULT_PROFILE)
+    try:
+        yield
+    finally:
+        profile_var.reset(token)
+
+
+# ========================================
+# Rolling store
+# ========================================
+
+_lock = threading.Lock()
+_samples: Dict[Tuple[str, str], Deque[Sample]] = {}
+_completion_hist: Dict[str, Histogram] = collections.defaultdict(
+    lambda: Histogram((16, 32, 64, 128, 192, 256, 320, 400, 512, 600))
+)
+
+
+def record(
+    provider: str,
+    *,
+    prompt_tokens: Optional[int] = None,
+    completion_tokens: Optional[int] = None,
+    total_s: Optional[float] = None,
+    load_s: Optional[float] = None,
+    prefill_s: Optional[float] = None,
+    decode_s: Optional[float] = None,
+    truncated: bool = False,
+) -> None:
+    """One finished generation under the current profile. Unknown values stay None."""
+    profile = profile_var.get()
+    sample = Sample(time.time(), prompt_tokens, completion_tokens, total_s, load_s, prefill_s, decode_s, truncated)
+    with _lock:
+        samples = _samples.get((provider, profile))
+        if samples is None:
+            samples = _samples[(provider, profile)] = collections.deque(maxlen=WINDOW)
+        samples.append(sample)
+        if completion_tokens is not None:
+            _completion_hist[profile].observe(completion_tokens)
+
+
+def _percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(math.ceil(q * len(values))) - 1)]
+
+
+def _lengths(profile: str) -> Tuple[List[int], int]:
+    """Completion lengths seen under a profile (all providers) and how many hit the cap."""
+    lengths, truncated = [], 0
+    with _lock:
+        for (_, name), samples in _samples.items():
+            if name != profile:
+                continue
+            for sample in samples:
+                if sample.completion_tokens is not None:
+                    lengths.append(sample.completion_tokens)
+                    truncated += sample.truncated
+    return lengths, truncated
+
+
+def budget(profile: Optional[str] = None) -> GenerationBudget:
+    """Max tokens and stop sequences for the next generation."""
+    spec = PROFILES[profile or profile_var.get()]
+    lengths, truncated = _lengths(spec.name)
+    if not ADAPTIVE or len(lengths) < MIN_SAMPLES:
+        return GenerationBudget(spec.name, spec.max_tokens, spec.stop)
+
+    if truncated / len(lengths) > TRUNCATED_GROW:
+        # p95 of cut-off answers is just the old cap; grow past it
+        max_tokens = int(max(lengths) * 1.5)
+    else:
+        max_tokens = int(math.ceil(_percentile(lengths, 0.95) * HEADROOM))
+    return GenerationBudget(spec.name, max(spec.floor, min(spec.ceiling, max_tokens)), spec.stop)
+
+
+# ========================================
+# Reporting
+# ========================================
+
+def _rate(tokens: List[Optional[int]], seconds: List[Optional[float]]) -> Optional[float]:
+    """Tokens per second over the samples that have both values."""
+    pairs = [(t, s) for t, s in zip(tokens, seconds) if t and s]
+    if not pairs:
+        return None
+    return sum(t for t, _ in pairs) / sum(s for _, s in pairs)
+
+
+def _summary(samples: List[Sample]) -> dict:
+    completion = [s.completion_tokens for s in samples if s.completion_tokens is not None]
+    loads = [s.load_s for s in samples if s.load_s is not None]
+    prefill = _rate([s.prompt_tokens for s in samples], [s.prefill_s for s in samples])
+    decode = _rate([s.completion_tokens for s in samples], [s.decode_s for s in samples])
+    return {
+        "generations": len(samples),
+        "completion_tokens_p50": _percentile(completion, 0.5) if completion else None,
+        "completion_tokens_p95": _percentile(completion, 0.95) if completion else None,
+        "truncated": sum(s.truncated for s in samples),
+        "load_s_mean": round(sum(loads) / len(loads), 3) if loads else None,
+        "prefill_tps": round(prefill, 1) if prefill else None,
+        "decode_tps": round(decode, 1) if decode else None,
+    }
+
+
+def stats() -> dict:
+    with _lock:
+        snapshot = {key: list(samples) for key, samples in _samples.items()}
+    by_provider: Dict[str, dict] = collections.defaultdict(dict)
+    for (provider, profile), samples in snapshot.items():
+        by_provider[provider][profile] = _summary(samples)
+    return {
+        "budgets": {name: budget(name).max_tokens for name in PROFILES},
+        "providers": dict(by_provider),
+    }
+
+
+def _collect():
+    max_tokens = Family("generation_max_tokens", "gauge", "Current max-token budget per profile")
+    generations = Family("generation_window_size", "gauge", "Generations in the rolling window")
+    load = Family("generation_load_seconds", "gauge", "Mean model load time per call (rolling window)")
+    prefill = Family("generation_prefill_tokens_per_second", "gauge", "Prompt evaluation rate (rolling window)")
+    decode = Family("generation_decode_tokens_per_second", "gauge", "Decode rate (rolling window)")
+    truncated = Family("generation_truncated", "gauge", "Answers in the window that hit max tokens")
+    completion = Family("generation_completion_tokens", "histogram", "Answer length in tokens")
+
+    for name in PROFILES:
+        max_tokens.add(budget(name).max_tokens, profile=name)
+    with _lock:
+        snapshot = {key: list(samples) for key, samples in _samples.items()}
+        for profile, hist in _completion_hist.items():
+            hist.add_to(completion, profile=profile)
+    for (provider, profile), samples in snapshot.items():
+        summary = _summary(samples)
+        generations.add(summary["generations"], provider=provider, profile=profile)
+        truncated.add(summary["truncated"], provider=provider, profile=profile)
+        for family, key in ((load, "load_s_mean"), (prefill, "prefill_tps"), (decode, "decode_tps")):
+            if summary[key] is not None:
+                family.add(summary[key], provider=provider, profile=profile)
+    return [max_tokens, generations, load, prefill, decode, truncated, completion]
+
+
+register_collector(_collect)
@@ -3,7 +3,8 @@ Base provider interface for all LLM providers.
 All providers must implement the answer() method.
 """
 import abc
-from typing import List, Dict, Tuple
+from typing import AsyncIterator, List, Dict, Optional, Tuple
+from .prompting import PromptParts
 
 
 class BaseProvider(abc.ABC):
@@ -16,31 +17,41 @@ class BaseProvider(abc.ABC):
         - links: List of relevant links (can be empty)
     """
     
+    # Answers without calling a model (admission control doesn't queue it)
+    cheap = False
+    
     @abc.abstractmethod
-    async def answer(self, question: str, context: str) -> Tuple[str, List[Dict]]:
+    async def answer(self, question: str, context: str, history: str = "") -> Tuple[str, List[Dict]]:
         """
         Generate an answer based on the question and context.
         
         Args:
             question: The user's question
             context: Relevant context from portfolio data
+            history: Earlier turns of this conversation (may be empty)
             
         Returns:
             Tuple of (answer_text, links_list)
         """
         pass
     
-    def _build_prompt(self, question: str, context: str) -> str:
+    async def stream(
+        self, question: str, context: str, history: str = "", usage: Optional[Dict[str, int]] = None
+    ) -> AsyncIterator[str]:
+        """
+        Yield the answer in pieces as they are generated. Providers that
+        can't stream yield the whole answer at once.
+        
+        If `usage` is given, providers that know their token counts fill
+        in "prompt_tokens" and "completion_tokens".
+        """
+        answer_text, _ = await self.answer(question, context, history)
+        yield answer_text
+    
+    def _build_prompt(self, question: str, context: str, history: str = "") -> str:
         """
         Helper method to build a consistent prompt format.
-        Can be overridden by subclasses if needed.
+        Static parts come first so servers can reuse the cached prefix
+        (see prompting.py). Can be overridden by subclasses if needed.
         """
-        return (
-            "You are a helpful AI assistant answering questions about a candidate's portfolio. "
-            "Use ONLY the information provided in the context below. "
-            "Be concise, professional, and include specific details from the context. "
-            "If the context doesn't contain relevant information, politely say so.\n\n"
-            f"Context:\n{context}\n\n"
-            f"Question: {question}\n\n"
-            "Answer:"
-        )
\ No newline at end of file
+        return PromptParts.build(question, context, history).text()
\ No newline at end of file
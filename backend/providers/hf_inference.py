@@ -5,8 +5,36 @@ Free tier available, can also train custom models.
 import os
 import httpx
 import asyncio
+import time
 from typing import List, Dict, Tuple
+from observability import telemetry
+from observability.logs import get_logger
+from serving.deadlines import timeout_for
+from . import retry
 from .base import BaseProvider
+from .prompting import PromptParts
+
+logger = get_logger("providers.hf_inference")
+
+
+def _wait_for_model(request: dict) -> None:
+    request["json"]["options"] = {"wait_for_model": True}
+
+
+def _record_replicate(metrics: dict, max_tokens: int) -> None:
+    """Replicate reports token counts and timings with a finished prediction."""
+    total = metrics.get("predict_time")
+    first_token = metrics.get("time_to_first_token")
+    completion = metrics.get("output_token_count")
+    telemetry.record(
+        "replicate",
+        prompt_tokens=metrics.get("input_token_count"),
+        completion_tokens=completion,
+        total_s=total,
+        prefill_s=first_token,
+        decode_s=total - first_token if total is not None and first_token is not None else None,
+        truncated=completion is not None and completion >= max_tokens,
+    )
 
 
 class HFInferenceProvider(BaseProvider):
@@ -33,31 +61,49 @@ class HFInferenceProvider(BaseProvider):
         if self.api_key:
             self.headers["Authorization"] = f"Bearer {self.api_key}"
     
-    async def answer(self, question: str, context: str) -> Tuple[str, List[Dict]]:
+    async def answer(self, question: str, context: str, history: str = "") -> Tuple[str, List[Dict]]:
         """Generate answer using HuggingFace Inference API."""
-        prompt = self._build_hf_prompt(question, context)
+        prompt = self._build_hf_prompt(question, context, history)
+        budget = telemetry.budget()
+        started = time.perf_counter()
         
         payload = {
             "inputs": prompt,
             "parameters": {
-                "max_new_tokens": 400,
+                "max_new_tokens": budget.max_tokens,
+                "stop": list(budget.stop),
+                "details": True,
                 "temperature": 0.3,
                 "top_p": 0.9,
                 "do_sample": True,
                 "return_full_text": False
-            }
+            },
+            "options": {"wait_for_model": False}
         }
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    self.base_url,
+            async with httpx.AsyncClient(timeout=timeout_for(self.timeout)) as client:
+                # A cold model answers 503 + estimated_time; the retry goes
+                # out at once and asks HF to hold it until the model is up
+                response = await retry.send(
+                    client, "POST", self.base_url,
+                    provider="hf_inference",
                     headers=self.headers,
-                    json=payload
+                    json=payload,
+                    on_loading=_wait_for_model,
                 )
                 response.raise_for_status()
                 result = response.json()
                 
+                first = result[0] if isinstance(result, list) and result else result
+                details = (first.get("details") or {}) if isinstance(first, dict) else {}
+                telemetry.record(
+                    "hf_inference",
+                    completion_tokens=details.get("generated_tokens"),
+                    total_s=time.perf_counter() - started,
+                    truncated=details.get("finish_reason") == "length",
+                )
+                
                 # Handle different response formats
                 if isinstance(result, list) and len(result) > 0:
                     if "generated_text" in result[0]:
@@ -102,18 +148,10 @@ class HFInferenceProvider(BaseProvider):
         except Exception as e:
             return f"⚠️ Error connecting to HuggingFace: {str(e)}", []
     
-    def _build_hf_prompt(self, question: str, context: str) -> str:
+    def _build_hf_prompt(self, question: str, context: str, history: str = "") -> str:
         """Build prompt optimized for HuggingFace models."""
-        # Format for instruction-tuned models
-        return (
-            "<|begin_of_text|><|start_header_id|>system<|end_header_id|>\n\n"
-            "You are a helpful AI assistant answering questions about a candidate's portfolio. "
-            "Use only the provided context. Be concise and professional."
-            "<|eot_id|><|start_header_id|>user<|end_header_id|>\n\n"
-            f"Context:\n{context}\n\n"
-            f"Question: {question}"
-            "<|eot_id|><|start_header_id|>assistant<|end_header_id|>\n\n"
-        )
+        # Llama 3 instruct format, system text + context first (see prompting.py)
+        return PromptParts.build(question, context, history).llama3()
 
 
 class HFReplicateProvider(BaseProvider):
@@ -136,9 +174,10 @@ class HFReplicateProvider(BaseProvider):
         )
         self.timeout = 120.0
     
-    async def answer(self, question: str, context: str) -> Tuple[str, List[Dict]]:
+    async def answer(self, question: str, context: str, history: str = "") -> Tuple[str, List[Dict]]:
         """Generate answer using Replicate API."""
-        prompt = self._build_prompt(question, context)
+        prompt = self._build_prompt(question, context, history)
+        budget = telemetry.budget()
         
         headers = {
             "Authorization": f"Token {self.api_token}",
@@ -150,50 +189,62 @@ class HFReplicateProvider(BaseProvider):
             "input": {
                 "prompt": prompt,
                 "temperature": 0.2,
-                "max_tokens": 400,
+                "max_tokens": budget.max_tokens,
+                "stop_sequences": ",".join(budget.stop),
                 "top_p": 0.9
             }
         }
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
+            async with httpx.AsyncClient(timeout=timeout_for(self.timeout)) as client:
                 # Start prediction
-                response = await client.post(
-                    "https://api.replicate.com/v1/predictions",
+                response = await retry.send(
+                    client, "POST", "https://api.replicate.com/v1/predictions",
+                    provider="replicate",
                     headers=headers,
                     json=payload
                 )
                 response.raise_for_status()
                 prediction = response.json()
                 prediction_url = prediction["urls"]["get"]
+                cancel_url = prediction["urls"].get("cancel")
                 
-                # Poll for completion
-                max_attempts = 60
-                for _ in range(max_attempts):
-                    await asyncio.sleep(2)
-                    
-                    poll_response = await client.get(
-                        prediction_url,
-                        headers=headers
-                    )
-                    poll_response.raise_for_status()
-                    result = poll_response.json()
-                    
-                    status = result["status"]
-                    
-                    if status == "succeeded":
-                        output = result.get("output", [])
-                        if isinstance(output, list):
-                            answer_text = "".join(output).strip()
-                        else:
-                            answer_text = str(output).strip()
+                # Poll for completion until the request's budget runs out
+                give_up = time.monotonic() + timeout_for(self.timeout)
+                try:
+                    while time.monotonic() < give_up:
+                        await asyncio.sleep(2)
+                        
+                        poll_response = await retry.send(
+                            client, "GET", prediction_url,
+                            provider="replicate",
+                            headers=headers
+                        )
+                        poll_response.raise_for_status()
+                        result = poll_response.json()
+                        
+                        status = result["status"]
                         
-                        return answer_text, []
-                    
-                    elif status in ("failed", "cancelled"):
-                        error = result.get("error", "Unknown error")
-                        return f"⚠️ Replicate prediction failed: {error}", []
+                        if status == "succeeded":
+                            _record_replicate(result.get("metrics") or {}, budget.max_tokens)
+                            output = result.get("output", [])
+                            if isinstance(output, list):
+                                answer_text = "".join(output).strip()
+                            else:
+                                answer_text = str(output).strip()
+                            
+                            return answer_text, []
+                        
+                        elif status in ("failed", "cancelled"):
+                            error = result.get("error", "Unknown error")
+                            return f"⚠️ Replicate prediction failed: {error}", []
+                except asyncio.CancelledError:
+                    # Client gone or deadline hit: stop paying for the prediction.
+                    # Shielded so our own cancellation doesn't abort the cancel call.
+                    await asyncio.shield(self._cancel(cancel_url, headers))
+                    raise
                 
+                await self._cancel(cancel_url, headers)
                 return "⚠️ Request timed out waiting for Replicate response.", []
                 
         except httpx.HTTPStatusError as e:
@@ -204,4 +255,14 @@ class HFReplicateProvider(BaseProvider):
             else:
                 return f"⚠️ Replicate API error: {e.response.status_code}", []
         except Exception as e:
-            return f"⚠️ Error connecting to Replicate: {str(e)}", []
\ No newline at end of file
+            return f"⚠️ Error connecting to Replicate: {str(e)}", []
+    
+    async def _cancel(self, cancel_url: str, headers: dict) -> None:
+        """Ask Replicate to stop a running prediction (best effort)."""
+        if not cancel_url:
+            return
+        try:
+            async with httpx.AsyncClient(timeout=5.0) as client:
+                await client.post(cancel_url, headers=headers)
+        except Exception as e:
+            logger.warning("Could not cancel Replicate prediction", extra={"fields": {"error": str(e)}})
\ No newline at end of file
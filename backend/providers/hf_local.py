@@ -4,8 +4,18 @@ Runs models locally on your GPU/CPU (no API calls).
 """
 import os
 import asyncio
-from typing import List, Dict, Tuple
+import contextlib
+import contextvars
+import threading
+import time
+from typing import AsyncIterator, List, Dict, Iterator, Tuple, Optional
+from observability import telemetry
+from observability.logs import get_logger
+from serving.deadlines import remaining
 from .base import BaseProvider
+from .prompting import PromptParts
+
+logger = get_logger("providers.hf_local")
 
 
 class HFLocalProvider(BaseProvider):
@@ -18,18 +28,30 @@ class HFLocalProvider(BaseProvider):
     Env vars:
         HF_MODEL: Model name (default: meta-llama/Llama-3.2-3B-Instruct)
         HF_DEVICE: Device to use (auto, cuda, cpu, mps)
+        HF_MAX_GENERATION_TIME: Max seconds per answer, capped by the request deadline (default: 120)
+        HF_DRAFT_MODEL: Small model with the same tokenizer for assisted decoding
+            (e.g. meta-llama/Llama-3.2-1B-Instruct); unset = off
+        HF_DRAFT_TOKENS: Tokens the draft proposes per step to start with (default: 5)
+        HF_DRAFT_MIN_ACCEPTANCE: Fall back to normal decoding below this acceptance rate (default: 0.4)
     
     First run will download the model (~6GB for Llama 3.2 3B).
     After that, it runs entirely locally with no internet needed.
+    
+    With a draft model, the draft proposes several tokens and the main
+    model checks them all in one forward pass (greedy decoding in this
+    mode). Try it with tiny models first, e.g.
+    HF_MODEL=sshleifer/tiny-gpt2 HF_DRAFT_MODEL=sshleifer/tiny-gpt2.
     """
     
     def __init__(self):
         self.model_name = os.getenv("HF_MODEL", "meta-llama/Llama-3.2-3B-Instruct")
         self.device = os.getenv("HF_DEVICE", "auto")
+        self.max_time = float(os.getenv("HF_MAX_GENERATION_TIME", "120"))
         
-        print(f"Loading HuggingFace model: {self.model_name}")
-        print(f"Device: {self.device}")
-        print("(First run will download model, please wait...)")
+        logger.info(
+            "Loading HuggingFace model (first run downloads it)",
+            extra={"fields": {"model": self.model_name, "device": self.device}}
+        )
         
         try:
             from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
@@ -47,24 +69,39 @@ class HFLocalProvider(BaseProvider):
                 trust_remote_code=True
             )
             
-            print("✓ Model loaded successfully")
+            logger.info("Model loaded", extra={"fields": {"model": self.model_name}})
+            
+            self.speculative = None
+            draft_name = os.getenv("HF_DRAFT_MODEL")
+            if draft_name:
+                self.speculative = _load_draft(draft_name, self.pipe.model, self.tokenizer)
             
         except Exception as e:
-            print(f"❌ Error loading model: {e}")
+            logger.error("Error loading model", extra={"fields": {"error": str(e)}})
             raise
     
-    async def answer(self, question: str, context: str) -> Tuple[str, List[Dict]]:
+    async def answer(self, question: str, context: str, history: str = "") -> Tuple[str, List[Dict]]:
         """Generate answer using local HuggingFace model."""
-        prompt = self._build_hf_prompt(question, context)
+        prompt = self._build_hf_prompt(question, context, history)
+        left = remaining()
+        stop = _StopGeneration(time.monotonic() + min(self.max_time, left if left is not None else self.max_time))
         
         try:
-            # Run in thread pool to avoid blocking
-            loop = asyncio.get_event_loop()
-            output = await loop.run_in_executor(
-                None,
-                self._generate,
-                prompt
-            )
+            # Run in thread pool to avoid blocking. Cancelling the await does
+            # not stop the thread, so the stop flag is checked between tokens.
+            loop = asyncio.get_running_loop()
+            ctx = contextvars.copy_context()
+            try:
+                output = await loop.run_in_executor(
+                    None,
+                    ctx.run,
+                    self._generate,
+                    prompt,
+                    stop
+                )
+            except asyncio.CancelledError:
+                stop.cancelled.set()
+                raise
             
             # Extract generated text
             if isinstance(output, list) and len(output) > 0:
@@ -87,25 +124,236 @@ class HFLocalProvider(BaseProvider):
         except Exception as e:
             return f"⚠️ Error generating response: {str(e)}", []
     
-    def _generate(self, prompt: str) -> list:
+    async def stream(
+        self, question: str, context: str, history: str = "", usage: Optional[Dict[str, int]] = None
+    ) -> AsyncIterator[str]:
+        """Yield text as it is generated (transformers' TextIteratorStreamer)."""
+        from transformers import TextIteratorStreamer
+        
+        prompt = self._build_hf_prompt(question, context, history)
+        left = remaining()
+        stop = _StopGeneration(time.monotonic() + min(self.max_time, left if left is not None else self.max_time))
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        
+        loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()
+        generation = loop.run_in_executor(None, ctx.run, self._generate, prompt, stop, streamer)
+        # Unblock the reader below if generate() fails before ending the stream
+        generation.add_done_callback(lambda _: streamer.end())
+        
+        pieces = []
+        try:
+            while True:
+                piece = await loop.run_in_executor(None, next, streamer, None)
+                if piece is None:
+                    break
+                if piece:
+                    pieces.append(piece)
+                    yield piece
+            await generation
+        finally:
+            stop.cancelled.set()  # no-op when generation already finished
+        
+        if usage is not None:
+            usage["prompt_tokens"] = len(self.tokenizer(prompt, add_special_tokens=False).input_ids)
+            usage["completion_tokens"] = len(self.tokenizer("".join(pieces), add_special_tokens=False).input_ids)
+    
+    def _generate(self, prompt: str, stop: Optional["_StopGeneration"] = None, streamer=None) -> list:
         """Synchronous generation (called in thread pool)."""
-        return self.pipe(
-            prompt,
-            max_new_tokens=400,
+        from transformers import StoppingCriteriaList
+        
+        budget = telemetry.budget()
+        kwargs = dict(
+            max_new_tokens=budget.max_tokens,
             temperature=0.3,
             top_p=0.9,
             do_sample=True,
-            return_full_text=False
+            return_full_text=False,
+            stopping_criteria=StoppingCriteriaList([stop]) if stop else None
+        )
+        if streamer is not None:
+            kwargs["streamer"] = streamer
+        
+        assisted = self.speculative is not None and self.speculative.use_draft()
+        if assisted:
+            kwargs.update(assistant_model=self.speculative.draft, do_sample=False)
+            del kwargs["temperature"], kwargs["top_p"]
+        
+        started = time.perf_counter()
+        if self.speculative is None:
+            output = self.pipe(prompt, **kwargs)
+        else:
+            with self.speculative.counting() as counts:
+                output = self.pipe(prompt, **kwargs)
+        elapsed = time.perf_counter() - started
+        
+        text = output[0].get("generated_text", "") if output else ""
+        new_tokens = len(self.tokenizer(text, add_special_tokens=False).input_ids)
+        if self.speculative is not None:
+            self.speculative.record(assisted, counts, new_tokens, elapsed)
+        telemetry.record(
+            "hf_local",
+            prompt_tokens=len(self.tokenizer(prompt, add_special_tokens=False).input_ids),
+            completion_tokens=new_tokens,
+            total_s=elapsed,
+            truncated=new_tokens >= budget.max_tokens,
         )
+        return output
     
-    def _build_hf_prompt(self, question: str, context: str) -> str:
+    def stats(self) -> dict:
+        """Assisted-decoding numbers (empty without a draft model)."""
+        return self.speculative.stats() if self.speculative else {}
+    
+    def _build_hf_prompt(self, question: str, context: str, history: str = "") -> str:
         """Build prompt for HuggingFace instruction models."""
-        return (
-            "<|begin_of_text|><|start_header_id|>system<|end_header_id|>\n\n"
-            "You are a helpful AI assistant answering questions about a candidate's portfolio. "
-            "Use only the provided context. Be concise and professional."
-            "<|eot_id|><|start_header_id|>user<|end_header_id|>\n\n"
-            f"Context:\n{context}\n\n"
-            f"Question: {question}"
-            "<|eot_id|><|start_header_id|>assistant<|end_header_id|>\n\n"
-        )
\ No newline at end of file
+        # Llama 3 instruct format, system text + context first (see prompting.py)
+        return PromptParts.build(question, context, history).llama3()
+
+
+class _StopGeneration:
+    """
+    Stopping criterion checked by generate() after every token: stops when
+    the request is cancelled or its deadline passes.
+    """
+    
+    def __init__(self, deadline: float):
+        self.deadline = deadline
+        self.cancelled = threading.Event()
+    
+    def __call__(self, input_ids, scores, **kwargs):
+        import torch
+        
+        done = self.cancelled.is_set() or time.monotonic() >= self.deadline
+        return torch.full((input_ids.shape[0],), done, dtype=torch.bool, device=input_ids.device)
+
+
+# ========================================
+# Assisted (speculative) decoding
+# ========================================
+
+def _load_draft(name: str, main_model, tokenizer) -> Optional["_SpeculativeDecoding"]:
+    """Load the draft model next to the main one; None if it can't assist it."""
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+    
+    draft_tokenizer = AutoTokenizer.from_pretrained(name)
+    if draft_tokenizer.get_vocab() != tokenizer.get_vocab():
+        logger.warning(
+            "Draft model uses a different tokenizer; assisted decoding disabled",
+            extra={"fields": {"draft": name}}
+        )
+        return None
+    
+    draft = AutoModelForCausalLM.from_pretrained(name, torch_dtype="auto").to(main_model.device).eval()
+    draft.generation_config.num_assistant_tokens = int(os.getenv("HF_DRAFT_TOKENS", "5"))
+    logger.info("Draft model loaded", extra={"fields": {"draft": name}})
+    return _SpeculativeDecoding(
+        main_model, draft, min_acceptance=float(os.getenv("HF_DRAFT_MIN_ACCEPTANCE", "0.4"))
+    )
+
+
+class _Counts:
+    __slots__ = ("main_passes", "draft_passes")
+    
+    def __init__(self):
+        self.main_passes = 0
+        self.draft_passes = 0
+
+
+class _SpeculativeDecoding:
+    """
+    Tracks how well the draft model predicts the main model and turns
+    assisted decoding off while it doesn't pay.
+    
+    Forward hooks count passes of each model during one generation. Each
+    main-model pass verifies the draft's proposals and adds one token of
+    its own, so accepted = new tokens - main passes, out of one proposal
+    per draft pass. Rates are exponential moving averages.
+    """
+    
+    WARMUP = 3          # assisted generations before judging acceptance
+    RETRY_AFTER = 20    # plain generations before trying the draft again
+    
+    def __init__(self, main_model, draft, min_acceptance: float):
+        self.draft = draft
+        self.min_acceptance = min_acceptance
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        
+        self.acceptance: Optional[float] = None
+        self.tokens_per_pass: Optional[float] = None
+        self.ms_per_token = {True: None, False: None}  # assisted -> EWMA
+        self.generations = {True: 0, False: 0}
+        self._plain_left = 0
+        self._probe_runs = 0  # assisted generations since the last fallback
+        
+        main_model.register_forward_hook(self._hook("main_passes"))
+        draft.register_forward_hook(self._hook("draft_passes"))
+    
+    def _hook(self, attr: str):
+        def hook(module, args, output):
+            counts = getattr(self._local, "counts", None)
+            if counts is not None:
+                setattr(counts, attr, getattr(counts, attr) + 1)
+        return hook
+    
+    @contextlib.contextmanager
+    def counting(self) -> Iterator[_Counts]:
+        """Count forward passes made by this thread until the block exits."""
+        self._local.counts = _Counts()
+        try:
+            yield self._local.counts
+        finally:
+            self._local.counts = None
+    
+    def use_draft(self) -> bool:
+        with self._lock:
+            if self._plain_left > 0:
+                self._plain_left -= 1
+                return False
+            return True
+    
+    def record(self, assisted: bool, counts: _Counts, new_tokens: int, seconds: float) -> None:
+        if new_tokens <= 0:
+            return
+        with self._lock:
+            self.generations[assisted] += 1
+            self.ms_per_token[assisted] = _ewma(self.ms_per_token[assisted], seconds * 1000 / new_tokens)
+            if not assisted or counts.draft_passes == 0:
+                return
+            
+            # After a fallback the draft starts over instead of inheriting the old rate
+            self._probe_runs += 1
+            previous = self.acceptance if self._probe_runs > 1 else None
+            accepted = max(new_tokens - counts.main_passes, 0)
+            self.acceptance = _ewma(previous, min(accepted / counts.draft_passes, 1.0))
+            self.tokens_per_pass = _ewma(self.tokens_per_pass, new_tokens / max(counts.main_passes, 1))
+            
+            if self._probe_runs >= self.WARMUP and self.acceptance < self.min_acceptance:
+                self._plain_left = self.RETRY_AFTER
+                self._probe_runs = 0
+                logger.info(
+                    "Draft acceptance too low, using normal decoding for a while",
+                    extra={"fields": {"acceptance": round(self.acceptance, 3), "generations": self.RETRY_AFTER}}
+                )
+    
+    def stats(self) -> dict:
+        with self._lock:
+            assisted_ms, plain_ms = self.ms_per_token[True], self.ms_per_token[False]
+            return {
+                "acceptance": _round(self.acceptance),
+                "tokens_per_main_pass": _round(self.tokens_per_pass),
+                "ms_per_token_assisted": _round(assisted_ms),
+                "ms_per_token_plain": _round(plain_ms),
+                "speedup": _round(plain_ms / assisted_ms) if assisted_ms and plain_ms else None,
+                "assisted_generations": self.generations[True],
+                "plain_generations": self.generations[False],
+                "fallback_active": self._plain_left > 0,
+            }
+
+
+def _ewma(previous: Optional[float], value: float, alpha: float = 0.2) -> float:
+    return value if previous is None else previous + alpha * (value - previous)
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 3) if value is not None else None
\ No newline at end of file
@@ -2,9 +2,58 @@
 Ollama local provider - Optimized for speed and reliability.
 """
 import os
+import json
 import httpx
-from typing import List, Dict, Tuple
+from collections import OrderedDict
+from typing import AsyncIterator, List, Dict, Tuple, Optional
+from observability import telemetry
+from observability.logs import get_logger
+from serving.deadlines import timeout_for
+from . import retry
 from .base import BaseProvider
+from .prompting import PromptParts, record_usage
+
+logger = get_logger("providers.ollama")
+
+CONNECT_ERROR = (
+    "⚠️ Cannot connect to Ollama. Make sure it's running:\n"
+    "1. Run: ollama serve\n"
+    "2. Check: curl http://localhost:11434/api/tags"
+)
+
+
+def _record_telemetry(result: Dict) -> None:
+    """Token counts and timings from Ollama's final response (durations in ns)."""
+    def seconds(key: str) -> Optional[float]:
+        value = result.get(key)
+        return value / 1e9 if value is not None else None
+    
+    telemetry.record(
+        "ollama",
+        prompt_tokens=result.get("prompt_eval_count"),
+        completion_tokens=result.get("eval_count"),
+        total_s=seconds("total_duration"),
+        load_s=seconds("load_duration"),
+        prefill_s=seconds("prompt_eval_duration"),
+        decode_s=seconds("eval_duration"),
+        truncated=result.get("done_reason") == "length",
+    )
+
+
+def _timeout_message(timeout: float) -> str:
+    return (
+        f"⚠️ Request timed out after {timeout:.0f}s. This can happen on first request.\n\n"
+        "Solutions:\n"
+        "1. Try again (first request loads model into memory)\n"
+        "2. Increase timeout in .env: OLLAMA_TIMEOUT=180\n"
+        "3. Use a smaller model: ollama pull llama3.2:1b\n"
+        "4. Make sure you have enough RAM (4GB+ recommended)"
+    )
+
+
+def _section_context(context: str) -> bool:
+    """Keyword contexts are one JSON section, the same for every question about it."""
+    return context.startswith(("{", "["))
 
 
 class OllamaProvider(BaseProvider):
@@ -18,7 +67,19 @@ class OllamaProvider(BaseProvider):
     Env vars:
         OLLAMA_HOST: Host URL (default: http://localhost:11434)
         OLLAMA_MODEL: Model name (default: llama3.2)
-        OLLAMA_TIMEOUT: Timeout in seconds (default: 120)
+        OLLAMA_TIMEOUT: Max timeout in seconds, capped by the request deadline (default: 120)
+        OLLAMA_KEEP_ALIVE: How long Ollama keeps the model (and its cache) loaded (default: 30m)
+        OLLAMA_CONTEXT_REUSE: Reuse the evaluated system turn per section, Llama 3 models (default: true)
+        OLLAMA_PREFIX_CACHE: Prefix states kept (default: 32)
+    
+    Llama 3 models get the prompt rendered with PromptParts.llama3() and
+    sent raw, so it is the same tokens whether or not the prefix is reused.
+    With context reuse on, the first question for a given keyword context
+    (one portfolio section) primes Ollama with the system turn once; the
+    returned `context` (evaluated tokens) is kept and later questions only
+    send the user turn on top of it. Retrieved (RAG) contexts differ per
+    question, so they aren't primed. Other models get the plain prompt
+    through their own template and no reuse.
     """
     
     def __init__(self):
@@ -26,103 +87,227 @@ class OllamaProvider(BaseProvider):
         self.model = os.getenv("OLLAMA_MODEL", "llama3.2")
         # Increased timeout - first request can be slow
         self.timeout = float(os.getenv("OLLAMA_TIMEOUT", "120"))
-        print(f"✅ Ollama: {self.host} | Model: {self.model} | Timeout: {self.timeout}s")
+        self.keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+        self.reuse_context = os.getenv("OLLAMA_CONTEXT_REUSE", "true").lower() == "true"
+        self.prefix_cache_size = int(os.getenv("OLLAMA_PREFIX_CACHE", "32"))
+        # prefix key -> token state returned by Ollama after the prefix
+        self._prefix_states: "OrderedDict[str, List[int]]" = OrderedDict()
+        logger.debug(
+            "Ollama provider ready",
+            extra={"fields": {"host": self.host, "model": self.model, "timeout": self.timeout}}
+        )
     
-    async def answer(self, question: str, context: str) -> Tuple[str, List[Dict]]:
+    async def answer(self, question: str, context: str, history: str = "") -> Tuple[str, List[Dict]]:
         """Generate answer using local Ollama model."""
-        # Limit context size to avoid timeouts
-        max_context = 2000  # characters
-        if len(context) > max_context:
-            context = context[:max_context] + "..."
-            print(f"⚠️  Context truncated to {max_context} chars")
-        
-        prompt = self._build_prompt(question, context)
+        parts = self._parts(question, context, history)
+        # Cancelling this coroutine closes the connection, which makes
+        # Ollama stop generating
+        timeout = timeout_for(self.timeout)
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                print(f"🚀 Sending to Ollama... (timeout: {self.timeout}s)")
+            async with httpx.AsyncClient(timeout=timeout) as client:
+                logger.debug("Sending to Ollama", extra={"fields": {"timeout": timeout}})
                 
-                response = await client.post(
-                    f"{self.host}/api/generate",
-                    json={
-                        "model": self.model,
-                        "prompt": prompt,
-                        "stream": False,
-                        "options": {
-                            "temperature": 0.3,
-                            "num_predict": 300,  # Reduced for speed
-                            "top_k": 40,
-                            "top_p": 0.9,
-                        }
-                    },
-                    headers={"Content-Type": "application/json"}
-                )
+                response, prefix_state, prefix_hit = await self._generate(client, parts, stream=False)
                 
                 if response.status_code == 200:
                     result = response.json()
                     answer_text = result.get("response", "").strip()
+                    record_usage(
+                        "ollama",
+                        prompt_tokens=result.get("prompt_eval_count", 0),
+                        cached_tokens=len(prefix_state) if prefix_state else 0,
+                        prefix_hit=prefix_hit,
+                    )
+                    _record_telemetry(result)
                     
                     if answer_text:
-                        print(f"✅ Got response ({len(answer_text)} chars)")
+                        logger.debug("Got response", extra={"fields": {"chars": len(answer_text)}})
                         return answer_text, []
                     else:
                         return "I received an empty response. Please try again.", []
                 
-                elif response.status_code == 404:
-                    # Try without tag
-                    base_model = self.model.split(':')[0]
-                    print(f"🔄 Retrying with model: {base_model}")
-                    
-                    response = await client.post(
-                        f"{self.host}/api/generate",
-                        json={
-                            "model": base_model,
-                            "prompt": prompt,
-                            "stream": False,
-                            "options": {
-                                "temperature": 0.3,
-                                "num_predict": 300,
-                            }
-                        }
-                    )
-                    
-                    if response.status_code == 200:
-                        result = response.json()
-                        answer_text = result.get("response", "").strip()
-                        if answer_text:
-                            self.model = base_model  # Update for next time
-                            print(f"✅ Success with {base_model}")
-                            return answer_text, []
-                
                 return f"⚠️ Ollama error (status {response.status_code})", []
                     
         except httpx.ConnectError:
-            return (
-                "⚠️ Cannot connect to Ollama. Make sure it's running:\n"
-                "1. Run: ollama serve\n"
-                "2. Check: curl http://localhost:11434/api/tags"
-            ), []
+            return CONNECT_ERROR, []
             
         except httpx.TimeoutException:
-            return (
-                f"⚠️ Request timed out after {self.timeout}s. This can happen on first request.\n\n"
-                "Solutions:\n"
-                "1. Try again (first request loads model into memory)\n"
-                "2. Increase timeout in .env: OLLAMA_TIMEOUT=180\n"
-                "3. Use a smaller model: ollama pull llama3.2:1b\n"
-                "4. Make sure you have enough RAM (4GB+ recommended)"
-            ), []
+            return _timeout_message(timeout), []
             
         except Exception as e:
-            print(f"❌ Error: {type(e).__name__}: {e}")
+            logger.error("Ollama request failed", extra={"fields": {"error": f"{type(e).__name__}: {e}"}})
             return f"⚠️ Error: {str(e)}", []
     
-    def _build_prompt(self, question: str, context: str) -> str:
-        """Build concise prompt for faster responses."""
-        return (
-            "Answer this question about a candidate using only the context below. "
-            "Be brief and specific.\n\n"
-            f"Context: {context}\n\n"
-            f"Question: {question}\n\n"
-            "Answer:"
-        )
\ No newline at end of file
+    async def stream(
+        self, question: str, context: str, history: str = "", usage: Optional[Dict[str, int]] = None
+    ) -> AsyncIterator[str]:
+        """Yield the answer token by token (same prompt and prefix reuse as answer())."""
+        parts = self._parts(question, context, history)
+        timeout = timeout_for(self.timeout)
+        
+        try:
+            async with httpx.AsyncClient(timeout=timeout) as client:
+                response, prefix_state, prefix_hit = await self._generate(client, parts, stream=True)
+                try:
+                    if response.status_code != 200:
+                        yield f"⚠️ Ollama error (status {response.status_code})"
+                        return
+                    async for line in response.aiter_lines():
+                        if not line.strip():
+                            continue
+                        chunk = json.loads(line)
+                        if chunk.get("response"):
+                            yield chunk["response"]
+                        if chunk.get("done"):
+                            record_usage(
+                                "ollama",
+                                prompt_tokens=chunk.get("prompt_eval_count", 0),
+                                cached_tokens=len(prefix_state) if prefix_state else 0,
+                                prefix_hit=prefix_hit,
+                            )
+                            _record_telemetry(chunk)
+                            if usage is not None:
+                                usage["prompt_tokens"] = chunk.get("prompt_eval_count", 0)
+                                usage["completion_tokens"] = chunk.get("eval_count", 0)
+                finally:
+                    await response.aclose()
+        
+        except httpx.ConnectError:
+            yield CONNECT_ERROR
+        except httpx.TimeoutException:
+            yield _timeout_message(timeout)
+    
+    def _parts(self, question: str, context: str, history: str) -> PromptParts:
+        # Limit context size to avoid timeouts; the lowest-ranked chunks go first
+        max_context = 2000  # characters
+        if len(context) > max_context:
+            logger.debug("Context truncated", extra={"fields": {"max_chars": max_context}})
+        return PromptParts.build(question, context, history, max_context=max_context)
+    
+    def _model_name(self) -> str:
+        """OLLAMA_MODEL, or the installed name it resolved to."""
+        return retry.resolved_model("ollama", self.model)
+    
+    async def _generate(
+        self, client: httpx.AsyncClient, parts: PromptParts, stream: bool
+    ) -> Tuple[httpx.Response, Optional[List[int]], bool]:
+        """POST /api/generate (through the retry policy); see _payload() for the rest."""
+        for _ in range(2):
+            payload, prefix_state, prefix_hit = await self._payload(client, parts, stream)
+            response = await retry.send(
+                client, "POST", f"{self.host}/api/generate",
+                provider="ollama",
+                stream=stream,
+                json=payload,
+                headers={"Content-Type": "application/json"}
+            )
+            # Unknown model name: once per process, look up what it's installed as
+            if response.status_code != 404 or not await self._resolve_model(client):
+                break
+            await response.aclose()
+        return response, prefix_state, prefix_hit
+    
+    async def _resolve_model(self, client: httpx.AsyncClient) -> bool:
+        """
+        Map OLLAMA_MODEL to an installed model ("llama3.2" -> "llama3.2:latest",
+        "llama3.2:3b" -> "llama3.2" if only that is pulled). True if the
+        name changed, in which case it's remembered for later requests.
+        """
+        current = self._model_name()
+        try:
+            response = await client.get(f"{self.host}/api/tags")
+            installed = [m["name"] for m in response.json().get("models", [])]
+        except (httpx.HTTPError, ValueError, KeyError):
+            return False
+        
+        base = current.split(":")[0]
+        candidates = [f"{current}:latest", f"{base}:latest", base] + [
+            name for name in installed if name.split(":")[0] == base
+        ]
+        resolved = next((name for name in candidates if name in installed), None)
+        if resolved is None or resolved == current:
+            logger.warning(
+                "Model not installed in Ollama",
+                extra={"fields": {"model": self.model, "installed": installed[:10]}}
+            )
+            return False
+        retry.remember_alias("ollama", self.model, resolved)
+        return True
+    
+    async def _payload(
+        self, client: httpx.AsyncClient, parts: PromptParts, stream: bool
+    ) -> Tuple[Dict, Optional[List[int]], bool]:
+        """/api/generate body, on top of the cached prefix state when there is one."""
+        budget = telemetry.budget()
+        raw = self._raw_llama3()
+        payload = {
+            "model": self._model_name(),
+            "prompt": parts.llama3(bos=False) if raw else parts.text(),
+            "raw": raw,
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+            "options": {
+                "temperature": 0.3,
+                "num_predict": budget.max_tokens,  # per question intent, see telemetry.py
+                "stop": list(budget.stop),
+                "top_k": 40,
+                "top_p": 0.9,
+            }
+        }
+        reuse = self.reuse_context and raw and _section_context(parts.context)
+        prefix_state, prefix_hit = (
+            await self._prefix_state(client, parts) if reuse else (None, False)
+        )
+        if prefix_state:
+            # Same template as the primed system turn, so the model sees the
+            # same tokens as with the whole prompt
+            payload["prompt"] = parts.llama3_suffix()
+            payload["context"] = prefix_state
+        return payload, prefix_state, prefix_hit
+    
+    def _raw_llama3(self) -> bool:
+        """Whether prompts are rendered here (Llama 3 template) instead of by Ollama."""
+        return self._model_name().rsplit("/", 1)[-1].startswith("llama3")
+    
+    async def _prefix_state(self, client: httpx.AsyncClient, parts: PromptParts) -> Tuple[Optional[List[int]], bool]:
+        """
+        Token state after the system text and context, from the cache or
+        by evaluating the prefix once, and whether it was cached. The state
+        is None if Ollama doesn't return one.
+        """
+        model = self._model_name()
+        key = parts.prefix_key(model)
+        state = self._prefix_states.get(key)
+        if state is not None:
+            self._prefix_states.move_to_end(key)
+            return state, True
+        
+        # Raw: exactly the system turn of the templated prompt, nothing more
+        response = await retry.send(
+            client, "POST", f"{self.host}/api/generate",
+            provider="ollama",
+            json={
+                "model": model,
+                "prompt": parts.llama3_prefix(bos=False),
+                "raw": True,
+                "stream": False,
+                "keep_alive": self.keep_alive,
+                "options": {"temperature": 0, "num_predict": 1},  # 0 would mean unlimited
+            },
+        )
+        if response.status_code != 200:
+            return None, False
+        body = response.json()
+        state = body.get("context")
+        if not state:
+            return None, False
+        # Drop the generated token; keep only the evaluated prefix
+        generated = body.get("eval_count") or 0
+        if generated:
+            state = state[:-generated]
+        
+        self._prefix_states[key] = state
+        while len(self._prefix_states) > self.prefix_cache_size:
+            self._prefix_states.popitem(last=False)
+        return state, False
@@ -3,9 +3,15 @@ OpenAI provider for GPT models.
 Paid API - requires OpenAI API key.
 """
 import os
+import json
+import time
 import httpx
-from typing import List, Dict, Tuple
+from typing import AsyncIterator, List, Dict, Optional, Tuple
+from observability import telemetry
+from serving.deadlines import timeout_for
+from . import retry
 from .base import BaseProvider
+from .prompting import PromptParts, record_usage
 
 
 class OpenAIProvider(BaseProvider):
@@ -25,21 +31,18 @@ class OpenAIProvider(BaseProvider):
         self.model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
         self.timeout = 60.0
     
-    async def answer(self, question: str, context: str) -> Tuple[str, List[Dict]]:
+    async def answer(self, question: str, context: str, history: str = "") -> Tuple[str, List[Dict]]:
         """Generate answer using OpenAI API."""
-        system_prompt = (
-            "You are a helpful AI assistant answering questions about a candidate's portfolio. "
-            "Use ONLY the information provided in the context. "
-            "Be concise, professional, and specific. "
-            "If the context doesn't contain relevant information, politely say so."
-        )
-        
-        user_prompt = f"Context:\n{context}\n\nQuestion: {question}"
+        # System text + context first: OpenAI caches repeated prompt prefixes
+        messages = PromptParts.build(question, context, history).messages()
+        budget = telemetry.budget()
+        started = time.perf_counter()
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    "https://api.openai.com/v1/chat/completions",
+            async with httpx.AsyncClient(timeout=timeout_for(self.timeout)) as client:
+                response = await retry.send(
+                    client, "POST", "https://api.openai.com/v1/chat/completions",
+                    provider="openai",
                     headers={
                         "Authorization": f"Bearer {self.api_key}",
                         "Content-Type": "application/json"
@@ -47,17 +50,29 @@ class OpenAIProvider(BaseProvider):
                     json={
                         "model": self.model,
                         "temperature": 0.2,
-                        "max_tokens": 400,
-                        "messages": [
-                            {"role": "system", "content": system_prompt},
-                            {"role": "user", "content": user_prompt}
-                        ]
+                        "max_tokens": budget.max_tokens,
+                        "stop": list(budget.stop),
+                        "messages": messages
                     }
                 )
                 response.raise_for_status()
                 result = response.json()
                 answer_text = result["choices"][0]["message"]["content"].strip()
                 
+                usage = result.get("usage") or {}
+                record_usage(
+                    "openai",
+                    prompt_tokens=usage.get("prompt_tokens", 0),
+                    cached_tokens=(usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0),
+                )
+                telemetry.record(
+                    "openai",
+                    prompt_tokens=usage.get("prompt_tokens"),
+                    completion_tokens=usage.get("completion_tokens"),
+                    total_s=time.perf_counter() - started,
+                    truncated=result["choices"][0].get("finish_reason") == "length",
+                )
+                
                 return answer_text, []
                 
         except httpx.HTTPStatusError as e:
@@ -68,4 +83,79 @@ class OpenAIProvider(BaseProvider):
             else:
                 return f"⚠️ OpenAI API error: {e.response.status_code}", []
         except Exception as e:
-            return f"⚠️ Error connecting to OpenAI: {str(e)}", []
\ No newline at end of file
+            return f"⚠️ Error connecting to OpenAI: {str(e)}", []
+    
+    async def stream(
+        self, question: str, context: str, history: str = "", usage: Optional[Dict[str, int]] = None
+    ) -> AsyncIterator[str]:
+        """Yield the answer as server-sent deltas arrive (same request as answer())."""
+        messages = PromptParts.build(question, context, history).messages()
+        budget = telemetry.budget()
+        started = time.perf_counter()
+        first_token = None
+        truncated = False
+        
+        try:
+            async with httpx.AsyncClient(timeout=timeout_for(self.timeout)) as client:
+                response = await retry.send(
+                    client, "POST", "https://api.openai.com/v1/chat/completions",
+                    provider="openai",
+                    stream=True,
+                    headers={
+                        "Authorization": f"Bearer {self.api_key}",
+                        "Content-Type": "application/json"
+                    },
+                    json={
+                        "model": self.model,
+                        "temperature": 0.2,
+                        "max_tokens": budget.max_tokens,
+                        "stop": list(budget.stop),
+                        "messages": messages,
+                        "stream": True,
+                        "stream_options": {"include_usage": True}
+                    }
+                )
+                try:
+                    if response.status_code != 200:
+                        yield f"⚠️ OpenAI API error: {response.status_code}"
+                        return
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data: ") or line == "data: [DONE]":
+                            continue
+                        event = json.loads(line[len("data: "):])
+                        for choice in event.get("choices") or []:
+                            delta = (choice.get("delta") or {}).get("content")
+                            if delta:
+                                if first_token is None:
+                                    first_token = time.perf_counter()
+                                yield delta
+                            truncated = truncated or choice.get("finish_reason") == "length"
+                        
+                        # The last event carries usage and no choices
+                        if event.get("usage"):
+                            counts = event["usage"]
+                            record_usage(
+                                "openai",
+                                prompt_tokens=counts.get("prompt_tokens", 0),
+                                cached_tokens=(counts.get("prompt_tokens_details") or {}).get("cached_tokens", 0),
+                            )
+                            if usage is not None:
+                                usage["prompt_tokens"] = counts.get("prompt_tokens", 0)
+                                usage["completion_tokens"] = counts.get("completion_tokens", 0)
+                            
+                            # Time to first token stands in for prefill
+                            finished = time.perf_counter()
+                            telemetry.record(
+                                "openai",
+                                prompt_tokens=counts.get("prompt_tokens"),
+                                completion_tokens=counts.get("completion_tokens"),
+                                total_s=finished - started,
+                                prefill_s=first_token - started if first_token else None,
+                                decode_s=finished - first_token if first_token else None,
+                                truncated=truncated,
+                            )
+                finally:
+                    await response.aclose()
+        
+        except httpx.HTTPError as e:
+            yield f"⚠️ Error connecting to OpenAI: {str(e)}"
\ No newline at end of file
@@ -0,0 +1,157 @@
+"""
+Shared prompt assembly for all LLM providers.
+
+Prompts are laid out from most static to most dynamic:
+
+    system text  ->  context block  ->  conversation  ->  question
+
+so consecutive questions about the same section share a long identical
+prefix. Servers that cache prompt prefixes (Ollama's KV cache and
+returned `context`, OpenAI's automatic prompt caching) then skip most of
+the prefill. The context block is canonicalized (retrieved chunks in a
+fixed order), so the same chunks always produce the same bytes. A size
+limit is applied first, in rank order, so the chunks dropped are the
+least relevant ones.
+"""
+import hashlib
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+SYSTEM_PROMPT = (
+    "You are a helpful AI assistant answering questions about a candidate's portfolio. "
+    "Use ONLY the information provided in the context below. "
+    "Be concise, professional, and include specific details from the context. "
+    "If the context doesn't contain relevant information, politely say so."
+)
+
+
+# Servers that add BOS themselves (Ollama) render llama3(bos=False)
+LLAMA3_BOS = "<|begin_of_text|>"
+
+
+def canonical_context(context: str, max_chars: Optional[int] = None) -> str:
+    """
+    Same chunks -> same text. Dense retrieval joins chunks with blank
+    lines in score order, which differs per question; sort them instead.
+    Keyword contexts (one JSON document) come back unchanged.
+
+    With `max_chars`, chunks are kept in score order while they fit
+    (the best one is cut if it alone is too long) before sorting.
+    """
+    blocks = [block.strip() for block in context.split("\n\n") if block.strip()]
+    if len(blocks) <= 1:
+        text = context.strip()
+        return text[:max_chars] + "..." if max_chars is not None and len(text) > max_chars else text
+
+    blocks = list(dict.fromkeys(blocks))
+    if max_chars is not None:
+        kept, used = [], 0
+        for block in blocks:
+            cost = len(block) + (2 if kept else 0)
+            if used + cost > max_chars:
+                if not kept:
+                    kept.append(block[:max_chars] + "...")
+                break
+            kept.append(block)
+            used += cost
+        blocks = kept
+    return "\n\n".join(sorted(blocks))
+
+
+@dataclass(frozen=True)
+class PromptParts:
+    system: str
+    context: str
+    history: str
+    question: str
+
+    @classmethod
+    def build(
+        cls, question: str, context: str, history: str = "", system: str = SYSTEM_PROMPT,
+        max_context: Optional[int] = None,
+    ) -> "PromptParts":
+        return cls(
+            system=system, context=canonical_context(context, max_context), history=history, question=question
+        )
+
+    # ---- static prefix (cacheable) ----
+
+    def prefix(self) -> str:
+        return f"{self.system}\n\nContext:\n{self.context}\n\n"
+
+    def prefix_key(self, *scope: str) -> str:
+        """Stable id of the prefix, optionally scoped (e.g. by model name)."""
+        digest = hashlib.sha256()
+        for part in (*scope, self.system, self.context):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()[:16]
+
+    # ---- dynamic suffix ----
+
+    def suffix(self) -> str:
+        history = f"Conversation so far:\n{self.history}\n\n" if self.history else ""
+        return f"{history}Question: {self.question}\n\nAnswer:"
+
+    # ---- provider formats ----
+
+    def text(self) -> str:
+        """Single completion-style prompt."""
+        return self.prefix() + self.suffix()
+
+    def messages(self) -> List[Dict[str, str]]:
+        """Chat messages: system + context first, the changing part last."""
+        user = f"Conversation so far:\n{self.history}\n\n" if self.history else ""
+        user += f"Question: {self.question}"
+        return [
+            {"role": "system", "content": f"{self.system}\n\nContext:\n{self.context}"},
+            {"role": "user", "content": user},
+        ]
+
+    def llama3(self, bos: bool = True) -> str:
+        """Llama 3 instruct template, with the context in the system turn."""
+        return self.llama3_prefix(bos) + self.llama3_suffix()
+
+    def llama3_prefix(self, bos: bool = True) -> str:
+        """The system turn of llama3(): identical for every question on the same context."""
+        return (
+            (LLAMA3_BOS if bos else "")
+            + "<|start_header_id|>system<|end_header_id|>\n\n"
+            f"{self.system}\n\nContext:\n{self.context}<|eot_id|>"
+        )
+
+    def llama3_suffix(self) -> str:
+        """The user turn and the assistant header that follow llama3_prefix()."""
+        user = f"Conversation so far:\n{self.history}\n\n" if self.history else ""
+        user += f"Question: {self.question}"
+        return (
+            "<|start_header_id|>user<|end_header_id|>\n\n"
+            f"{user}"
+            "<|eot_id|><|start_header_id|>assistant<|end_header_id|>\n\n"
+        )
+
+
+# ========================================
+# Prompt-cache accounting
+# ========================================
+
+_usage_lock = threading.Lock()
+_usage: Dict[str, Dict[str, int]] = {}
+
+
+def record_usage(provider: str, prompt_tokens: int = 0, cached_tokens: int = 0, prefix_hit: bool = False) -> None:
+    """Count prompt tokens and how many of them the server served from cache."""
+    with _usage_lock:
+        stats = _usage.setdefault(
+            provider, {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0, "prefix_hits": 0}
+        )
+        stats["requests"] += 1
+        stats["prompt_tokens"] += prompt_tokens
+        stats["cached_tokens"] += cached_tokens
+        stats["prefix_hits"] += int(prefix_hit)
+
+
+def usage_stats() -> Dict[str, Dict[str, int]]:
+    with _usage_lock:
+        return {name: dict(stats) for name, stats in _usage.items()}
@@ -0,0 +1,56 @@
+"""
+Provider registry: name -> implementation, imported on first use.
+
+Only the active provider's module is imported, so startup never pays for
+httpx, transformers or torch unless the configured provider needs them.
+"""
+import importlib
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Type
+
+from .base import BaseProvider
+
+
+@dataclass(frozen=True)
+class ProviderSpec:
+    module: str                       # relative to this package
+    cls: str
+    model_env: Optional[str] = None   # env var naming the model, if any
+
+
+PROVIDERS: Dict[str, ProviderSpec] = {
+    "rule_based": ProviderSpec("rule_based", "RuleBasedProvider"),
+    "ollama": ProviderSpec("ollama_local", "OllamaProvider", "OLLAMA_MODEL"),
+    "openai": ProviderSpec("openai_provider", "OpenAIProvider", "OPENAI_MODEL"),
+    "replicate": ProviderSpec("hf_inference", "HFReplicateProvider", "REPLICATE_MODEL"),
+    "hf_inference": ProviderSpec("hf_inference", "HFInferenceProvider", "HF_MODEL"),
+    "hf_local": ProviderSpec("hf_local", "HFLocalProvider", "HF_MODEL"),
+}
+
+
+def provider_names() -> List[str]:
+    return list(PROVIDERS)
+
+
+def provider_spec(name: str) -> ProviderSpec:
+    spec = PROVIDERS.get(name)
+    if spec is None:
+        raise ValueError(f"Unknown provider: {name}")
+    return spec
+
+
+def provider_class(name: str) -> Type[BaseProvider]:
+    """Import the provider's module now and return its class."""
+    spec = provider_spec(name)
+    module = importlib.import_module(f".{spec.module}", __package__)
+    return getattr(module, spec.cls)
+
+
+def create_provider(name: str) -> BaseProvider:
+    return provider_class(name)()
+
+
+def provider_name_of(provider: BaseProvider) -> str:
+    """Registry name of a provider instance (its class name if unregistered)."""
+    cls = type(provider).__name__
+    return next((name for name, spec in PROVIDERS.items() if spec.cls == cls), cls)
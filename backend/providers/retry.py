@@ -0,0 +1,283 @@
+"""
+Shared retry policy for remote providers.
+
+send() makes one HTTP call and retries it when the upstream says it is
+busy or not ready (408/429/502/503/504, connection refused):
+
+    - the server's own hint wins: Retry-After / retry-after-ms headers,
+      or HF's `estimated_time` while a model is loading
+    - otherwise jittered exponential backoff
+    - a caller that can ask the upstream to hold the request until the
+      model is up (HF's wait_for_model) passes on_loading; a "model is
+      loading" answer is then retried at once with that option instead
+      of sleeping out a cold start that is usually longer than
+      RETRY_MAX_DELAY
+    - a retry is only made if its wait fits in what is left of the
+      request's deadline; otherwise the last response is returned at once
+      and the provider reports it as before
+    - every provider has a retry budget shared by all requests: each
+      request earns RETRY_BUDGET_RATIO of a retry, each retry spends one.
+      During an outage the budget runs dry and requests fail fast instead
+      of multiplying the load on the upstream.
+
+It also keeps model-name aliases a provider resolved once (Ollama's
+"llama3.2" -> "llama3.2:latest"), so the lookup isn't repeated per request.
+
+Env vars:
+    RETRY_MAX_ATTEMPTS: Attempts per call, first one included (default: 3)
+    RETRY_BASE_DELAY: First backoff in seconds, doubled per retry (default: 0.5)
+    RETRY_MAX_DELAY: Longest wait before a retry, server hints included (default: 20)
+    RETRY_BUDGET_RATIO: Retries earned per request (default: 0.1)
+    RETRY_BUDGET_BURST: Retries that can be saved up (default: 10)
+"""
+import asyncio
+import collections
+import email.utils
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import httpx
+
+from observability.logs import get_logger
+from observability.metrics import Family, register_collector
+from serving.deadlines import remaining
+
+logger = get_logger("providers.retry")
+
+RETRY_STATUSES = {408, 429, 502, 503, 504}
+RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+
+MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))
+BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.5"))
+MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "20"))
+
+
+# ========================================
+# Retry budget
+# ========================================
+
+class RetryBudget:
+    """Token bucket: requests deposit `ratio`, retries withdraw 1."""
+
+    def __init__(self, ratio: float, burst: float):
+        self.ratio = ratio
+        self.burst = burst
+        self.balance = burst
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self.balance = min(self.burst, self.balance + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self.balance < 1:
+                return False
+            self.balance -= 1
+            return True
+
+
+_budgets: Dict[str, RetryBudget] = {}
+_stats: Dict[str, Dict[str, int]] = collections.defaultdict(collections.Counter)
+
+
+def get_budget(provider: str) -> RetryBudget:
+    budget = _budgets.get(provider)
+    if budget is None:
+        budget = _budgets[provider] = RetryBudget(
+            ratio=float(os.getenv("RETRY_BUDGET_RATIO", "0.1")),
+            burst=float(os.getenv("RETRY_BUDGET_BURST", "10")),
+        )
+    return budget
+
+
+# ========================================
+# Server hints
+# ========================================
+
+def server_delay(response: httpx.Response) -> Optional[float]:
+    """Seconds the server asked us to wait, if it said."""
+    headers = response.headers
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    if headers.get("retry-after"):
+        value = headers["retry-after"]
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    # HF while the model loads: {"error": "... is currently loading", "estimated_time": 20.0}
+    if response.status_code == 503 and "json" in headers.get("content-type", ""):
+        try:
+            estimated = response.json().get("estimated_time")
+        except (ValueError, AttributeError):
+            estimated = None
+        if isinstance(estimated, (int, float)):
+            return float(estimated)
+    return None
+
+
+def model_loading(response: httpx.Response) -> bool:
+    """HF's cold-start answer: 503 with "... is currently loading" and estimated_time."""
+    if response.status_code != 503 or "json" not in response.headers.get("content-type", ""):
+        return False
+    try:
+        body = response.json()
+    except ValueError:
+        return False
+    if not isinstance(body, dict):
+        return False
+    return "estimated_time" in body or "loading" in str(body.get("error", "")).lower()
+
+
+def _retryable(response: httpx.Response) -> bool:
+    if response.status_code not in RETRY_STATUSES:
+        return False
+    # Out of credit, not busy: waiting won't help
+    return not (response.status_code == 429 and "insufficient_quota" in response.text)
+
+
+def backoff(attempt: int) -> float:
+    """Full-jitter exponential backoff for retry number `attempt` (1-based)."""
+    return random.uniform(0, min(MAX_DELAY, BASE_DELAY * 2 ** attempt))
+
+
+# ========================================
+# send()
+# ========================================
+
+async def send(
+    client: httpx.AsyncClient,
+    method: str,
+    url: str,
+    *,
+    provider: str,
+    stream: bool = False,
+    on_loading: Optional[Callable[[Dict], None]] = None,
+    **kwargs,
+) -> httpx.Response:
+    """
+    client.request() with the retry policy. Returns the last response
+    (which may still be an error) or raises the last connection error.
+
+    With stream=True the response body isn't read; close it when done.
+    `on_loading(kwargs)` turns the request into one the upstream holds
+    until the model is loaded; it is applied, and the request retried
+    without waiting, when the upstream says the model is loading.
+    """
+    budget = get_budget(provider)
+    budget.deposit()
+    stats = _stats[provider]
+
+    attempt = 0
+    while True:
+        attempt += 1
+        stats["attempts"] += 1
+        response, error = None, None
+        try:
+            response = await client.send(client.build_request(method, url, **kwargs), stream=stream)
+        except RETRY_ERRORS as e:
+            error = e
+
+        if response is not None and stream and response.status_code in RETRY_STATUSES:
+            # Small error body; _retryable() and the hints need it read
+            await response.aread()
+        if response is not None and not _retryable(response):
+            return response
+
+        reason = type(error).__name__ if error else str(response.status_code)
+        loading = on_loading is not None and response is not None and model_loading(response)
+        if loading:
+            # The held request does the waiting, bounded by the client
+            # timeout (sized from the deadline)
+            reason, wait, delay = "loading", 0.0, 0.0
+        else:
+            hint = server_delay(response) if response is not None else None
+            wait = max(hint or 0.0, backoff(attempt))
+            # Spread clients that got the same hint
+            delay = wait + (random.uniform(0, 0.1 * hint) if hint else 0.0)
+
+        give_up = None
+        left = remaining()
+        if attempt >= MAX_ATTEMPTS:
+            give_up = "attempts"
+        elif wait > MAX_DELAY:
+            give_up = "too_long"
+        elif left is not None and delay >= left:
+            give_up = "deadline"
+        elif not budget.withdraw():
+            give_up = "budget"
+
+        if give_up:
+            stats[f"gave_up_{give_up}"] += 1
+            logger.info(
+                "Not retrying",
+                extra={"fields": {"provider": provider, "reason": reason, "why": give_up, "attempt": attempt}}
+            )
+            if error is not None:
+                raise error
+            return response
+
+        stats["retries"] += 1
+        logger.info(
+            "Retrying upstream call",
+            extra={"fields": {"provider": provider, "reason": reason, "attempt": attempt, "delay_s": round(delay, 2)}}
+        )
+        if response is not None:
+            await response.aclose()
+        if loading:
+            on_loading(kwargs)
+        else:
+            await asyncio.sleep(delay)
+
+
+# ========================================
+# Model aliases
+# ========================================
+
+_aliases: Dict[Tuple[str, str], str] = {}
+
+
+def resolved_model(provider: str, model: str) -> str:
+    """The name `model` resolved to earlier, or `model` itself."""
+    return _aliases.get((provider, model), model)
+
+
+def remember_alias(provider: str, model: str, resolved: str) -> None:
+    if resolved != model:
+        _aliases[(provider, model)] = resolved
+        logger.info("Model alias resolved", extra={"fields": {"provider": provider, "model": model, "resolved": resolved}})
+
+
+def stats() -> Dict[str, Dict]:
+    return {
+        provider: {**counts, "budget": round(get_budget(provider).balance, 2)}
+        for provider, counts in list(_stats.items())
+    }
+
+
+def _collect():
+    attempts = Family("upstream_attempts_total", "counter", "HTTP calls made to remote providers, retries included")
+    retries = Family("upstream_retries_total", "counter", "Calls repeated after a busy/unavailable answer")
+    gave_up = Family("upstream_retry_skipped_total", "counter", "Retryable failures not retried, by cause")
+    budget = Family("upstream_retry_budget", "gauge", "Retries currently available per provider")
+    for provider, counts in list(_stats.items()):
+        attempts.add(counts["attempts"], provider=provider)
+        retries.add(counts["retries"], provider=provider)
+        for key, count in counts.items():
+            if key.startswith("gave_up_"):
+                gave_up.add(count, provider=provider, why=key[len("gave_up_"):])
+        budget.add(get_budget(provider).balance, provider=provider)
+    return [attempts, retries, gave_up, budget]
+
+
+register_collector(_collect)
@@ -2,187 +2,209 @@
 Rule-based provider (no LLM required).
 Free fallback option using keyword matching and templates.
 """
-import json
 from typing import List, Dict, Tuple
+from retrieval.snapshot import PortfolioSnapshot, get_snapshot
 from .base import BaseProvider
 
+# (intent, trigger words), checked in order
+_INTENTS = (
+    ("skills", ("skill", "tech", "stack", "technology")),
+    ("projects", ("project", "built", "develop", "work on")),
+    ("experience", ("experience", "work", "job", "company")),
+    ("education", ("education", "degree", "university", "study")),
+    ("certifications", ("certification", "certified", "cert")),
+    ("contact", ("contact", "email", "reach", "linkedin", "phone", "hire")),
+)
+
+_CONTACT_LABELS = {"email": "Email", "linkedin": "LinkedIn", "github": "GitHub", "phone": "Phone"}
+
 
 class RuleBasedProvider(BaseProvider):
     """
     Simple rule-based provider that doesn't require an LLM.
     Uses keyword matching to generate responses.
     Perfect for testing or as a free fallback.
+
+    Answers come from the typed portfolio snapshot, not the retrieved
+    context, and every intent's answer is rendered once per portfolio
+    version, so a request is just a keyword scan and a dict lookup.
     """
-    
-    async def answer(self, question: str, context: str) -> Tuple[str, List[Dict]]:
+
+    cheap = True
+
+    def __init__(self):
+        self._version = ""
+        self._rendered: Dict[str, Tuple[str, List[Dict]]] = {}
+
+    async def answer(self, question: str, context: str, history: str = "") -> Tuple[str, List[Dict]]:
         """Generate rule-based answer using keyword matching."""
+        text, links = self.rendered()[self.classify(question)]
+        # Callers may extend the list; hand out a copy
+        return text, list(links)
+
+    def answer_intent(self, intent: str) -> Tuple[str, List[Dict]]:
+        """Pre-rendered answer for an intent picked elsewhere (e.g. the intent router)."""
+        text, links = self.rendered().get(intent) or self.rendered()["overview"]
+        return text, list(links)
+
+    @staticmethod
+    def classify(question: str) -> str:
         q_lower = question.lower()
-        
-        try:
-            ctx_data = json.loads(context)
-        except:
-            ctx_data = {}
-        
-        # Skills questions
-        if any(word in q_lower for word in ["skill", "tech", "stack", "technology"]):
-            return self._answer_skills(ctx_data, q_lower)
-        
-        # Projects questions
-        if any(word in q_lower for word in ["project", "built", "develop", "work on"]):
-            return self._answer_projects(ctx_data, q_lower)
-        
-        # Experience questions
-        if any(word in q_lower for word in ["experience", "work", "job", "company"]):
-            return self._answer_experience(ctx_data, q_lower)
-        
-        # Education questions
-        if any(word in q_lower for word in ["education", "degree", "university", "study"]):
-            return self._answer_education(ctx_data, q_lower)
-        
-        # Certifications
-        if any(word in q_lower for word in ["certification", "certified", "cert"]):
-            return self._answer_certifications(ctx_data, q_lower)
-        
-        # Default: general overview
-        return self._answer_overview(ctx_data)
-    
-    def _answer_skills(self, data: Dict, question: str) -> Tuple[str, List[Dict]]:
-        skills = data.get("skills", [])
+        for intent, words in _INTENTS:
+            if any(word in q_lower for word in words):
+                return intent
+        return "overview"
+
+    def rendered(self) -> Dict[str, Tuple[str, List[Dict]]]:
+        """Answers for every intent, re-rendered when the portfolio changes."""
+        snapshot = get_snapshot()
+        if snapshot.version != self._version or not self._rendered:
+            self._rendered = {
+                "skills": self._answer_skills(snapshot),
+                "projects": self._answer_projects(snapshot),
+                "experience": self._answer_experience(snapshot),
+                "education": self._answer_education(snapshot),
+                "certifications": self._answer_certifications(snapshot),
+                "contact": self._answer_contact(snapshot),
+                "overview": self._answer_overview(snapshot),
+            }
+            self._version = snapshot.version
+        return self._rendered
+
+    # ========================================
+    # Templates (run once per portfolio version)
+    # ========================================
+
+    def _answer_skills(self, data: PortfolioSnapshot) -> Tuple[str, List[Dict]]:
+        skills = data.skills
         if not skills:
             return "I don't have skills information available.", []
-        
-        skill_list = ", ".join([s.get("name", "") for s in skills[:6]])
+
+        skill_list = ", ".join([s.name for s in skills[:6]])
         categories = {}
         for s in skills:
-            cat = s.get("category", "other")
-            categories.setdefault(cat, []).append(s.get("name"))
-        
+            categories.setdefault(s.category, []).append(s.name)
+
         response = f"I have expertise in {len(skills)} technologies including {skill_list}."
         if categories:
             response += "\n\n"
             for cat, techs in categories.items():
                 response += f"• {cat.title()}: {', '.join(techs[:3])}\n"
-        
+
         return response.strip(), []
-    
-    def _answer_projects(self, data: Dict, question: str) -> Tuple[str, List[Dict]]:
-        projects = data.get("projects", [])
+
+    def _answer_projects(self, data: PortfolioSnapshot) -> Tuple[str, List[Dict]]:
+        projects = data.projects
         if not projects:
             return "I don't have project information available.", []
-        
+
         links = []
         response = f"I've built {len(projects)} notable projects:\n\n"
-        
+
         for proj in projects[:3]:
-            name = proj.get("name", "Unnamed Project")
-            summary = proj.get("summary", "")
-            stack = ", ".join(proj.get("stack", [])[:4])
-            impact = proj.get("impact", "")
-            
-            response += f"**{name}**\n"
-            if summary:
-                response += f"{summary}\n"
+            stack = ", ".join(proj.stack[:4])
+
+            response += f"**{proj.name}**\n"
+            if proj.summary:
+                response += f"{proj.summary}\n"
             if stack:
                 response += f"Stack: {stack}\n"
-            if impact:
-                response += f"Impact: {impact}\n"
-            
-            if proj.get("repo"):
-                links.append({"label": f"{name} - GitHub", "url": proj["repo"]})
-            if proj.get("demo"):
-                links.append({"label": f"{name} - Demo", "url": proj["demo"]})
-            
+            if proj.impact:
+                response += f"Impact: {proj.impact}\n"
+
+            if proj.repo:
+                links.append({"label": f"{proj.name} - GitHub", "url": proj.repo})
+            if proj.demo:
+                links.append({"label": f"{proj.name} - Demo", "url": proj.demo})
+
             response += "\n"
-        
+
         return response.strip(), links[:4]
-    
-    def _answer_experience(self, data: Dict, question: str) -> Tuple[str, List[Dict]]:
-        experience = data.get("experience", [])
+
+    def _answer_experience(self, data: PortfolioSnapshot) -> Tuple[str, List[Dict]]:
+        experience = data.experience
         if not experience:
             return "I don't have work experience information available.", []
-        
+
         response = f"I have {len(experience)} professional experiences:\n\n"
-        
+
         for exp in experience[:3]:
-            company = exp.get("company", "")
-            role = exp.get("role", "")
-            duration = exp.get("duration", "")
-            description = exp.get("description", "")
-            
-            response += f"**{role}** at {company}\n"
-            if duration:
-                response += f"{duration}\n"
-            if description:
-                response += f"{description}\n"
-            
-            achievements = exp.get("achievements", [])
-            if achievements:
+            response += f"**{exp.role}** at {exp.company}\n"
+            if exp.duration:
+                response += f"{exp.duration}\n"
+            if exp.description:
+                response += f"{exp.description}\n"
+
+            if exp.achievements:
                 response += "Key achievements:\n"
-                for ach in achievements[:2]:
+                for ach in exp.achievements[:2]:
                     response += f"• {ach}\n"
-            
+
             response += "\n"
-        
+
         return response.strip(), []
-    
-    def _answer_education(self, data: Dict, question: str) -> Tuple[str, List[Dict]]:
-        education = data.get("education", [])
+
+    def _answer_education(self, data: PortfolioSnapshot) -> Tuple[str, List[Dict]]:
+        education = data.education
         if not education:
             return "I don't have education information available.", []
-        
+
         response = "Education:\n\n"
-        
+
         for edu in education:
-            degree = edu.get("degree", "")
-            field = edu.get("field", "")
-            institution = edu.get("institution", "")
-            graduation = edu.get("graduation", "")
-            
-            response += f"**{degree} in {field}**\n"
-            response += f"{institution}"
-            if graduation:
-                response += f" ({graduation})"
+            response += f"**{edu.degree} in {edu.field}**\n"
+            response += f"{edu.institution}"
+            if edu.graduation:
+                response += f" ({edu.graduation})"
             response += "\n\n"
-        
+
         return response.strip(), []
-    
-    def _answer_certifications(self, data: Dict, question: str) -> Tuple[str, List[Dict]]:
-        certs = data.get("certifications", [])
+
+    def _answer_certifications(self, data: PortfolioSnapshot) -> Tuple[str, List[Dict]]:
+        certs = data.certifications
         if not certs:
             return "I don't have certification information available.", []
-        
+
         response = "Certifications:\n\n"
         links = []
-        
+
         for cert in certs:
-            name = cert.get("name", "")
-            issuer = cert.get("issuer", "")
-            date = cert.get("date", "")
-            
-            response += f"• {name}"
-            if issuer:
-                response += f" - {issuer}"
-            if date:
-                response += f" ({date})"
+            response += f"• {cert.name}"
+            if cert.issuer:
+                response += f" - {cert.issuer}"
+            if cert.date:
+                response += f" ({cert.date})"
             response += "\n"
-            
-            if cert.get("url"):
-                links.append({"label": name, "url": cert["url"]})
-        
+
+            if cert.url:
+                links.append({"label": cert.name, "url": cert.url})
+
         return response.strip(), links[:3]
-    
-    def _answer_overview(self, data: Dict) -> Tuple[str, List[Dict]]:
-        about = data.get("about", "")
-        if about:
-            return about, []
-        
+
+    def _answer_contact(self, data: PortfolioSnapshot) -> Tuple[str, List[Dict]]:
+        contact = data.contact
+        if not contact:
+            return self._answer_overview(data)
+
+        response = "You can reach me here:\n\n"
+        links = []
+        for kind, value in contact.items():
+            label = _CONTACT_LABELS.get(kind, kind.title())
+            response += f"• {label}: {value}\n"
+            if kind == "email":
+                links.append({"label": label, "url": f"mailto:{value}"})
+            elif value.startswith("http"):
+                links.append({"label": label, "url": value})
+
+        return response.strip(), links[:4]
+
+    def _answer_overview(self, data: PortfolioSnapshot) -> Tuple[str, List[Dict]]:
+        if data.about:
+            return data.about, []
+
         # Build a quick summary
-        skills_count = len(data.get("skills", []))
-        projects_count = len(data.get("projects", []))
-        exp_count = len(data.get("experience", []))
-        
         return (
-            f"I'm a professional with {exp_count} work experiences, "
-            f"{projects_count} notable projects, and expertise in {skills_count} technologies. "
+            f"I'm a professional with {len(data.experience)} work experiences, "
+            f"{len(data.projects)} notable projects, and expertise in {len(data.skills)} technologies. "
             "Feel free to ask about my skills, projects, or experience!"
-        ), []
\ No newline at end of file
+        ), []
@@ -6,48 +6,54 @@ Run this once after setting up portfolio data.
 Requirements:
     pip install sentence-transformers faiss-cpu
 
+Env vars:
+    CHUNK_MODE: item (one chunk per entry), field (one chunk per field of
+        projects/experience), or auto (field-level only for entries longer
+        than CHUNK_MAX_CHARS) (default: auto)
+    CHUNK_MAX_CHARS: Entry length that triggers field-level chunks in auto mode (default: 800)
+
 Usage:
     python retrieval/embed_build.py
+    python retrieval/embed_build.py --corpus docs/ --workers 8   # also index .md/.txt files
+    python retrieval/embed_build.py --export-onnx   # int8 ONNX query encoder (see encoders.py)
+    python retrieval/embed_build.py --check-onnx    # parity, latency and RSS vs torch
 """
+import argparse
+import hashlib
 import json
+import os
 import pathlib
-import numpy as np
+import sys
+from typing import Dict, List, Optional
 
 
-def build_index():
-    """Build FAISS index from portfolio data."""
-    
-    print("=" * 60)
-    print("Building Vector Index for Portfolio")
-    print("=" * 60)
-    
-    # Paths
-    ROOT = pathlib.Path(__file__).resolve().parents[1]
-    DATA_PATH = ROOT / "portfolio" / "portfolio.json"
-    INDEX_PATH = ROOT / "portfolio" / "pf.index"
-    META_PATH = ROOT / "portfolio" / "pf.meta.json"
-    
-    # Check if portfolio exists
-    if not DATA_PATH.exists():
-        print(f"❌ Portfolio file not found: {DATA_PATH}")
-        return
-    
-    print(f"📁 Loading portfolio from: {DATA_PATH}")
-    
-    try:
-        with open(DATA_PATH, encoding="utf-8") as f:
-            portfolio = json.load(f)
-    except Exception as e:
-        print(f"❌ Error loading portfolio: {e}")
-        return
+def _chunk(chunk_id: str, section: str, field: str, text: str) -> Dict[str, str]:
+    return {"id": chunk_id, "section": section, "field": field, "text": text}
+
+
+def _split_fields(section: str, idx: int, title: str, fields: List[tuple]) -> List[Dict[str, str]]:
+    """One chunk per non-empty field, each prefixed with the entry title for context."""
+    return [
+        _chunk(f"{section}:{idx}:{field}", section, field, f"{title}\n{label}: {value}")
+        for field, label, value in fields
+        if value
+    ]
+
+
+def make_chunks(portfolio: dict, mode: str = "auto", max_chars: int = 800) -> List[Dict[str, str]]:
+    """
+    Split the portfolio into chunks tagged with their section and field.
+    Field-level splitting applies to projects and experience, whose
+    entries are the long ones.
+    """
+    def split(text: str) -> bool:
+        return mode == "field" or (mode == "auto" and len(text) > max_chars)
     
-    # Create chunks
-    print("\n📝 Creating text chunks...")
     chunks = []
     
     # About section
     if "about" in portfolio:
-        chunks.append(("about", f"About: {portfolio['about']}"))
+        chunks.append(_chunk("about", "about", "about", f"About: {portfolio['about']}"))
     
     # Skills
     if "skills" in portfolio:
@@ -55,7 +61,7 @@ def build_index():
             text = f"Skill: {skill.get('name', '')} - Level: {skill.get('level', '')} - Last used: {skill.get('lastUsed', '')}"
             if "category" in skill:
                 text += f" - Category: {skill['category']}"
-            chunks.append((f"skills:{idx}", text))
+            chunks.append(_chunk(f"skills:{idx}", "skills", "", text))
     
     # Projects
     if "projects" in portfolio:
@@ -66,7 +72,15 @@ def build_index():
             text += f"Impact: {proj.get('impact', '')}\n"
             if "highlights" in proj:
                 text += f"Highlights: {' '.join(proj['highlights'])}"
-            chunks.append((f"projects:{idx}", text))
+            if split(text):
+                chunks += _split_fields("projects", idx, f"Project: {proj.get('name', '')}", [
+                    ("summary", "Summary", proj.get("summary", "")),
+                    ("stack", "Stack", ", ".join(proj.get("stack", []))),
+                    ("impact", "Impact", proj.get("impact", "")),
+                    ("highlights", "Highlights", " ".join(proj.get("highlights", []))),
+                ])
+            else:
+                chunks.append(_chunk(f"projects:{idx}", "projects", "", text))
     
     # Experience
     if "experience" in portfolio:
@@ -76,7 +90,14 @@ def build_index():
             text += f"Description: {exp.get('description', '')}\n"
             if "achievements" in exp:
                 text += f"Achievements: {' '.join(exp['achievements'])}"
-            chunks.append((f"experience:{idx}", text))
+            if split(text):
+                title = f"Experience: {exp.get('role', '')} at {exp.get('company', '')} ({exp.get('duration', '')})"
+                chunks += _split_fields("experience", idx, title, [
+                    ("description", "Description", exp.get("description", "")),
+                    ("achievements", "Achievements", " ".join(exp.get("achievements", []))),
+                ])
+            else:
+                chunks.append(_chunk(f"experience:{idx}", "experience", "", text))
     
     # Education
     if "education" in portfolio:
@@ -85,60 +106,97 @@ def build_index():
             text += f"Graduated: {edu.get('graduation', '')}"
             if "relevant_courses" in edu:
                 text += f"\nCourses: {', '.join(edu['relevant_courses'])}"
-            chunks.append((f"education:{idx}", text))
+            chunks.append(_chunk(f"education:{idx}", "education", "", text))
     
     # Certifications
     if "certifications" in portfolio:
         for idx, cert in enumerate(portfolio["certifications"]):
             text = f"Certification: {cert.get('name', '')} from {cert.get('issuer', '')} ({cert.get('date', '')})"
-            chunks.append((f"certifications:{idx}", text))
+            chunks.append(_chunk(f"certifications:{idx}", "certifications", "", text))
+    
+    return chunks
+
+
+def build_index(
+    corpus: Optional[pathlib.Path] = None,
+    workers: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    chunk_size: int = 800,
+    overlap: int = 150,
+    resume: bool = True,
+):
+    """Build FAISS index from portfolio data plus an optional document corpus."""
+    
+    print("=" * 60)
+    print("Building Vector Index for Portfolio")
+    print("=" * 60)
+    
+    # Paths
+    ROOT = pathlib.Path(__file__).resolve().parents[1]
+    DATA_PATH = ROOT / "portfolio" / "portfolio.json"
+    INDEX_PATH = ROOT / "portfolio" / "pf.index"
+    META_PATH = ROOT / "portfolio" / "pf.meta.jsonl"
     
-    print(f"✓ Created {len(chunks)} chunks")
+    # Check if portfolio exists
+    if not DATA_PATH.exists():
+        print(f"❌ Portfolio file not found: {DATA_PATH}")
+        return
+    if corpus is not None and not corpus.is_dir():
+        print(f"❌ Corpus directory not found: {corpus}")
+        return
+    
+    print(f"📁 Loading portfolio from: {DATA_PATH}")
+    
+    try:
+        raw = DATA_PATH.read_bytes()
+        portfolio = json.loads(raw)
+    except Exception as e:
+        print(f"❌ Error loading portfolio: {e}")
+        return
+    
+    # Create chunks
+    mode = os.getenv("CHUNK_MODE", "auto").lower()
+    max_chars = int(os.getenv("CHUNK_MAX_CHARS", "800"))
+    print(f"\n📝 Creating text chunks (mode: {mode})...")
+    chunks = make_chunks(portfolio, mode, max_chars)
+    
+    print(f"✓ Created {len(chunks)} portfolio chunks")
+    if corpus is not None:
+        print(f"📚 Streaming documents from: {corpus} ({workers or os.cpu_count()} workers)")
     
     # Load embedding model
     print("\n🤖 Loading embedding model...")
+    sys.path.insert(0, str(ROOT))
     try:
-        from sentence_transformers import SentenceTransformer
-        model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
-        print("✓ Model loaded")
-    except ImportError:
-        print("❌ sentence-transformers not installed")
+        from retrieval.encoders import get_encoder
+        # Serving encodes one query at a time on 1 thread; a build encodes
+        # large batches, so give it every core
+        encoder = get_encoder(threads=os.cpu_count())
+        print(f"✓ Model loaded ({encoder.backend})")
+    except ImportError as e:
+        print(f"❌ Encoder backend not installed: {e}")
         print("   Install with: pip install sentence-transformers")
         return
     except Exception as e:
         print(f"❌ Error loading model: {e}")
         return
     
-    # Generate embeddings
-    print("\n🔢 Generating embeddings...")
-    texts = [text for _, text in chunks]
+    # Encode and index incrementally (resumes an interrupted build)
+    print("\n🔢 Generating embeddings and building FAISS index...")
     try:
-        embeddings = model.encode(
-            texts,
-            normalize_embeddings=True,
-            show_progress_bar=True
-        )
-        print(f"✓ Generated {len(embeddings)} embeddings")
-    except Exception as e:
-        print(f"❌ Error generating embeddings: {e}")
-        return
-    
-    # Build FAISS index
-    print("\n📊 Building FAISS index...")
-    try:
-        import faiss
-        
-        dim = embeddings.shape[1]
-        index = faiss.IndexFlatIP(dim)  # Inner product (cosine similarity)
-        index.add(np.array(embeddings, dtype="float32"))
+        from retrieval.ingest import build
         
-        # Save index
-        faiss.write_index(index, str(INDEX_PATH))
+        settings = {
+            "portfolio": hashlib.sha256(raw).hexdigest()[:16],
+            "mode": mode, "max_chars": max_chars, "encoder": encoder.backend,
+        }
+        total = build(
+            encoder, INDEX_PATH, META_PATH, chunks,
+            corpus_dir=corpus, workers=workers, batch_size=batch_size,
+            chunk_size=chunk_size, overlap=overlap, resume=resume, settings=settings,
+        )
+        print(f"✓ Indexed {total} chunks")
         print(f"✓ Saved index to: {INDEX_PATH}")
-        
-        # Save metadata
-        with open(META_PATH, "w", encoding="utf-8") as f:
-            json.dump(chunks, f, ensure_ascii=False, indent=2)
         print(f"✓ Saved metadata to: {META_PATH}")
         
     except ImportError:
@@ -147,6 +205,7 @@ def build_index():
         return
     except Exception as e:
         print(f"❌ Error building index: {e}")
+        print("   Run the same command again to resume from the last checkpoint.")
         return
     
     print("\n" + "=" * 60)
@@ -157,5 +216,69 @@ def build_index():
     print("\nRestart your backend to use the new index.")
 
 
+def export_encoder():
+    """Export the query encoder to int8 ONNX, then check it against torch."""
+    sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+    from retrieval.encoders import ONNX_DIR, export_onnx
+    
+    print("📦 Exporting encoder to ONNX (int8 dynamic quantization)...")
+    try:
+        path = export_onnx(ONNX_DIR)
+    except ImportError as e:
+        print(f"❌ Export needs torch, transformers and onnxruntime: {e}")
+        return
+    print(f"✓ Saved model to: {path}")
+    check_encoder()
+
+
+def check_encoder():
+    """Compare the ONNX encoder with the torch one on the chunk texts."""
+    sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+    from retrieval.encoders import (
+        OnnxEncoder, TorchEncoder, parity, probe_in_subprocess
+    )
+    
+    ROOT = pathlib.Path(__file__).resolve().parents[1]
+    with open(ROOT / "portfolio" / "portfolio.json", encoding="utf-8") as f:
+        texts = [chunk["text"] for chunk in make_chunks(json.load(f))]
+    
+    print("\n🔍 Parity check (cosine similarity, ONNX vs torch)...")
+    try:
+        result = parity(TorchEncoder(), OnnxEncoder(), texts)
+    except ImportError as e:
+        print(f"❌ Both backends are needed for the check: {e}")
+        return
+    print(f"   min {result['min_cosine']:.4f}   mean {result['mean_cosine']:.4f}")
+    if result["min_cosine"] < 0.98:
+        print("⚠️ Embeddings drift more than expected; consider the fp32 model.onnx")
+    
+    print("\n⏱  Startup, memory and query latency (fresh process each)...")
+    for backend in ("torch", "onnx"):
+        stats = probe_in_subprocess(backend)
+        print(
+            f"   {backend:6} startup {stats['startup_s']:6.2f}s   RSS {stats['rss_mb']:7.1f} MB   "
+            f"p50 {stats['p50_ms']:6.2f} ms   p95 {stats['p95_ms']:6.2f} ms"
+        )
+
+
 if __name__ == "__main__":
-    build_index()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Build the portfolio vector index")
+    parser.add_argument("--export-onnx", action="store_true", help="Export the query encoder to int8 ONNX")
+    parser.add_argument("--check-onnx", action="store_true", help="Compare the ONNX encoder with torch")
+    parser.add_argument("--corpus", type=pathlib.Path, help="Directory of Markdown/text documents to index too")
+    parser.add_argument("--workers", type=int, help="Chunking processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, help="Encode batch size (default: tuned on the first chunks)")
+    parser.add_argument("--chunk-size", type=int, default=800, help="Document chunk size in characters")
+    parser.add_argument("--overlap", type=int, default=150, help="Characters shared by consecutive chunks")
+    parser.add_argument("--no-resume", action="store_true", help="Ignore any checkpoint and start over")
+    args = parser.parse_args()
+    
+    if args.export_onnx:
+        export_encoder()
+    elif args.check_onnx:
+        check_encoder()
+    else:
+        build_index(
+            corpus=args.corpus, workers=args.workers, batch_size=args.batch_size,
+            chunk_size=args.chunk_size, overlap=args.overlap, resume=not args.no_resume,
+        )
\ No newline at end of file
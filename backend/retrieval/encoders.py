@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Query encoders for DenseRetriever.
+
+TorchEncoder wraps sentence-transformers (pulls in torch). OnnxEncoder
+runs the same model exported to ONNX with int8 dynamic quantization on
+onnxruntime + tokenizers only, which starts in a fraction of the time and
+memory. Both return L2-normalized float32 embeddings, so the FAISS index
+built by embed_build.py works with either.
+
+Requirements (ONNX backend):
+    pip install onnxruntime tokenizers
+    python retrieval/embed_build.py --export-onnx      # needs torch + transformers once
+
+Env vars:
+    EMBED_BACKEND: auto, torch or onnx (default: auto = onnx when exported and onnxruntime is installed, else torch)
+    EMBED_ONNX_DIR: Exported model directory (default: models/all-MiniLM-L6-v2-onnx)
+    EMBED_THREADS: onnxruntime intra-op threads per query (default: 1; index builds use every core)
+
+Usage:
+    python retrieval/encoders.py --probe onnx           # startup, RSS and latency of one backend
+"""
+import argparse
+import importlib.util
+import json
+import os
+import pathlib
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+ONNX_DIR = ROOT / "models" / "all-MiniLM-L6-v2-onnx"
+MAX_TOKENS = 256  # all-MiniLM-L6-v2's max_seq_length
+
+
+class TorchEncoder:
+    """sentence-transformers on PyTorch (the reference implementation)."""
+
+    backend = "torch"
+
+    def __init__(self, model_name: str = MODEL_NAME):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name)
+
+    def encode(self, texts: List[str], normalize_embeddings: bool = True) -> np.ndarray:
+        embeddings = self.model.encode(texts, normalize_embeddings=normalize_embeddings)
+        return np.asarray(embeddings, dtype="float32")
+
+
+class OnnxEncoder:
+    """
+    Exported model on onnxruntime: tokenize, run the transformer, mean-pool
+    over real tokens and normalize, exactly like the sentence-transformers
+    pipeline for this model.
+    """
+
+    backend = "onnx"
+
+    def __init__(self, model_dir: pathlib.Path = ONNX_DIR, threads: int = 1):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_path = model_dir / "model.int8.onnx"
+        if not model_path.exists():
+            model_path = model_dir / "model.onnx"
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            str(model_path), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=MAX_TOKENS)
+        self.tokenizer.enable_padding()
+
+    def encode(self, texts: List[str], normalize_embeddings: bool = True) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(list(texts))
+        input_ids = np.array([e.ids for e in encodings], dtype="int64")
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype="int64")
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+        hidden = self.session.run(None, feeds)[0]  # (batch, tokens, dim)
+        mask = attention_mask[:, :, None].astype("float32")
+        embeddings = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        if normalize_embeddings:
+            embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings.astype("float32")
+
+
+def _onnx_installed() -> bool:
+    """Without importing them; the encoder does that when it's built."""
+    return all(importlib.util.find_spec(name) is not None for name in ("onnxruntime", "tokenizers"))
+
+
+def _onnx_dir() -> pathlib.Path:
+    return pathlib.Path(os.getenv("EMBED_ONNX_DIR", str(ONNX_DIR)))
+
+
+def get_encoder(threads: Optional[int] = None):
+    """
+    Build the encoder selected by EMBED_BACKEND. `threads` overrides
+    EMBED_THREADS for the ONNX backend (torch already uses every core).
+    """
+    backend = os.getenv("EMBED_BACKEND", "auto").lower()
+    model_dir = _onnx_dir()
+    if backend == "auto":
+        backend = "onnx" if (model_dir / "tokenizer.json").exists() and _onnx_installed() else "torch"
+    if backend == "onnx":
+        return OnnxEncoder(model_dir, threads=threads or int(os.getenv("EMBED_THREADS", "1")))
+    return TorchEncoder()
+
+
+# ========================================
+# Export (needs torch + transformers)
+# ========================================
+
+def export_onnx(out_dir: pathlib.Path = ONNX_DIR, model_name: str = MODEL_NAME, quantize: bool = True) -> pathlib.Path:
+    """
+    Export the transformer to ONNX with dynamic batch/sequence axes, save
+    its fast tokenizer, and write an int8 dynamically quantized copy.
+    Returns the path of the model the ONNX backend will load.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    tokenizer.save_pretrained(str(out_dir))  # writes tokenizer.json
+
+    sample = tokenizer(["an example query"], return_tensors="pt")
+    names = ["input_ids", "attention_mask", "token_type_ids"]
+    dynamic = {"batch": 0, "tokens": 1}
+    fp32_path = out_dir / "model.onnx"
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in names),
+            str(fp32_path),
+            input_names=names,
+            output_names=["last_hidden_state"],
+            dynamic_axes={name: dynamic for name in names + ["last_hidden_state"]},
+            opset_version=14,
+        )
+
+    if not quantize:
+        return fp32_path
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    int8_path = out_dir / "model.int8.onnx"
+    quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QInt8)
+    return int8_path
+
+
+# ========================================
+# Parity and resource checks
+# ========================================
+
+def parity(reference, candidate, texts: List[str]) -> Dict[str, float]:
+    """Cosine similarity between the two encoders' embeddings of the same texts."""
+    a = reference.encode(texts)
+    b = candidate.encode(texts)
+    cosine = (a * b).sum(axis=1)
+    return {"min_cosine": float(cosine.min()), "mean_cosine": float(cosine.mean())}
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource  # Unix only
+    except ImportError:
+        return 0.0
+    # Peak, not current, but close enough where /proc is missing (macOS reports bytes)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def probe(backend: str, queries: List[str], runs: int = 50) -> Dict[str, float]:
+    """Startup time, resident memory and per-query latency for one backend."""
+    started = time.perf_counter()
+    encoder = OnnxEncoder(_onnx_dir()) if backend == "onnx" else TorchEncoder()
+    encoder.encode(queries[:1])  # first call initializes kernels
+    startup = time.perf_counter() - started
+
+    latencies = []
+    for i in range(runs):
+        t = time.perf_counter()
+        encoder.encode([queries[i % len(queries)]])
+        latencies.append(time.perf_counter() - t)
+    latencies.sort()
+    return {
+        "backend": backend,
+        "startup_s": round(startup, 2),
+        "rss_mb": round(_rss_mb(), 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 2),
+    }
+
+
+def probe_in_subprocess(backend: str) -> Dict[str, float]:
+    """Run probe() in a fresh interpreter so startup and RSS aren't shared."""
+    result = subprocess.run(
+        [sys.executable, str(pathlib.Path(__file__).resolve()), "--probe", backend],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+SAMPLE_QUERIES = [
+    "What is your core tech stack?",
+    "Tell me about your data pipeline projects",
+    "Where did you study?",
+    "Which cloud platforms have you used in production?",
+    "What measurable impact did your work have?",
+]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure one query-encoder backend")
+    parser.add_argument("--probe", choices=["torch", "onnx"], required=True)
+    args = parser.parse_args()
+    print(json.dumps(probe(args.probe, SAMPLE_QUERIES)))
@@ -0,0 +1,301 @@
+"""
+Streaming, parallel, resumable index builder.
+
+Documents (Markdown/text files under a corpus directory) are chunked with
+overlap in a process pool, encoded in batches and appended to the FAISS
+index as they arrive. Chunk metadata is streamed to a JSON Lines file, so
+apart from the index's own vectors the builder holds at most a bounded
+window of documents and one batch in memory, whatever the corpus size.
+
+Every few thousand chunks the partial index, metadata and a small state
+file are written at a document boundary; an interrupted build started
+again with the same settings resumes from the last checkpoint.
+
+Used by embed_build.py; see its --corpus/--workers/--batch-size/--resume.
+"""
+import hashlib
+import json
+import os
+import pathlib
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+DOC_SUFFIXES = {".md", ".markdown", ".txt"}
+_HEADING = re.compile(r"^#{1,6}\s+(.*)$")
+
+
+# ========================================
+# Documents and chunking (runs in worker processes)
+# ========================================
+
+def iter_documents(corpus_dir: pathlib.Path) -> Iterator[pathlib.Path]:
+    """Markdown and text files under `corpus_dir`, in a stable order."""
+    for path in sorted(corpus_dir.rglob("*")):
+        if path.is_file() and path.suffix.lower() in DOC_SUFFIXES:
+            yield path
+
+
+def _windows(words: List[str], size: int, overlap: int) -> Iterator[str]:
+    """Word-aligned windows of about `size` chars sharing about `overlap` chars."""
+    start = 0
+    while start < len(words):
+        end, length = start, 0
+        while end < len(words) and (end == start or length + len(words[end]) + 1 <= size):
+            length += len(words[end]) + 1
+            end += 1
+        yield " ".join(words[start:end])
+        if end >= len(words):
+            return
+        back, kept = end, 0
+        while back > start + 1 and kept + len(words[back - 1]) + 1 <= overlap:
+            back -= 1
+            kept += len(words[back]) + 1
+        start = back
+
+
+def chunk_document(path: str, root: str, size: int = 800, overlap: int = 150) -> List[Dict[str, str]]:
+    """
+    Split one document into overlapping chunks. Markdown headings start a
+    new block and are kept as the chunk's field, so every chunk carries
+    the title and heading it came from.
+    """
+    rel = os.path.relpath(path, root)
+    with open(path, encoding="utf-8", errors="replace") as f:
+        lines = f.read().splitlines()
+
+    title = pathlib.Path(rel).stem.replace("_", " ").replace("-", " ")
+    blocks: List[tuple] = []  # (heading, words)
+    heading, words = "", []
+    for line in lines:
+        match = _HEADING.match(line)
+        if match:
+            if words:
+                blocks.append((heading, words))
+            heading, words = match.group(1).strip(), []
+        else:
+            words.extend(line.split())
+    if words:
+        blocks.append((heading, words))
+
+    chunks = []
+    for heading, block_words in blocks:
+        prefix = f"Document: {title}" + (f"\nSection: {heading}" if heading else "")
+        for window in _windows(block_words, size, overlap):
+            chunks.append({
+                "id": f"doc:{rel}:{len(chunks)}",
+                "section": "documents",
+                "field": heading,
+                "source": rel,
+                "text": f"{prefix}\n{window}",
+            })
+    return chunks
+
+
+def _chunk_task(args: tuple) -> List[Dict[str, str]]:
+    return chunk_document(*args)
+
+
+def _bounded_map(executor, fn: Callable, items: Iterable, window: int) -> Iterator:
+    """Like executor.map, in order, but with at most `window` tasks in flight."""
+    pending = []
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.pop(0).result()
+    for future in pending:
+        yield future.result()
+
+
+# ========================================
+# Builder
+# ========================================
+
+class IndexBuilder:
+    """Appends encoded chunks to a FAISS index with periodic checkpoints."""
+
+    def __init__(
+        self,
+        encoder,
+        index_path: pathlib.Path,
+        meta_path: pathlib.Path,
+        settings: dict,
+        batch_size: Optional[int] = None,
+        checkpoint_every: int = 2048,
+        log: Callable[[str], None] = print,
+    ):
+        self.encoder = encoder
+        self.index_path = index_path
+        self.meta_path = meta_path
+        self.partial_index = index_path.with_name(index_path.name + ".partial")
+        self.partial_meta = meta_path.with_name(meta_path.name + ".partial")
+        self.state_path = index_path.with_name(index_path.name + ".state.json")
+        self.fingerprint = hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        self.batch_size = batch_size
+        self.checkpoint_every = checkpoint_every
+        self.log = log
+
+        self.index = None
+        self.meta_file = None
+        self.done_docs = 0  # documents fully in the index (resume point)
+        self.chunks = 0
+        self._buffer: List[Dict[str, str]] = []
+        self._since_checkpoint = 0
+
+    # ---- lifecycle ----
+
+    def open(self, resume: bool) -> int:
+        """Start or resume a build. Returns the number of documents to skip."""
+        import faiss
+
+        state = self._read_state() if resume else None
+        if state and state.get("fingerprint") == self.fingerprint and self.partial_index.exists():
+            self.index = faiss.read_index(str(self.partial_index))
+            self.done_docs, self.chunks = state["done_docs"], state["chunks"]
+            self._truncate_meta(self.chunks)
+            self.meta_file = open(self.partial_meta, "a", encoding="utf-8")
+            self.log(f"↻ Resuming after {self.done_docs} documents ({self.chunks} chunks)")
+        else:
+            self.meta_file = open(self.partial_meta, "w", encoding="utf-8")
+        return self.done_docs
+
+    def add_document(self, chunks: List[Dict[str, str]]) -> None:
+        """Queue one document's chunks; encodes full batches as they fill."""
+        self._buffer.extend(chunks)
+        if self.batch_size is None and len(self._buffer) >= 256:
+            self.batch_size = tune_batch_size(self.encoder, [c["text"] for c in self._buffer[:256]])
+            self.log(f"⚙️  Encoding in batches of {self.batch_size}")
+        size = self.batch_size or 64
+        while len(self._buffer) >= size:
+            self._encode(self._buffer[:size])
+            del self._buffer[:size]
+
+        # Checkpoint only at document boundaries, with nothing buffered
+        self.done_docs += 1
+        if self._since_checkpoint >= self.checkpoint_every:
+            self._flush()
+            self._checkpoint()
+
+    def finish(self) -> int:
+        """Encode the tail, move the files into place and drop the state."""
+        self._flush()
+        self.meta_file.close()
+        if self.index is None:
+            raise RuntimeError("No chunks to index")
+        import faiss
+
+        faiss.write_index(self.index, str(self.partial_index))
+        os.replace(self.partial_index, self.index_path)
+        os.replace(self.partial_meta, self.meta_path)
+        self.state_path.unlink(missing_ok=True)
+        return self.chunks
+
+    # ---- internals ----
+
+    def _flush(self) -> None:
+        if self._buffer:
+            self._encode(self._buffer)
+            self._buffer = []
+
+    def _encode(self, batch: List[Dict[str, str]]) -> None:
+        import faiss
+
+        vectors = self.encoder.encode([c["text"] for c in batch], normalize_embeddings=True)
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        if self.index is None:
+            self.index = faiss.IndexFlatIP(vectors.shape[1])  # Inner product (cosine similarity)
+        self.index.add(vectors)
+        for chunk in batch:
+            self.meta_file.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+        self.chunks += len(batch)
+        self._since_checkpoint += len(batch)
+
+    def _checkpoint(self) -> None:
+        import faiss
+
+        self.meta_file.flush()
+        os.fsync(self.meta_file.fileno())
+        faiss.write_index(self.index, str(self.partial_index))
+        tmp = self.state_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({
+            "fingerprint": self.fingerprint, "done_docs": self.done_docs, "chunks": self.chunks,
+        }))
+        os.replace(tmp, self.state_path)
+        self._since_checkpoint = 0
+        self.log(f"💾 Checkpoint: {self.done_docs} documents, {self.chunks} chunks")
+
+    def _read_state(self) -> Optional[dict]:
+        try:
+            return json.loads(self.state_path.read_text())
+        except (OSError, ValueError):
+            return None
+
+    def _truncate_meta(self, lines: int) -> None:
+        """Drop metadata written after the last checkpoint."""
+        with open(self.partial_meta, "r+b") as f:
+            for _ in range(lines):
+                if not f.readline():
+                    break
+            f.truncate()
+
+
+def tune_batch_size(encoder, sample: List[str], candidates=(16, 32, 64, 128, 256)) -> int:
+    """Pick the batch size with the best chunks/second on a sample."""
+    best, best_rate = candidates[0], 0.0
+    encoder.encode(sample[:candidates[0]])  # warm-up
+    for size in candidates:
+        if size > len(sample):
+            break
+        started = time.perf_counter()
+        encoder.encode(sample[:size])
+        rate = size / max(time.perf_counter() - started, 1e-9)
+        if rate > best_rate:
+            best, best_rate = size, rate
+    return best
+
+
+def build(
+    encoder,
+    index_path: pathlib.Path,
+    meta_path: pathlib.Path,
+    base_chunks: List[Dict[str, str]],
+    corpus_dir: Optional[pathlib.Path] = None,
+    workers: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    chunk_size: int = 800,
+    overlap: int = 150,
+    resume: bool = True,
+    settings: Optional[dict] = None,
+    log: Callable[[str], None] = print,
+) -> int:
+    """
+    Index `base_chunks` (the portfolio) followed by every document under
+    `corpus_dir`. Returns the number of chunks indexed.
+    """
+    workers = workers or os.cpu_count() or 1
+    settings = dict(settings or {}, corpus=str(corpus_dir or ""), chunk_size=chunk_size, overlap=overlap)
+    builder = IndexBuilder(encoder, index_path, meta_path, settings, batch_size=batch_size, log=log)
+    skip = builder.open(resume)
+
+    # The portfolio counts as document 0
+    if skip == 0:
+        builder.add_document(base_chunks)
+    skip = max(skip - 1, 0)
+
+    if corpus_dir is not None:
+        root = str(corpus_dir)
+        paths = (str(p) for i, p in enumerate(iter_documents(corpus_dir)) if i >= skip)
+        tasks = ((path, root, chunk_size, overlap) for path in paths)
+        started, docs = time.perf_counter(), 0
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for chunks in _bounded_map(executor, _chunk_task, tasks, window=workers * 4):
+                builder.add_document(chunks)
+                docs += 1
+                if docs % 500 == 0:
+                    rate = builder.chunks / max(time.perf_counter() - started, 1e-9)
+                    log(f"   {docs} documents, {builder.chunks} chunks ({rate:.0f} chunks/s)")
+
+    return builder.finish()
@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+"""
+Learned intent router.
+
+A small linear model over hashed n-gram features predicts which portfolio
+section a question is about and whether a templated answer (the
+rule-based provider's) is enough. Confident lookups skip the LLM, and
+the predicted section narrows retrieval for everything else.
+
+Training data: portfolio/intent_questions.jsonl (hand-labeled) plus
+questions generated from portfolio.json field values. Training takes
+about a second; a missing or stale model (new portfolio version, or
+edited questions/templates) is retrained in a background thread while
+requests keep using the previous one.
+
+Requirements:
+    pip install numpy
+
+Env vars:
+    INTENT_ROUTER: true/false (default: true)
+    INTENT_THRESHOLD: Min confidence to answer from a template (default: 0.85)
+    INTENT_ROUTE_THRESHOLD: Min confidence to narrow retrieval to a section (default: 0.6)
+
+Usage:
+    python retrieval/intent.py          # train, report held-out accuracy, save
+"""
+import json
+import os
+import pathlib
+import random
+import re
+import sys
+import threading
+import zlib
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional: pip install numpy
+    np = None
+
+if __name__ == "__main__":
+    sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+from observability.logs import get_logger
+from retrieval.store import ROOT, load_portfolio, portfolio_version, section_items
+
+logger = get_logger("retrieval.intent")
+
+QUESTIONS_PATH = ROOT / "portfolio" / "intent_questions.jsonl"
+MODEL_PATH = ROOT / "portfolio" / "intent_model.npz"
+
+# Same names as RuleBasedProvider's intents
+LABELS = ("skills", "projects", "experience", "education", "certifications", "contact", "overview")
+
+# Label -> section name understood by store.route_section (None: whole portfolio)
+ROUTE_SECTIONS = {
+    "skills": "SKILLS",
+    "projects": "PROJECTS",
+    "experience": "EXPERIENCE",
+    "education": "EDUCATION",
+    "certifications": "CERTIFICATIONS",
+}
+
+DIM = 1 << 14
+_TOKEN = re.compile(r"[a-z0-9+#]+")
+
+
+# ========================================
+# Features
+# ========================================
+
+def featurize(question: str) -> List[int]:
+    """Hashed word unigrams, bigrams and in-word character trigrams."""
+    tokens = _TOKEN.findall(question.lower())
+    features = [f"w:{t}" for t in tokens]
+    features += [f"b:{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+    for t in tokens:
+        padded = f"<{t}>"
+        features += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    return sorted({zlib.crc32(f.encode("utf-8")) % DIM for f in features})
+
+
+@dataclass
+class IntentPrediction:
+    section: str
+    confidence: float
+    lookup: bool
+    lookup_confidence: float
+    sections: List[Tuple[str, float]]
+
+    @property
+    def route_section(self) -> Optional[str]:
+        return ROUTE_SECTIONS.get(self.section)
+
+
+# ========================================
+# Model
+# ========================================
+
+class IntentRouter:
+    """Softmax over sections plus one logistic 'answerable from a template' head."""
+
+    def __init__(self, weights, bias, labels=LABELS, version: str = "", data: str = ""):
+        self.weights = weights  # (DIM, len(labels) + 1), last column is the lookup head
+        self.bias = bias
+        self.labels = tuple(labels)
+        self.version = version  # portfolio version it was trained for
+        self.data = data        # training_digest() of the questions and templates
+        self.predictions = 0
+        self.template_answers = 0
+
+    def predict(self, question: str) -> IntentPrediction:
+        idx = featurize(question)
+        self.predictions += 1
+        if idx:
+            logits = self.weights[idx].sum(axis=0) / np.sqrt(len(idx)) + self.bias
+        else:
+            logits = self.bias.copy()
+
+        section_logits = logits[:-1]
+        probs = np.exp(section_logits - section_logits.max())
+        probs /= probs.sum()
+        order = np.argsort(probs)[::-1]
+        lookup_p = float(1.0 / (1.0 + np.exp(-logits[-1])))
+
+        best = int(order[0])
+        return IntentPrediction(
+            section=self.labels[best],
+            confidence=float(probs[best]),
+            lookup=lookup_p >= 0.5,
+            lookup_confidence=lookup_p,
+            sections=[(self.labels[int(i)], float(probs[i])) for i in order[:3]],
+        )
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "predictions": self.predictions,
+            "template_answers": self.template_answers,
+        }
+
+    def save(self, path: pathlib.Path = MODEL_PATH) -> None:
+        # Per process: every worker may retrain after a portfolio change
+        tmp = path.with_name(f".{path.stem}.{os.getpid()}.tmp.npz")
+        np.savez_compressed(
+            tmp, weights=self.weights.astype(np.float32), bias=self.bias,
+            labels=np.array(self.labels), version=np.array(self.version), data=np.array(self.data),
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: pathlib.Path = MODEL_PATH) -> "IntentRouter":
+        with np.load(path) as f:
+            return cls(
+                f["weights"], f["bias"],
+                labels=[str(label) for label in f["labels"]], version=str(f["version"]),
+                data=str(f["data"]) if "data" in f else "",
+            )
+
+
+def train(examples: List[Tuple[str, str, bool]], epochs: int = 120, lr: float = 0.05,
+          l2: float = 1e-5, version: str = "", data: str = "") -> IntentRouter:
+    """Full-batch Adam on the sparse features; cross-entropy + logistic loss."""
+    n, k = len(examples), len(LABELS)
+    rows, cols, vals = [], [], []
+    for i, (question, _, _) in enumerate(examples):
+        idx = featurize(question)
+        rows += [i] * len(idx)
+        cols += idx
+        vals += [1.0 / np.sqrt(max(len(idx), 1))] * len(idx)
+    rows, cols = np.array(rows), np.array(cols)
+    vals = np.array(vals, dtype=np.float32)[:, None]
+
+    y = np.array([LABELS.index(section) for _, section, _ in examples])
+    lookup = np.array([float(flag) for _, _, flag in examples], dtype=np.float32)
+
+    weights = np.zeros((DIM, k + 1), dtype=np.float32)
+    bias = np.zeros(k + 1, dtype=np.float32)
+    m_w, v_w = np.zeros_like(weights), np.zeros_like(weights)
+    m_b, v_b = np.zeros_like(bias), np.zeros_like(bias)
+    beta1, beta2, eps = 0.9, 0.999, 1e-8
+
+    for step in range(1, epochs + 1):
+        logits = np.zeros((n, k + 1), dtype=np.float32)
+        np.add.at(logits, rows, weights[cols] * vals)
+        logits += bias
+
+        section_logits = logits[:, :k]
+        probs = np.exp(section_logits - section_logits.max(axis=1, keepdims=True))
+        probs /= probs.sum(axis=1, keepdims=True)
+        grad = np.empty_like(logits)
+        grad[:, :k] = probs
+        grad[np.arange(n), y] -= 1.0
+        grad[:, k] = 1.0 / (1.0 + np.exp(-logits[:, k])) - lookup
+        grad /= n
+
+        grad_w = np.zeros_like(weights)
+        np.add.at(grad_w, cols, grad[rows] * vals)
+        grad_w += l2 * weights
+        grad_b = grad.sum(axis=0)
+
+        for param, g, m, v in ((weights, grad_w, m_w, v_w), (bias, grad_b, m_b, v_b)):
+            m *= beta1
+            m += (1 - beta1) * g
+            v *= beta2
+            v += (1 - beta2) * g * g
+            param -= lr * (m / (1 - beta1 ** step)) / (np.sqrt(v / (1 - beta2 ** step)) + eps)
+
+    return IntentRouter(weights, bias, version=version, data=data)
+
+
+# ========================================
+# Training data
+# ========================================
+
+# (section, answerable from a template, question templates)
+_SYNTHETIC = [
+    ("skills", True, [
+        "what are your skills", "what technologies do you know", "list your tech stack",
+        "which {category} tools do you use", "what languages and frameworks do you use",
+    ]),
+    # Questions naming one entity need an answer about that entity, which
+    # the section templates don't give ("do you know Rust" -> skill list)
+    ("skills", False, [
+        "do you know {skill}", "have you used {skill}",
+        "how strong are you in {skill}", "how did you learn {skill}",
+        "how would you use {skill} to solve a hard problem", "explain your approach to {category} work",
+    ]),
+    ("projects", True, [
+        "what projects have you built", "show me your projects", "list your projects",
+        "do you have a demo", "github links for your projects",
+    ]),
+    ("projects", False, [
+        "tell me about {project}", "what was the impact of {project}", "how did you build {project}",
+        "why did you use {stack} for {project}", "what challenges did you face on {project}",
+    ]),
+    ("experience", True, [
+        "where have you worked", "list your work experience", "what companies have you worked at",
+    ]),
+    ("experience", False, [
+        "what was your role at {company}", "how long were you at {company}",
+        "what did you achieve at {company}", "describe your responsibilities as {role}",
+        "what did you learn working as {role} at {company}", "how did your work at {company} impact the business",
+    ]),
+    ("education", True, [
+        "what is your education", "where did you study", "what degree do you have",
+        "what did you study",
+    ]),
+    ("education", False, [
+        "did you study at {institution}",
+        "how did your {field} degree prepare you", "what was your favorite course at {institution}",
+    ]),
+    ("certifications", True, [
+        "list your certifications", "do you have any certifications", "what certificates do you have",
+        "are you certified",
+    ]),
+    ("contact", True, [
+        "how can i contact you", "what is your email", "share your linkedin", "how do i reach you",
+        "what is your phone number",
+    ]),
+    ("overview", True, [
+        "tell me about yourself", "who are you", "introduce yourself", "hello", "give me a summary",
+    ]),
+    ("overview", False, [
+        "why should we hire you", "what are your career goals", "what makes you a strong candidate",
+        "are you a good fit for this role", "what are your biggest strengths",
+    ]),
+]
+
+_WRAPPERS = ("{}", "{}?", "can you tell me {}", "please {}", "quick question: {}")
+
+
+def _field_values(portfolio: dict) -> Dict[str, List[str]]:
+    sections = {
+        name: [item for item in section_items(portfolio, name) if isinstance(item, dict)]
+        for name in ("skills", "projects", "experience", "education")
+    }
+
+    def values(section: str, key: str) -> List[str]:
+        return sorted({str(item[key]) for item in sections[section] if item.get(key)})
+
+    stacks = [" and ".join(p["stack"][:2]) for p in sections["projects"] if p.get("stack")]
+    return {
+        "skill": values("skills", "name"),
+        "category": values("skills", "category"),
+        "project": values("projects", "name"),
+        "stack": stacks,
+        "company": values("experience", "company"),
+        "role": values("experience", "role"),
+        "institution": values("education", "institution"),
+        "field": values("education", "field"),
+    }
+
+
+def synthetic_questions(portfolio: dict, per_template: int = 6, seed: int = 0) -> List[Tuple[str, str, bool]]:
+    """Fill the templates above with values from the portfolio."""
+    rng = random.Random(seed)
+    fields = _field_values(portfolio)
+    examples = []
+    for section, lookup, templates in _SYNTHETIC:
+        for template in templates:
+            names = re.findall(r"{(\w+)}", template)
+            if any(not fields.get(name) for name in names):
+                continue
+            for _ in range(per_template if names else 2):
+                question = template.format(**{name: rng.choice(fields[name]) for name in names})
+                examples.append((rng.choice(_WRAPPERS).format(question), section, lookup))
+    return examples
+
+
+def labeled_questions(path: pathlib.Path = QUESTIONS_PATH) -> List[Tuple[str, str, bool]]:
+    examples = []
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    examples.append((row["question"], row["section"], bool(row.get("lookup"))))
+    except OSError as e:
+        logger.warning("Could not read labeled intents", extra={"fields": {"error": str(e)}})
+    return examples
+
+
+def training_digest() -> str:
+    """Changes when the labeled questions or the templates do, so a saved model is retrained."""
+    try:
+        labeled = QUESTIONS_PATH.read_bytes()
+    except OSError:
+        labeled = b""
+    return f"{zlib.crc32(labeled):08x}{zlib.crc32(repr(_SYNTHETIC).encode('utf-8')):08x}"
+
+
+def training_data(labeled: Optional[List[Tuple[str, str, bool]]] = None) -> List[Tuple[str, str, bool]]:
+    labeled = labeled_questions() if labeled is None else labeled
+    # Hand-labeled questions are few but closest to real traffic; weight them up
+    return labeled * 3 + synthetic_questions(load_portfolio())
+
+
+# ========================================
+# Process-wide instance
+# ========================================
+
+_router: Optional[IntentRouter] = None
+_router_lock = threading.Lock()     # held while loading or training
+_training_lock = threading.Lock()   # only guards _training, never held long
+_training: Optional[threading.Thread] = None
+
+
+def _enabled() -> bool:
+    return np is not None and os.getenv("INTENT_ROUTER", "true").lower() == "true"
+
+
+def get_intent_router() -> Optional[IntentRouter]:
+    """
+    Return the router, loading or (re)training it for the current
+    portfolio version. None when disabled or numpy is missing.
+
+    Blocks while training; request handlers use current_intent_router().
+    """
+    global _router
+    if not _enabled():
+        return None
+
+    version = portfolio_version()
+    if _router is not None and _router.version == version:
+        return _router
+
+    with _router_lock:
+        if _router is not None and _router.version == version:
+            return _router
+        try:
+            router = IntentRouter.load(MODEL_PATH)
+        except Exception:
+            router = None
+        data = training_digest()
+        if router is None or router.version != version or router.data != data:
+            router = train(training_data(), version=version, data=data)
+            try:
+                router.save(MODEL_PATH)
+            except OSError as e:
+                logger.warning("Could not save intent model", extra={"fields": {"error": str(e)}})
+            logger.info("Trained intent router", extra={"fields": {"version": version}})
+        _router = router
+    return _router
+
+
+def reset_intent_router() -> None:
+    """Forget the loaded router; the next get_intent_router() reloads or retrains it."""
+    global _router
+    with _router_lock:
+        _router = None
+
+
+def current_intent_router() -> Optional[IntentRouter]:
+    """
+    The router without blocking: when the portfolio has changed, training
+    starts in a background thread and the previous router (or None before
+    the first one exists) is returned until it finishes.
+    """
+    global _training
+    if not _enabled():
+        return None
+    router = _router
+    if router is not None and router.version == portfolio_version():
+        return router
+    with _training_lock:
+        if _training is None or not _training.is_alive():
+            _training = threading.Thread(target=_train_quietly, name="intent-router", daemon=True)
+            _training.start()
+    return router
+
+
+def _train_quietly() -> None:
+    try:
+        get_intent_router()
+    except Exception:
+        logger.exception("Intent router training failed")
+
+
+def _main() -> int:
+    if np is None:
+        print("❌ numpy not installed")
+        print("   Install with: pip install numpy")
+        return 1
+
+    # Evaluate on hand-labeled questions the model has not seen
+    labeled = labeled_questions()
+    random.Random(1).shuffle(labeled)
+    split = int(len(labeled) * 0.7)
+    held_out = labeled[split:]
+    model = train(training_data(labeled[:split]))
+
+    section_hits = lookup_hits = 0
+    for question, section, lookup in held_out:
+        prediction = model.predict(question)
+        section_hits += prediction.section == section
+        lookup_hits += prediction.lookup == lookup
+    print(f"Held-out labeled questions: {len(held_out)}")
+    print(f"Section accuracy: {section_hits / len(held_out):.1%}")
+    print(f"Lookup accuracy:  {lookup_hits / len(held_out):.1%}")
+
+    examples = training_data(labeled)
+    router = train(examples, version=portfolio_version(), data=training_digest())
+    router.save(MODEL_PATH)
+    print(f"✓ Saved model to: {MODEL_PATH}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main())
@@ -0,0 +1,79 @@
+"""
+Redundancy-aware selection of retrieved chunks.
+
+DenseRetriever over-fetches candidates from FAISS and passes their stored
+vectors here. select() then picks chunks by maximal marginal relevance
+(relevance to the question minus similarity to what's already picked)
+until it has `k` chunks or the token budget is spent, so near-duplicates
+("Skill: Python - Level ...", "Skill: Pandas - Level ...") stop crowding
+out other information. Candidates below a minimum score are dropped
+outright; the best one is always kept.
+
+Requirements:
+    pip install numpy
+
+Env vars:
+    RAG_OVERFETCH: Candidates fetched per chunk kept (default: 4)
+    RAG_MMR_LAMBDA: Relevance vs. diversity, 1.0 = plain top-k (default: 0.7)
+    RAG_MIN_SCORE: Min cosine similarity for chunks after the first (default: 0.25)
+    RAG_TOKEN_BUDGET: Max context tokens, ~4 chars per token (default: 500)
+"""
+import math
+import os
+from typing import List, Sequence
+
+import numpy as np
+
+OVERFETCH = int(os.getenv("RAG_OVERFETCH", "4"))
+LAMBDA = float(os.getenv("RAG_MMR_LAMBDA", "0.7"))
+MIN_SCORE = float(os.getenv("RAG_MIN_SCORE", "0.25"))
+TOKEN_BUDGET = int(os.getenv("RAG_TOKEN_BUDGET", "500"))
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, math.ceil(len(text) / 4))
+
+
+def select(
+    scores: np.ndarray,
+    vectors: np.ndarray,
+    tokens: Sequence[int],
+    k: int,
+    token_budget: int = TOKEN_BUDGET,
+    lambda_: float = LAMBDA,
+    min_score: float = MIN_SCORE,
+) -> List[int]:
+    """
+    Indices into the candidates, in pick order.
+
+    scores:  (n,) inner products with the question (normalized vectors)
+    vectors: (n, d) the candidates' normalized embeddings
+    tokens:  (n,) estimated size of each candidate
+    """
+    n = len(scores)
+    if n == 0 or k <= 0:
+        return []
+    scores = np.asarray(scores, dtype=np.float32)
+    tokens = np.asarray(tokens)
+
+    # All pairwise similarities at once; n is a few dozen
+    similarity = vectors @ vectors.T
+    closest = np.zeros(n, dtype=np.float32)           # max similarity to a picked chunk
+    available = scores >= min_score
+    available[int(np.argmax(scores))] = True          # never return nothing
+
+    picked: List[int] = []
+    left = token_budget
+    while len(picked) < k:
+        # The first pick is allowed over budget so there's always context
+        candidates = available & (tokens <= left) if picked else available
+        if not candidates.any():
+            break
+        mmr = np.where(candidates, lambda_ * scores - (1 - lambda_) * closest, -np.inf)
+        best = int(np.argmax(mmr))
+
+        picked.append(best)
+        available[best] = False
+        left -= int(tokens[best])
+        np.maximum(closest, similarity[best], out=closest)
+    return picked
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Sectioned, memory-mapped portfolio storage.
+
+portfolio.pack is compiled from portfolio.json (which stays the file you
+edit). Opening it reads only a small header; each section is decoded the
+first time it's accessed and cached, so a request that needs the
+projects never parses skills or experience, and a reload costs one
+header read instead of a full json.load.
+
+Layout:
+    b"PFPACK1\\n"
+    uint32 (little-endian) header length
+    header: JSON {"format": 1, "version": ..., "source_bytes": ..., "sections": [...]}
+    section blobs: compact UTF-8 JSON, offsets relative to the end of the header
+
+Each header section entry is [name, offset, length, items]. For list
+sections, `items` holds [offset, length] of every element inside the
+section blob, so one project can be decoded on its own; it is null for
+other sections. "version" is the same content hash portfolio_version()
+gives the JSON, so caches keyed by it survive switching formats.
+
+The store uses the pack when it is at least as new as portfolio.json
+and "source_bytes" matches the JSON's size.
+
+Env vars:
+    PORTFOLIO_PACK: auto (use portfolio.pack when up to date) or false (default: auto)
+
+Usage:
+    python retrieval/packed.py                  # compile portfolio/portfolio.json -> portfolio/portfolio.pack
+    python retrieval/packed.py --check          # verify the pack round-trips to the JSON
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import pathlib
+import struct
+import sys
+import threading
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+MAGIC = b"PFPACK1\n"
+FORMAT = 1
+_HEADER_LEN = struct.Struct("<I")
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+
+
+def source_version(raw: bytes) -> str:
+    """Same hash store.load_portfolio() gives the JSON source."""
+    return hashlib.sha256(raw).hexdigest()[:16]
+
+
+def _encode(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+# ========================================
+# Compile
+# ========================================
+
+def compile_pack(source: pathlib.Path, target: pathlib.Path) -> dict:
+    """Write `target` from the JSON at `source` (atomically). Returns the header."""
+    raw = source.read_bytes()
+    data = json.loads(raw)
+    if not isinstance(data, dict):
+        raise ValueError(f"{source}: expected a JSON object at the top level")
+
+    blobs: List[bytes] = []
+    sections = []
+    offset = 0
+    for name, value in data.items():
+        items = None
+        if isinstance(value, list):
+            # "[a,b,c]": the section is still one JSON document, and each
+            # element's slice of it is one too
+            parts = [_encode(item) for item in value]
+            items, position = [], 1
+            for part in parts:
+                items.append([position, len(part)])
+                position += len(part) + 1
+            blob = b"[" + b",".join(parts) + b"]"
+        else:
+            blob = _encode(value)
+        sections.append([name, offset, len(blob), items])
+        blobs.append(blob)
+        offset += len(blob)
+
+    header = {"format": FORMAT, "version": source_version(raw), "source_bytes": len(raw), "sections": sections}
+    header_bytes = _encode(header)
+
+    tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(_HEADER_LEN.pack(len(header_bytes)))
+        f.write(header_bytes)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp, target)
+    return header
+
+
+# ========================================
+# Read
+# ========================================
+
+class PackedPortfolio(Mapping):
+    """
+    Read-only mapping over a portfolio.pack. Sections are decoded on first
+    access and cached; treat the values as read-only, like the dict
+    load_portfolio() returns for JSON.
+    """
+
+    def __init__(self, path: pathlib.Path):
+        self.path = pathlib.Path(path)
+        with open(self.path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        prefix = len(MAGIC) + _HEADER_LEN.size
+        if len(self._map) < prefix or self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{self.path}: not a portfolio pack")
+        (header_len,) = _HEADER_LEN.unpack(self._map[len(MAGIC):prefix])
+        header = json.loads(self._map[prefix:prefix + header_len])
+        if header.get("format") != FORMAT:
+            raise ValueError(f"{self.path}: unsupported pack format {header.get('format')}")
+
+        self.version: str = header["version"]
+        self.source_bytes: int = header["source_bytes"]
+        self._data_start = prefix + header_len
+        self._sections: Dict[str, Tuple[int, int, Optional[List[List[int]]]]] = {
+            name: (offset, length, items) for name, offset, length, items in header["sections"]
+        }
+        self._decoded: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    # ---- Mapping ----
+
+    def __getitem__(self, name: str) -> Any:
+        try:
+            return self._decoded[name]
+        except KeyError:
+            pass
+        if name not in self._sections:
+            raise KeyError(name)
+        offset, length, _ = self._sections[name]
+        start = self._data_start + offset
+        value = json.loads(self._map[start:start + length])
+        with self._lock:
+            return self._decoded.setdefault(name, value)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._sections)
+
+    def __len__(self) -> int:
+        return len(self._sections)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._sections  # without decoding it
+
+    # ---- partial access ----
+
+    def item_count(self, name: str) -> int:
+        items = self._sections[name][2]
+        if items is None:
+            raise TypeError(f"Section {name!r} is not a list")
+        return len(items)
+
+    def item(self, name: str, index: int) -> Any:
+        """One element of a list section, without decoding the others."""
+        if name in self._decoded:
+            return self._decoded[name][index]
+        offset, _, items = self._sections[name]
+        if items is None:
+            raise TypeError(f"Section {name!r} is not a list")
+        item_offset, length = items[index]
+        start = self._data_start + offset + item_offset
+        return json.loads(self._map[start:start + length])
+
+    def loaded(self) -> List[str]:
+        """Sections decoded so far."""
+        return list(self._decoded)
+
+
+# ========================================
+# CLI
+# ========================================
+
+def check(source: pathlib.Path, target: pathlib.Path) -> List[str]:
+    """Differences between the pack and its JSON source (empty if faithful)."""
+    raw = source.read_bytes()
+    expected = json.loads(raw)
+    packed = PackedPortfolio(target)
+    problems = []
+    if packed.version != source_version(raw):
+        problems.append(f"version {packed.version} != {source_version(raw)} (recompile)")
+    if list(packed) != list(expected):
+        problems.append(f"sections {list(packed)} != {list(expected)}")
+    for name, value in expected.items():
+        if name in packed and packed[name] != value:
+            problems.append(f"section {name!r} differs")
+        if isinstance(value, list) and name in packed:
+            for i, item in enumerate(value):
+                if packed.item(name, i) != item:
+                    problems.append(f"{name}[{i}] differs")
+    return problems
+
+
+def _main() -> int:
+    parser = argparse.ArgumentParser(description="Compile portfolio.json into a sectioned, mmap-able pack")
+    parser.add_argument("--source", type=pathlib.Path, default=ROOT / "portfolio" / "portfolio.json")
+    parser.add_argument("--out", type=pathlib.Path, help="Default: the source path with a .pack suffix")
+    parser.add_argument("--check", action="store_true", help="Only verify an existing pack against the source")
+    args = parser.parse_args()
+    target = args.out or args.source.with_suffix(".pack")
+
+    if not args.check:
+        header = compile_pack(args.source, target)
+        print(f"✓ Wrote {target} ({target.stat().st_size} bytes, {len(header['sections'])} sections, "
+              f"version {header['version']})")
+
+    problems = check(args.source, target)
+    for problem in problems:
+        print(f"❌ {problem}")
+    if not problems:
+        print("✓ Pack matches the JSON source")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main())
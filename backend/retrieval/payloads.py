@@ -0,0 +1,146 @@
+"""
+Pre-serialized, pre-compressed portfolio payloads for /api/sections.
+
+Each (portfolio version, projection) pair is serialized to JSON and
+compressed once; requests then just pick the right bytes. The portfolio
+version doubles as a strong ETag so unchanged clients get a 304.
+"""
+import gzip
+import hashlib
+import json
+from typing import Dict, Iterable, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from .store import load_portfolio, portfolio_version
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli
+    brotli = None
+
+
+class EncodedPayload:
+    """One JSON document in every encoding we serve, plus its ETags."""
+
+    __slots__ = ("etag", "bodies")
+
+    def __init__(self, data, etag: str):
+        raw = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.etag = etag
+        self.bodies: Dict[str, bytes] = {
+            "identity": raw,
+            "gzip": gzip.compress(raw, compresslevel=9, mtime=0),
+        }
+        if brotli is not None:
+            self.bodies["br"] = brotli.compress(raw, quality=11)
+
+    def etag_for(self, encoding: str) -> str:
+        # Strong ETags must differ between content-codings of the same resource
+        if encoding == "identity":
+            return f'"{self.etag}"'
+        return f'"{self.etag}-{encoding}"'
+
+    def matches(self, if_none_match: str) -> bool:
+        """Weak comparison, as required for If-None-Match."""
+        if if_none_match.strip() == "*":
+            return True
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return any(self.etag_for(encoding) in candidates for encoding in self.bodies)
+
+
+# (kind, key) -> payload for the current portfolio version
+_payload_cache: Dict[Tuple[str, Optional[Tuple[str, ...]]], EncodedPayload] = {}
+_cached_version = ""
+
+
+def _cache_for(version: str) -> Dict:
+    """Drop every cached payload when the portfolio version changes."""
+    global _cached_version
+    if version != _cached_version:
+        _payload_cache.clear()
+        _cached_version = version
+    return _payload_cache
+
+
+def _choose_encoding(accept_encoding: str, available: Iterable[str]) -> str:
+    """Pick br > gzip > identity among codings the client accepts."""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name] = q
+    for encoding in ("br", "gzip"):
+        if encoding in available and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return "identity"
+
+
+def get_payload(fields: Optional[Iterable[str]] = None) -> EncodedPayload:
+    """
+    Return the cached payload for the whole portfolio, or for a
+    projection onto the given top-level sections.
+    """
+    version = portfolio_version()
+    cache = _cache_for(version)
+    portfolio = load_portfolio()
+
+    # Unknown names are ignored, which also keeps the cache bounded
+    projection = tuple(sorted(set(fields) & portfolio.keys())) if fields is not None else None
+    key = ("fields", projection)
+    payload = cache.get(key)
+    if payload is None:
+        if projection is None:
+            data, etag = dict(portfolio), version
+        else:
+            # Keep the portfolio's own key order in the output
+            data = {name: value for name, value in portfolio.items() if name in projection}
+            digest = hashlib.sha256(",".join(projection).encode("utf-8")).hexdigest()[:8]
+            etag = f"{version}-{digest}"
+        payload = cache[key] = EncodedPayload(data, etag)
+    return payload
+
+
+def section_payload(name: str) -> Optional[EncodedPayload]:
+    """Payload holding one section's value, or None if there is no such section."""
+    version = portfolio_version()
+    cache = _cache_for(version)
+
+    key = ("section", (name,))
+    payload = cache.get(key)
+    if payload is None:
+        portfolio = load_portfolio()
+        if name not in portfolio:
+            return None
+        payload = cache[key] = EncodedPayload(portfolio[name], f"{version}-{name}")
+    return payload
+
+
+def respond(payload: EncodedPayload, request: Request) -> Response:
+    """Serve the payload with conditional GET and content negotiation."""
+    encoding = _choose_encoding(request.headers.get("accept-encoding", ""), payload.bodies)
+    headers = {
+        "ETag": payload.etag_for(encoding),
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and payload.matches(if_none_match):
+        return Response(status_code=304, headers=headers)
+
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(
+        content=payload.bodies[encoding],
+        media_type="application/json",
+        headers=headers,
+    )
@@ -1,10 +1,14 @@
 """
 FastAPI routes for retrieval and portfolio queries.
 """
-from fastapi import APIRouter
+import asyncio
+from fastapi import APIRouter, HTTPException, Query, Request
 from pydantic import BaseModel
 from typing import Optional
-from .store import load_portfolio, select_context, extract_links
+from serving.conversations import get_conversation_store
+from .store import select_context, extract_links
+from .payloads import get_payload, section_payload, respond
+from .search_index import get_search_index
 
 router = APIRouter()
 
@@ -17,13 +21,37 @@ class ChatRequest(BaseModel):
 
 
 @router.get("/sections")
-async def get_sections():
+async def get_sections(request: Request, fields: Optional[str] = None):
     """
-    Get all portfolio sections.
+    Get all portfolio sections, or only those named in ?fields=a,b.
     Used by frontend to display available data.
+    
+    Bytes are serialized and compressed once per portfolio version;
+    send If-None-Match with the last ETag to get a 304.
+    """
+    names = [f.strip() for f in fields.split(",") if f.strip()] if fields is not None else None
+    return respond(get_payload(names), request)
+
+
+@router.get("/sections/{name}")
+async def get_section(name: str, request: Request):
+    """
+    Get a single portfolio section (e.g. /api/sections/projects).
+    """
+    payload = section_payload(name)
+    if payload is None:
+        raise HTTPException(status_code=404, detail=f"Unknown section: {name}")
+    return respond(payload, request)
+
+
+@router.get("/search")
+async def search(q: str = "", limit: int = Query(8, ge=1, le=25)):
+    """
+    Typeahead over skills, projects, stack entries, companies, roles,
+    institutions, courses and certifications (e.g. /api/search?q=pyt).
+    Each result names its section and refs (project ids or positions).
     """
-    # Load fresh portfolio data
-    return load_portfolio()
+    return {"query": q, "results": get_search_index().search(q, limit)}
 
 
 @router.post("/chat/context")
@@ -34,9 +62,14 @@ async def get_chat_context(body: ChatRequest):
     """
     context = select_context(body.section, body.question)
     links = extract_links(context)
+    history = (
+        await asyncio.to_thread(get_conversation_store().history, body.conversationId)
+        if body.conversationId else ""
+    )
     
     return {
         "context": context,
         "links": links,
+        "history": history,
         "section": body.section or "Overview"
     }
\ No newline at end of file
@@ -0,0 +1,147 @@
+"""
+Prefix index over portfolio entities for typeahead (/api/search).
+
+Skills, projects, their stack entries, companies, roles, institutions,
+courses and certifications are indexed once per portfolio version as a
+sorted array of normalized keys: the full name, plus the name from each
+later word on ("learn" finds "Machine Learning"). A lookup is one
+bisect to the first key with the query as prefix and a short scan, so
+it stays well under a millisecond however long the portfolio gets.
+"""
+import bisect
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from .store import load_portfolio, portfolio_version, section_items
+
+# Earlier kinds rank first when matches are otherwise equal
+KIND_ORDER = ("skill", "project", "company", "institution", "certification", "stack", "role", "course")
+
+_SPLIT = re.compile(r"[\s/,()\-_:]+")
+
+MATCH_EXACT, MATCH_PREFIX, MATCH_WORD = 0, 1, 2
+_MATCH_NAMES = ("exact", "prefix", "word")
+
+
+def normalize(text: str) -> str:
+    return " ".join(_SPLIT.split(text.casefold())).strip()
+
+
+@dataclass
+class Entity:
+    label: str
+    kind: str
+    section: str                                   # portfolio key, as in /api/sections/{name}
+    refs: List[object] = field(default_factory=list)  # project ids / list positions in that section
+
+    def to_dict(self, match: int) -> dict:
+        return {
+            "label": self.label,
+            "kind": self.kind,
+            "section": self.section,
+            "refs": self.refs,
+            "match": _MATCH_NAMES[match],
+        }
+
+
+def _entities(portfolio: dict) -> List[Entity]:
+    """Every searchable name, with stack entries and courses merged across entries."""
+    found: Dict[Tuple[str, str], Entity] = {}
+
+    def add(label, kind: str, section: str, ref) -> None:
+        if not isinstance(label, str) or not label.strip():
+            return
+        label = label.strip()
+        entity = found.setdefault((kind, normalize(label)), Entity(label, kind, section))
+        if ref not in entity.refs:
+            entity.refs.append(ref)
+
+    def items(key: str) -> List[dict]:
+        return [item for item in section_items(portfolio, key) if isinstance(item, dict)]
+
+    for i, skill in enumerate(items("skills")):
+        add(skill.get("name"), "skill", "skills", i)
+    for i, project in enumerate(items("projects")):
+        ref = project.get("id", i)
+        add(project.get("name"), "project", "projects", ref)
+        for tech in project.get("stack") or []:
+            add(tech, "stack", "projects", ref)
+    for i, job in enumerate(items("experience")):
+        add(job.get("company"), "company", "experience", i)
+        add(job.get("role"), "role", "experience", i)
+    for i, school in enumerate(items("education")):
+        add(school.get("institution"), "institution", "education", i)
+        for course in school.get("relevant_courses") or []:
+            add(course, "course", "education", i)
+    for i, cert in enumerate(section_items(portfolio, "certifications")):
+        add(cert.get("name") if isinstance(cert, dict) else cert, "certification", "certifications", i)
+    return list(found.values())
+
+
+class SearchIndex:
+    """Sorted (key, entity, match kind) arrays; search() bisects into them."""
+
+    def __init__(self, entities: List[Entity], version: str = ""):
+        self.entities = entities
+        self.version = version
+        rows = []
+        for entity_id, entity in enumerate(entities):
+            name = normalize(entity.label)
+            rows.append((name, entity_id, MATCH_PREFIX))
+            # normalize() leaves single spaces between words
+            for position, char in enumerate(name):
+                if char == " ":
+                    rows.append((name[position + 1:], entity_id, MATCH_WORD))
+        rows.sort()
+        self.keys = [key for key, _, _ in rows]
+        self.targets = [(entity_id, match) for _, entity_id, match in rows]
+
+    @classmethod
+    def build(cls, portfolio: dict, version: str = "") -> "SearchIndex":
+        return cls(_entities(portfolio), version)
+
+    def search(self, query: str, limit: int = 8, scan: int = 200) -> List[dict]:
+        """Best `limit` entities with a name (or a word in it) starting with `query`."""
+        query = normalize(query)
+        if not query or limit <= 0:
+            return []
+
+        best: Dict[int, int] = {}  # entity -> best match kind
+        start = bisect.bisect_left(self.keys, query)
+        for position in range(start, min(start + scan, len(self.keys))):
+            key = self.keys[position]
+            if not key.startswith(query):
+                break
+            entity_id, match = self.targets[position]
+            if match == MATCH_PREFIX and key == query:
+                match = MATCH_EXACT
+            if match < best.get(entity_id, len(_MATCH_NAMES)):
+                best[entity_id] = match
+
+        def rank(item: Tuple[int, int]):
+            entity = self.entities[item[0]]
+            return item[1], KIND_ORDER.index(entity.kind), len(entity.label), entity.label
+        ranked = sorted(best.items(), key=rank)[:limit]
+        return [self.entities[entity_id].to_dict(match) for entity_id, match in ranked]
+
+    def stats(self) -> dict:
+        return {"entities": len(self.entities), "keys": len(self.keys), "version": self.version}
+
+
+_index: Optional[SearchIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_search_index() -> SearchIndex:
+    """The index for the current portfolio version, rebuilt when it changes."""
+    global _index
+    version = portfolio_version()
+    index = _index
+    if index is None or index.version != version:
+        with _index_lock:
+            if _index is None or _index.version != version:
+                _index = SearchIndex.build(load_portfolio(), version)
+            index = _index
+    return index
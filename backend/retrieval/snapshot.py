@@ -0,0 +1,153 @@
+"""
+Typed, read-only view of the portfolio.
+
+Built once per portfolio version from load_portfolio(), so hot paths can
+use attributes instead of re-parsing JSON or probing dicts with .get().
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from .store import load_portfolio, portfolio_version, section_items
+
+
+@dataclass(frozen=True, slots=True)
+class Skill:
+    name: str
+    category: str = "other"
+    level: str = ""
+    last_used: str = ""
+
+
+@dataclass(frozen=True, slots=True)
+class Project:
+    name: str
+    summary: str = ""
+    stack: Tuple[str, ...] = ()
+    impact: str = ""
+    repo: str = ""
+    demo: str = ""
+    highlights: Tuple[str, ...] = ()
+
+
+@dataclass(frozen=True, slots=True)
+class Experience:
+    company: str
+    role: str = ""
+    duration: str = ""
+    location: str = ""
+    description: str = ""
+    achievements: Tuple[str, ...] = ()
+
+
+@dataclass(frozen=True, slots=True)
+class Education:
+    institution: str
+    degree: str = ""
+    field: str = ""
+    graduation: str = ""
+
+
+@dataclass(frozen=True, slots=True)
+class Certification:
+    name: str
+    issuer: str = ""
+    date: str = ""
+    url: str = ""
+
+
+@dataclass(frozen=True, slots=True)
+class PortfolioSnapshot:
+    version: str
+    about: str = ""
+    skills: Tuple[Skill, ...] = ()
+    projects: Tuple[Project, ...] = ()
+    experience: Tuple[Experience, ...] = ()
+    education: Tuple[Education, ...] = ()
+    certifications: Tuple[Certification, ...] = ()
+    contact: Dict[str, str] = field(default_factory=dict)
+
+
+def _text(item: dict, key: str) -> str:
+    value = item.get(key)
+    return str(value) if value is not None else ""
+
+
+def _strings(item: dict, key: str) -> Tuple[str, ...]:
+    return tuple(str(v) for v in item.get(key) or [])
+
+
+def _items(data: dict, key: str) -> List[dict]:
+    return [v for v in section_items(data, key) if isinstance(v, dict)]
+
+
+def build_snapshot(data: dict, version: str) -> PortfolioSnapshot:
+    """Convert the raw portfolio dict; missing or malformed fields become empty."""
+    about = data.get("about")
+    links = data.get("links")
+    return PortfolioSnapshot(
+        version=version,
+        about=about if isinstance(about, str) else "",
+        skills=tuple(
+            Skill(
+                name=_text(s, "name"),
+                category=_text(s, "category") or "other",
+                level=_text(s, "level"),
+                last_used=_text(s, "lastUsed"),
+            )
+            for s in _items(data, "skills")
+        ),
+        projects=tuple(
+            Project(
+                name=_text(p, "name") or "Unnamed Project",
+                summary=_text(p, "summary"),
+                stack=_strings(p, "stack"),
+                impact=_text(p, "impact"),
+                repo=_text(p, "repo"),
+                demo=_text(p, "demo"),
+                highlights=_strings(p, "highlights"),
+            )
+            for p in _items(data, "projects")
+        ),
+        experience=tuple(
+            Experience(
+                company=_text(e, "company"),
+                role=_text(e, "role"),
+                duration=_text(e, "duration"),
+                location=_text(e, "location"),
+                description=_text(e, "description"),
+                achievements=_strings(e, "achievements"),
+            )
+            for e in _items(data, "experience")
+        ),
+        education=tuple(
+            Education(
+                institution=_text(e, "institution"),
+                degree=_text(e, "degree"),
+                field=_text(e, "field"),
+                graduation=_text(e, "graduation"),
+            )
+            for e in _items(data, "education")
+        ),
+        certifications=tuple(
+            Certification(
+                name=_text(c, "name"),
+                issuer=_text(c, "issuer"),
+                date=_text(c, "date"),
+                url=_text(c, "url"),
+            )
+            for c in _items(data, "certifications")
+        ),
+        contact={k: str(v) for k, v in links.items() if v} if isinstance(links, dict) else {},
+    )
+
+
+_snapshot: Optional[PortfolioSnapshot] = None
+
+
+def get_snapshot() -> PortfolioSnapshot:
+    """Current snapshot; rebuilt only when the portfolio version changes."""
+    global _snapshot
+    version = portfolio_version()
+    if _snapshot is None or _snapshot.version != version:
+        _snapshot = build_snapshot(load_portfolio(), version)
+    return _snapshot
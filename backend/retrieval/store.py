@@ -1,50 +1,142 @@
 """
 Central retrieval store with keyword and optional vector search.
 AUTO-RELOADS portfolio.json when file changes!
+
+If portfolio.pack (python retrieval/packed.py) is at least as new as
+portfolio.json and was compiled from a file of its size, it is
+memory-mapped instead and sections are decoded on first use; see
+packed.py. Code that derives structures from whole sections (search
+index, snapshot, intent training data) walks them with section_items(),
+which decodes one element at a time without keeping the section.
 """
+import hashlib
 import json
 import pathlib
 import os
-from typing import List, Dict
-from datetime import datetime
+from typing import Any, Iterator, List, Dict, Mapping, Optional, Tuple
+
+from observability.logs import get_logger
+
+logger = get_logger("retrieval.store")
 
 ROOT = pathlib.Path(__file__).resolve().parents[1]
 PORTFOLIO_PATH = ROOT / "portfolio" / "portfolio.json"
 INDEX_PATH = ROOT / "portfolio" / "pf.index"
-META_PATH = ROOT / "portfolio" / "pf.meta.json"
+META_PATH = ROOT / "portfolio" / "pf.meta.jsonl"
+LEGACY_META_PATH = ROOT / "portfolio" / "pf.meta.json"
 
-# Cache for portfolio data with timestamp
+# Cache for portfolio data with its source (path, mtime, JSON size) and content version
 _portfolio_cache = {
     "data": None,
-    "last_modified": 0
+    "source": None,
+    "version": ""
 }
 
 
-def load_portfolio() -> dict:
+def _pack_path() -> pathlib.Path:
+    return PORTFOLIO_PATH.with_suffix(".pack")
+
+
+def _portfolio_source() -> Tuple[pathlib.Path, float, Optional[int]]:
+    """
+    portfolio.pack if enabled and not older than portfolio.json, else the
+    JSON; with the JSON's size for load_portfolio()'s pack check.
+    """
+    try:
+        stat = PORTFOLIO_PATH.stat()
+        json_mtime, json_size = stat.st_mtime, stat.st_size
+    except FileNotFoundError:
+        json_mtime = json_size = None
+    
+    if os.getenv("PORTFOLIO_PACK", "auto").lower() != "false":
+        try:
+            pack_mtime = _pack_path().stat().st_mtime
+        except FileNotFoundError:
+            pack_mtime = None
+        if pack_mtime is not None and (json_mtime is None or pack_mtime >= json_mtime):
+            return _pack_path(), pack_mtime, json_size
+    
+    if json_mtime is None:
+        raise FileNotFoundError(PORTFOLIO_PATH)
+    return PORTFOLIO_PATH, json_mtime, json_size
+
+
+def load_portfolio() -> Mapping:
     """
     Load portfolio with auto-reload on file change.
     No restart needed when you update portfolio.json!
+    
+    Returns a dict for portfolio.json, or a lazily decoded read-only
+    mapping for portfolio.pack.
     """
     global _portfolio_cache
     
     try:
-        # Get current file modification time
-        current_mtime = PORTFOLIO_PATH.stat().st_mtime
-        
-        # Reload if file changed or not loaded yet
-        if _portfolio_cache["data"] is None or current_mtime > _portfolio_cache["last_modified"]:
-            with open(PORTFOLIO_PATH, encoding="utf-8") as f:
-                _portfolio_cache["data"] = json.load(f)
-                _portfolio_cache["last_modified"] = current_mtime
-                print(f"🔄 Portfolio reloaded at {datetime.now().strftime('%H:%M:%S')}")
+        # Reload if the file changed or not loaded yet
+        source = _portfolio_source()
+        if _portfolio_cache["data"] is None or source != _portfolio_cache["source"]:
+            path, _, json_size = source
+            data = None
+            if path.suffix == ".pack":
+                from .packed import PackedPortfolio
+                data = PackedPortfolio(path)
+                version = data.version
+                # mtimes survive copies and checkouts; the size is a cheap second check
+                if json_size is not None and data.source_bytes != json_size:
+                    logger.warning(
+                        "portfolio.pack was compiled from a different portfolio.json, using the JSON "
+                        "(recompile with: python retrieval/packed.py)"
+                    )
+                    data, path = None, PORTFOLIO_PATH
+            if data is None:
+                raw = path.read_bytes()
+                data = json.loads(raw)
+                version = hashlib.sha256(raw).hexdigest()[:16]
+                if source[0] == PORTFOLIO_PATH and _pack_path().exists():
+                    logger.warning(
+                        "portfolio.pack is older than portfolio.json, using the JSON "
+                        "(recompile with: python retrieval/packed.py)"
+                    )
+            _portfolio_cache.update(data=data, source=source, version=version)
+            logger.info(
+                "Portfolio reloaded",
+                extra={"fields": {"path": str(path), "version": version}}
+            )
         
         return _portfolio_cache["data"]
     
     except Exception as e:
-        print(f"❌ Error loading portfolio: {e}")
+        logger.error("Error loading portfolio", extra={"fields": {"error": str(e)}})
         return {}
 
 
+def portfolio_version() -> str:
+    """
+    Content hash of the current portfolio.json (changes only when the
+    content does). Use it to key anything derived from the portfolio.
+    """
+    load_portfolio()
+    return _portfolio_cache["version"]
+
+
+def section_items(data: Mapping, key: str) -> Iterator[Any]:
+    """
+    Elements of list section `key` (nothing if it's missing or not a list).
+    On a pack, elements not yet decoded are decoded one at a time and not
+    cached, so a full walk doesn't leave the whole section resident.
+    """
+    if key not in data:
+        return iter(())
+    if hasattr(data, "item_count") and key not in data.loaded():
+        try:
+            count = data.item_count(key)
+        except TypeError:
+            return iter(())
+        return (data.item(key, i) for i in range(count))
+    value = data[key]
+    return iter(value) if isinstance(value, list) else iter(())
+
+
 # Use function instead of loading once
 portfolio = property(lambda self: load_portfolio())
 
@@ -53,6 +145,34 @@ portfolio = property(lambda self: load_portfolio())
 # Keyword-based retrieval (always works)
 # ========================================
 
+# (section, portfolio key, trigger words), checked in order
+_KEYWORD_ROUTES = [
+    ("PROJECTS", "projects", ["project", "built", "develop"]),
+    ("SKILLS", "skills", ["stack", "skill", "tech", "language", "framework"]),
+    ("EXPERIENCE", "experience", ["work", "job", "company", "experience", "role"]),
+    ("EDUCATION", "education", ["degree", "university", "education", "study", "college"]),
+    ("CERTIFICATIONS", "certifications", ["cert", "certification", "certified"]),
+]
+
+
+def route_section(section: str | None, question: str) -> str | None:
+    """
+    Pick the portfolio key for a question by section or keywords.
+    Returns None when the whole portfolio should be used.
+    """
+    q = question.lower()
+    for name, key, words in _KEYWORD_ROUTES:
+        if section == name or any(word in q for word in words):
+            return key
+    return None
+
+
+def _serialize_section(portfolio_data: Mapping, key: str | None) -> str:
+    if key is None:
+        return json.dumps(dict(portfolio_data), ensure_ascii=False, indent=2)
+    return json.dumps(portfolio_data.get(key, []), ensure_ascii=False, indent=2)
+
+
 def keyword_context(section: str | None, question: str) -> str:
     """
     Route to appropriate context based on section or keywords.
@@ -61,107 +181,212 @@ def keyword_context(section: str | None, question: str) -> str:
     # Get fresh portfolio data
     portfolio_data = load_portfolio()
     
-    q = question.lower()
-    
-    # Section-based routing
-    if section == "PROJECTS" or any(word in q for word in ["project", "built", "develop"]):
-        return json.dumps(portfolio_data.get("projects", []), ensure_ascii=False, indent=2)
-    
-    if section == "SKILLS" or any(word in q for word in ["stack", "skill", "tech", "language", "framework"]):
-        return json.dumps(portfolio_data.get("skills", []), ensure_ascii=False, indent=2)
-    
-    if section == "EXPERIENCE" or any(word in q for word in ["work", "job", "company", "experience", "role"]):
-        return json.dumps(portfolio_data.get("experience", []), ensure_ascii=False, indent=2)
-    
-    if section == "EDUCATION" or any(word in q for word in ["degree", "university", "education", "study", "college"]):
-        return json.dumps(portfolio_data.get("education", []), ensure_ascii=False, indent=2)
-    
-    if section == "CERTIFICATIONS" or any(word in q for word in ["cert", "certification", "certified"]):
-        return json.dumps(portfolio_data.get("certifications", []), ensure_ascii=False, indent=2)
-    
-    # Default: return everything
-    return json.dumps(portfolio_data, ensure_ascii=False, indent=2)
+    # Section-based routing (default: return everything)
+    return _serialize_section(portfolio_data, route_section(section, question))
 
 
 # ========================================
 # Vector-based retrieval (optional, better)
 # ========================================
 
+def section_key(section: str | None) -> str | None:
+    """Portfolio key for a UI section name (PROJECTS -> projects), if any."""
+    for name, key, _ in _KEYWORD_ROUTES:
+        if section == name:
+            return key
+    return None
+
+
+def _meta_path() -> pathlib.Path:
+    return META_PATH if META_PATH.exists() else LEGACY_META_PATH
+
+
+def _read_chunks(path: pathlib.Path) -> List[Dict[str, str]]:
+    """
+    Chunk metadata in index order: JSON Lines from the streaming builder,
+    or a JSON list from older builds. The oldest stored [id, text] pairs;
+    their section is the id prefix ("projects:3" -> projects).
+    """
+    with open(path, encoding="utf-8") as f:
+        if path.suffix == ".jsonl":
+            raw = [json.loads(line) for line in f if line.strip()]
+        else:
+            raw = json.load(f)
+    chunks = []
+    for item in raw:
+        if isinstance(item, dict):
+            chunks.append(item)
+        else:
+            chunk_id, text = item
+            chunks.append({"id": chunk_id, "section": chunk_id.split(":")[0], "field": "", "text": text})
+    return chunks
+
+
 class DenseRetriever:
     """
-    Dense retrieval using sentence-transformers + FAISS.
+    Dense retrieval using a sentence encoder (torch or ONNX) + FAISS.
     Only loads if index files exist.
+    
+    The vectors are read out of the FAISS index once and kept as a single
+    array, grouped by section; searching is the same exact inner product
+    as the flat index, as a matmul over the whole array or, for a query
+    pinned to PROJECTS, only over the project rows. MMR reuses the array.
+    
+    Searches over-fetch candidates and keep a diverse subset that fits
+    the context token budget (see mmr.py).
     """
     
     def __init__(self):
         try:
-            from sentence_transformers import SentenceTransformer
             import faiss
+            import numpy as np
+            from . import mmr
+            from .encoders import get_encoder
             
-            self.model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
-            self.index = faiss.read_index(str(INDEX_PATH))
+            # torch or int8 ONNX, per EMBED_BACKEND
+            self.model = get_encoder()
+            index = faiss.read_index(str(INDEX_PATH))
+            vectors = index.reconstruct_n(0, index.ntotal)
+            # Only the array is kept, not the index holding the same vectors
+            del index
+            chunks = _read_chunks(_meta_path())[:len(vectors)]
             
-            with open(META_PATH, encoding="utf-8") as f:
-                self.chunks = json.load(f)  # List of (id, text) tuples
+            # Stable sort by section, so each section is one contiguous slice
+            order = sorted(range(len(chunks)), key=lambda position: chunks[position]["section"])
+            self.chunks = [chunks[position] for position in order]
+            self.vectors = vectors[order]
+            del vectors
+            self.tokens = np.array([mmr.estimate_tokens(chunk["text"]) for chunk in self.chunks])
             
-            print(f"✓ Loaded vector index with {len(self.chunks)} chunks")
+            # section -> (start, end) of its rows in self.chunks / self.vectors
+            self.partitions: Dict[str, Tuple[int, int]] = {}
+            for position, chunk in enumerate(self.chunks):
+                start, _ = self.partitions.get(chunk["section"], (position, position))
+                self.partitions[chunk["section"]] = (start, position + 1)
+            
+            logger.info(
+                "Loaded vector index",
+                extra={"fields": {
+                    "chunks": len(self.chunks), "sections": sorted(self.partitions),
+                    "encoder": self.model.backend,
+                }}
+            )
             
         except Exception as e:
-            print(f"⚠ Could not load vector index: {e}")
+            logger.warning("Could not load vector index", extra={"fields": {"error": str(e)}})
             raise
     
-    def search(self, question: str, top_k: int = 5) -> str:
+    def search(self, question: str, top_k: int = 5, section: str | None = None) -> str:
         """
-        Find most relevant chunks using semantic search.
+        Find most relevant chunks using semantic search, optionally only
+        within one portfolio section (e.g. "projects").
         Returns concatenated context string.
         """
-        # Encode query
-        query_embedding = self.model.encode(
-            [question], 
+        return self.search_batch([question], top_k, [section])[0]
+    
+    def search_batch(
+        self, questions: List[str], top_k: int = 5, sections: List[str | None] | None = None
+    ) -> List[str]:
+        """
+        Search for many questions at once: one encode call for the whole
+        batch, then one matmul per distinct section filter.
+        """
+        import numpy as np
+        from . import mmr
+        
+        sections = sections or [None] * len(questions)
+        
+        # Encode queries
+        query_embeddings = self.model.encode(
+            questions,
             normalize_embeddings=True
         )
         
-        # Search index
-        scores, indices = self.index.search(query_embedding, top_k)
+        # Group rows by the partition they search
+        groups: Dict[str | None, List[int]] = {}
+        for row, section in enumerate(sections):
+            groups.setdefault(section if section in self.partitions else None, []).append(row)
         
-        # Get matching chunks
-        selected_chunks = []
-        for idx in indices[0]:
-            if idx < len(self.chunks):
-                chunk_id, chunk_text = self.chunks[idx]
-                selected_chunks.append(chunk_text)
+        contexts = [""] * len(questions)
+        for section, rows in groups.items():
+            start, end = (0, len(self.chunks)) if section is None else self.partitions[section]
+            fetch = min(top_k * mmr.OVERFETCH, end - start)
+            if fetch <= 0:
+                continue
+            scores = query_embeddings[rows] @ self.vectors[start:end].T
+            # Best `fetch` rows per query (unordered; MMR ranks them)
+            indices = np.argpartition(-scores, fetch - 1, axis=1)[:, :fetch]
+            
+            # A diverse subset of the candidates under the token budget
+            for row, row_scores, hits in zip(rows, scores, indices):
+                candidates = start + hits
+                picked = mmr.select(
+                    row_scores[hits],
+                    self.vectors[candidates],
+                    self.tokens[candidates],
+                    k=top_k,
+                )
+                contexts[row] = "\n\n".join(self.chunks[int(candidates[i])]["text"] for i in picked)
         
-        return "\n\n".join(selected_chunks)
+        return contexts
 
 
 # Global instance (lazy loaded)
 _dense_retriever = None
 
-def dense_context(question: str, top_k: int = 5) -> str:
+
+def _get_dense_retriever() -> "DenseRetriever | None":
     """
-    Get context using vector search.
-    Returns empty string if index doesn't exist.
+    Return the shared retriever, loading it on first use.
+    None if the index doesn't exist or can't be loaded.
     """
     global _dense_retriever
     
     # Check if index exists
-    if not INDEX_PATH.exists() or not META_PATH.exists():
-        return ""
+    if not INDEX_PATH.exists() or not _meta_path().exists():
+        return None
     
     # Lazy load retriever
     if _dense_retriever is None:
         try:
             _dense_retriever = DenseRetriever()
         except Exception:
-            return ""
+            return None
+    return _dense_retriever
+
+
+def reset_retriever() -> None:
+    """Drop the loaded retriever; the next use reloads the index and encoder."""
+    global _dense_retriever
+    _dense_retriever = None
+
+
+def dense_context(question: str, top_k: int = 5, section: str | None = None) -> str:
+    """
+    Get context using vector search, limited to `section` when given.
+    Returns empty string if index doesn't exist.
+    """
+    retriever = _get_dense_retriever()
+    if retriever is None:
+        return ""
     
     try:
-        return _dense_retriever.search(question, top_k)
+        return retriever.search(question, top_k, section_key(section))
     except Exception as e:
-        print(f"⚠ Vector search error: {e}")
+        logger.warning("Vector search error", extra={"fields": {"error": str(e)}})
         return ""
 
 
+def preload_retriever() -> bool:
+    """
+    Load the dense retriever now instead of on the first request.
+    No-op unless ENABLE_RAG=true and the index files exist.
+    """
+    if os.getenv("ENABLE_RAG", "false").lower() != "true":
+        return False
+    return _get_dense_retriever() is not None
+
+
 # ========================================
 # Public API
 # ========================================
@@ -171,7 +396,7 @@ def select_context(section: str | None, question: str) -> str:
     Main entry point for context selection.
     
     Priority:
-    1. Try vector search (if index exists)
+    1. Try vector search (if index exists), within the section if one is pinned
     2. Fall back to keyword matching
     
     Args:
@@ -183,16 +408,50 @@ def select_context(section: str | None, question: str) -> str:
     """
     # Try vector search first
     if os.getenv("ENABLE_RAG", "false").lower() == "true":
-        vector_context = dense_context(question)
+        vector_context = dense_context(question, section=section)
         if vector_context:
-            print("✓ Using vector search")
+            logger.debug("Using vector search")
             return vector_context
     
     # Fall back to keyword matching
-    print("✓ Using keyword matching")
+    logger.debug("Using keyword matching")
     return keyword_context(section, question)
 
 
+def select_contexts(requests: List[Tuple[str | None, str]]) -> List[str]:
+    """
+    Batch version of select_context for (section, question) pairs.
+    
+    With RAG on, the whole batch is encoded and searched in one pass.
+    Questions without a vector result fall back to keyword routing, and
+    each routed section is serialized once per batch.
+    """
+    contexts = [""] * len(requests)
+    
+    if os.getenv("ENABLE_RAG", "false").lower() == "true":
+        retriever = _get_dense_retriever()
+        if retriever is not None:
+            try:
+                contexts = retriever.search_batch(
+                    [question for _, question in requests],
+                    sections=[section_key(section) for section, _ in requests]
+                )
+            except Exception as e:
+                logger.warning("Vector search error", extra={"fields": {"error": str(e)}})
+    
+    portfolio_data = load_portfolio()
+    serialized: Dict[str | None, str] = {}
+    for i, (section, question) in enumerate(requests):
+        if contexts[i]:
+            continue
+        key = route_section(section, question)
+        if key not in serialized:
+            serialized[key] = _serialize_section(portfolio_data, key)
+        contexts[i] = serialized[key]
+    
+    return contexts
+
+
 def extract_links(context: str) -> List[Dict[str, str]]:
     """
     Extract links from context JSON.
@@ -233,6 +492,20 @@ def extract_links(context: str) -> List[Dict[str, str]]:
         return []
 
 
+def merge_links(provider_links: List[Dict], context_links: List[Dict], limit: int = 4) -> List[Dict]:
+    """
+    Combine provider and context links, dropping duplicate URLs.
+    Provider links win over context links with the same URL.
+    """
+    unique_links = []
+    seen_urls = set()
+    for link in provider_links + context_links:
+        if link["url"] not in seen_urls:
+            unique_links.append(link)
+            seen_urls.add(link["url"])
+    return unique_links[:limit]
+
+
 # ========================================
 # Manual reload function (if needed)
 # ========================================
@@ -243,5 +516,5 @@ def reload_portfolio():
     Useful if you want to manually refresh.
     """
     global _portfolio_cache
-    _portfolio_cache["last_modified"] = 0
+    _portfolio_cache["source"] = None
     return load_portfolio()
\ No newline at end of file
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Production server entrypoint.
+
+Loads the portfolio snapshot, vector index and provider models once in
+the parent process, then forks N uvicorn workers that share those pages
+copy-on-write. `main.py` stays the single-process dev server (reload on).
+
+Signals (sent to the parent):
+    HUP       graceful restart: reload .env, portfolio, index, intent router and
+              provider models, then replace workers one by one
+    TERM/INT  graceful shutdown
+    TTIN/TTOU add / remove one worker
+
+Usage:
+    python serve.py --workers 4 --port 8000
+"""
+import argparse
+import gc
+import importlib.util
+import os
+import signal
+import socket
+import sys
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from observability.logs import setup_logging, get_logger
+
+setup_logging()
+logger = get_logger("serve")
+
+
+# Workers exiting sooner than this after starting count as crash-looping
+FAST_EXIT_S = 5.0
+MAX_RESPAWN_DELAY_S = 30.0
+
+
+def _pick(preferred: str, fallback: str) -> str:
+    """Use the fast implementation when it is installed."""
+    return preferred if importlib.util.find_spec(preferred) else fallback
+
+
+class Arbiter:
+    """Minimal pre-fork supervisor for uvicorn workers."""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.loop = _pick("uvloop", "asyncio")
+        self.http = _pick("httptools", "h11")
+        self.workers: dict[int, float] = {}  # pid -> start time
+        self.target = args.workers
+        self.sock: socket.socket | None = None
+        self.app = None
+        self._signals: list[int] = []
+        self._fast_exits = 0           # workers in a row that died soon after starting
+        self._respawn_at = 0.0         # monotonic time before which _scale() won't spawn
+
+    # ========================================
+    # Parent side
+    # ========================================
+
+    def run(self) -> int:
+        self.sock = self._bind()
+        self._preload()
+
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGTTIN, signal.SIGTTOU):
+            signal.signal(sig, lambda signum, _frame: self._signals.append(signum))
+
+        logger.info(
+            "Starting workers",
+            extra={"fields": {
+                "workers": self.target, "bind": f"{self.args.host}:{self.args.port}",
+                "loop": self.loop, "http": self.http, "pid": os.getpid(),
+            }}
+        )
+        for _ in range(self.target):
+            self._spawn()
+
+        while True:
+            while self._signals:
+                signum = self._signals.pop(0)
+                if signum in (signal.SIGTERM, signal.SIGINT):
+                    self._stop_all()
+                    return 0
+                if signum == signal.SIGHUP:
+                    self._rolling_restart()
+                elif signum == signal.SIGTTIN:
+                    self.target += 1
+                elif signum == signal.SIGTTOU and self.target > 1:
+                    self.target -= 1
+            self._reap()
+            self._scale()
+            time.sleep(0.2)
+
+    def _bind(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.args.host, self.args.port))
+        sock.listen(self.args.backlog)
+        sock.set_inheritable(True)
+        return sock
+
+    def _preload(self):
+        """Import the app and load shared read-only state before forking."""
+        import main
+
+        main.preload()
+        self.app = main.app
+        # Move everything loaded so far out of the GC's reach, so collections
+        # in the workers don't write to (and un-share) these pages
+        gc.collect()
+        gc.freeze()
+
+    def _spawn(self) -> int:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self._worker()
+            except BaseException:
+                logger.exception("Worker crashed")
+                code = 1
+            finally:
+                os._exit(code)
+        self.workers[pid] = time.monotonic()
+        return pid
+
+    def _reap(self, expected: bool = False):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            started = self.workers.pop(pid, None)
+            if started is None or expected:
+                continue
+            # A worker that dies right away (bad config, port, model) would
+            # otherwise be respawned every loop; back off exponentially
+            if time.monotonic() - started < FAST_EXIT_S:
+                self._fast_exits += 1
+                delay = min(MAX_RESPAWN_DELAY_S, 0.5 * 2 ** self._fast_exits)
+                self._respawn_at = time.monotonic() + delay
+            else:
+                self._fast_exits, delay = 0, 0.0
+            logger.warning(
+                "Worker exited",
+                extra={"fields": {
+                    "pid": pid, "status": os.waitstatus_to_exitcode(status),
+                    "fast_exits": self._fast_exits, "respawn_in_s": delay,
+                }}
+            )
+
+    def _scale(self):
+        while len(self.workers) < self.target and time.monotonic() >= self._respawn_at:
+            self._spawn()
+        while len(self.workers) > self.target:
+            oldest = min(self.workers, key=self.workers.get)
+            self._stop(oldest)
+
+    def _rolling_restart(self):
+        """Reload shared state, then replace workers one at a time."""
+        logger.info("Graceful restart")
+        import main
+
+        # Let the previous generation of shared state be collected
+        gc.unfreeze()
+        gc.collect()
+        try:
+            main.reload_shared_state()
+        except Exception:
+            # Keep serving with the workers we have; fix the cause and HUP again
+            logger.exception("Reload failed, keeping current workers")
+            return
+        finally:
+            gc.freeze()
+        self._fast_exits, self._respawn_at = 0, 0.0
+        for pid in list(self.workers):
+            self._spawn()
+            self._stop(pid)
+
+    def _stop(self, pid: int):
+        """Ask one worker to finish in-flight requests and exit."""
+        self.workers.pop(pid, None)
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            return
+        deadline = time.monotonic() + self.args.graceful_timeout
+        while time.monotonic() < deadline:
+            done, _ = os.waitpid(pid, os.WNOHANG)
+            if done:
+                return
+            time.sleep(0.05)
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+
+    def _stop_all(self):
+        logger.info("Shutting down", extra={"fields": {"workers": len(self.workers)}})
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.args.graceful_timeout
+        while self.workers and time.monotonic() < deadline:
+            self._reap(expected=True)
+            time.sleep(0.05)
+        for pid in list(self.workers):
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self.workers.clear()
+
+    # ========================================
+    # Worker side
+    # ========================================
+
+    def _worker(self):
+        import uvicorn
+
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGTTIN, signal.SIGTTOU):
+            signal.signal(sig, signal.SIG_DFL)
+
+        config = uvicorn.Config(
+            self.app,
+            loop=self.loop,
+            http=self.http,
+            lifespan="on",
+            log_config=None,
+            access_log=self.args.access_log,
+            timeout_graceful_shutdown=int(self.args.graceful_timeout),
+        )
+        uvicorn.Server(config).run(sockets=[self.sock])
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Production server for the portfolio backend")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument(
+        "--workers", type=int,
+        default=int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1))),
+    )
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--graceful-timeout", type=float, default=30.0)
+    parser.add_argument("--access-log", action="store_true", help="Log every request line")
+    args = parser.parse_args(argv)
+
+    if not hasattr(os, "fork"):
+        print("❌ serve.py needs fork(); on Windows run: uvicorn main:app --workers N")
+        return 1
+
+    return Arbiter(args).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+"""
+Admission control in front of provider calls.
+
+Each provider gets a limit on generations in flight and a bounded wait
+queue. Waiters are served by lane: interactive chat before batch and
+background work; cheap providers (rule_based) skip the queue entirely.
+A request is turned away at once (Overloaded -> 429 + Retry-After) when
+the queue is full, or when the expected wait already exceeds what is left
+of its deadline, so the requests that are admitted still finish in time
+instead of everyone timing out together.
+
+Env vars:
+    ADMISSION_ENABLED: Limit concurrent generations (default: true)
+    ADMISSION_MAX_QUEUE: Waiting requests per provider (default: 32)
+    ADMISSION_MAX_IN_FLIGHT: Default limit for every provider (default: per provider,
+        ollama 2, hf_local 1, hf_inference 4, replicate 8, openai 16)
+    ADMISSION_MAX_IN_FLIGHT_<PROVIDER>: Limit for one provider, e.g. ADMISSION_MAX_IN_FLIGHT_OLLAMA=4
+"""
+import asyncio
+import collections
+import math
+import os
+import time
+from typing import Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+from observability.logs import get_logger
+from observability.metrics import Family, Histogram, register_collector
+from .deadlines import DeadlineExceeded, remaining
+
+logger = get_logger("serving.admission")
+
+T = TypeVar("T")
+
+LANE_CHEAP = "cheap"
+LANE_INTERACTIVE = "interactive"
+LANE_BATCH = "batch"
+_QUEUED_LANES = (LANE_INTERACTIVE, LANE_BATCH)  # served in this order
+
+_DEFAULT_LIMITS = {"ollama": 2, "hf_local": 1, "hf_inference": 4, "replicate": 8, "openai": 16}
+
+
+class Overloaded(Exception):
+    """Turned away by admission control; retry after `retry_after` seconds."""
+
+    def __init__(self, provider: str, reason: str, retry_after: int):
+        super().__init__(f"{provider} is overloaded ({reason}), retry after {retry_after}s")
+        self.provider = provider
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Concurrency limit + prioritized bounded queue for one provider. Event-loop only."""
+
+    def __init__(self, name: str, max_in_flight: int, max_queue: int, enabled: bool = True):
+        self.name = name
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max(0, max_queue)
+        self.enabled = enabled
+        self.in_flight = 0
+        self._queues: Dict[str, Deque[asyncio.Future]] = {lane: collections.deque() for lane in _QUEUED_LANES}
+        self.service_time: Optional[float] = None  # EWMA seconds per generation
+
+        self.admitted: Dict[str, int] = collections.Counter()
+        self.rejected: Dict[str, int] = collections.Counter()
+        self.wait = {lane: Histogram() for lane in _QUEUED_LANES}
+
+    @property
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    async def run(self, lane: str, fn: Callable[..., Awaitable[T]], *args) -> T:
+        """Await fn(*args) once admitted in `lane`."""
+        if lane == LANE_CHEAP or not self.enabled:
+            self.admitted[LANE_CHEAP if lane == LANE_CHEAP else lane] += 1
+            return await fn(*args)
+
+        await self._acquire(lane)
+        started = time.monotonic()
+        try:
+            return await fn(*args)
+        finally:
+            elapsed = time.monotonic() - started
+            self.service_time = elapsed if self.service_time is None else 0.8 * self.service_time + 0.2 * elapsed
+            self._release()
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog should have drained."""
+        per_request = self.service_time or 1.0
+        return max(1, math.ceil((self.queued + self.in_flight) * per_request / self.max_in_flight))
+
+    # ---- internals ----
+
+    def _expected_wait(self, lane: str) -> float:
+        ahead = sum(len(self._queues[l]) for l in _QUEUED_LANES[:_QUEUED_LANES.index(lane) + 1])
+        return (ahead + 1) * (self.service_time or 0.0) / self.max_in_flight
+
+    def _reject(self, reason: str) -> Overloaded:
+        self.rejected[reason] += 1
+        return Overloaded(self.name, reason, self.retry_after())
+
+    async def _acquire(self, lane: str) -> None:
+        if self.in_flight < self.max_in_flight and not self.queued:
+            self.in_flight += 1
+            self.admitted[lane] += 1
+            self.wait[lane].observe(0.0)
+            return
+
+        if self.queued >= self.max_queue:
+            # Interactive requests take the place of the newest batch waiter
+            if lane == LANE_INTERACTIVE and self._queues[LANE_BATCH]:
+                self._queues[LANE_BATCH].pop().set_exception(self._reject("evicted"))
+            else:
+                raise self._reject("queue_full")
+
+        left = remaining()
+        if left is not None and self._expected_wait(lane) > left:
+            raise self._reject("deadline")
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues[lane].append(future)
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(future, left)
+        except asyncio.TimeoutError:
+            self._discard(lane, future)
+            self.rejected["timeout"] += 1
+            raise DeadlineExceeded() from None
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self._release()  # granted just as we were cancelled; pass it on
+            self._discard(lane, future)
+            raise
+        self.admitted[lane] += 1
+        self.wait[lane].observe(time.monotonic() - started)
+
+    def _discard(self, lane: str, future: asyncio.Future) -> None:
+        try:
+            self._queues[lane].remove(future)
+        except ValueError:
+            pass
+
+    def _release(self) -> None:
+        """Hand the slot to the next live waiter, or free it."""
+        for lane in _QUEUED_LANES:
+            queue = self._queues[lane]
+            while queue:
+                future = queue.popleft()
+                if not future.done():
+                    future.set_result(None)
+                    return
+        self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queued": {lane: len(queue) for lane, queue in self._queues.items()},
+            "max_queue": self.max_queue,
+            "admitted": dict(self.admitted),
+            "rejected": dict(self.rejected),
+            "service_time_s": round(self.service_time, 3) if self.service_time is not None else None,
+        }
+
+
+_controllers: Dict[str, AdmissionController] = {}
+
+
+def get_admission(provider_name: str) -> AdmissionController:
+    """The shared controller for one provider, configured from env on first use."""
+    controller = _controllers.get(provider_name)
+    if controller is None:
+        default = os.getenv("ADMISSION_MAX_IN_FLIGHT") or _DEFAULT_LIMITS.get(provider_name, 4)
+        limit = int(os.getenv(f"ADMISSION_MAX_IN_FLIGHT_{provider_name.upper()}", default))
+        controller = _controllers[provider_name] = AdmissionController(
+            provider_name,
+            max_in_flight=limit,
+            max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "32")),
+            enabled=os.getenv("ADMISSION_ENABLED", "true").lower() == "true",
+        )
+        logger.debug(
+            "Admission control ready",
+            extra={"fields": {"provider": provider_name, "max_in_flight": limit, "max_queue": controller.max_queue}}
+        )
+    return controller
+
+
+def _collect():
+    in_flight = Family("admission_in_flight", "gauge", "Generations running per provider")
+    queued = Family("admission_queue_depth", "gauge", "Requests waiting for a slot")
+    admitted = Family("admission_admitted_total", "counter", "Requests admitted")
+    rejected = Family("admission_rejected_total", "counter", "Requests turned away (429/504)")
+    wait = Family("admission_wait_seconds", "histogram", "Time spent waiting for a slot")
+    for name, controller in list(_controllers.items()):
+        in_flight.add(controller.in_flight, provider=name)
+        for lane, queue in controller._queues.items():
+            queued.add(len(queue), provider=name, lane=lane)
+            controller.wait[lane].add_to(wait, provider=name, lane=lane)
+        for lane, count in controller.admitted.items():
+            admitted.add(count, provider=name, lane=lane)
+        for reason, count in controller.rejected.items():
+            rejected.add(count, provider=name, reason=reason)
+    return [in_flight, queued, admitted, rejected, wait]
+
+
+register_collector(_collect)
@@ -0,0 +1,328 @@
+"""
+Server-side conversation memory keyed by conversationId.
+
+Each conversation keeps a ring buffer of recent turns. Turns that fall
+out of the buffer are folded into a short rolling summary, so the
+history block handed to providers stays under a fixed token budget no
+matter how long the conversation gets.
+
+Idle conversations are evicted by TTL and LRU under a global memory
+cap. An optional SQLite file keeps conversations across restarts and is
+shared by serve.py's workers: with it, every read goes to the file (one
+primary-key lookup), since a follow-up may land on a different worker
+than the previous turn. An append reads and rewrites its conversation in
+one write transaction, so two workers appending to the same one don't
+lose a turn.
+
+Env vars:
+    CONVERSATION_MAX_TURNS: Recent turns kept verbatim (default: 6)
+    CONVERSATION_TOKEN_BUDGET: Max tokens of history per prompt (default: 400)
+    CONVERSATION_TTL: Seconds before an idle conversation is dropped (default: 1800)
+    CONVERSATION_MAX_MB: Global in-memory cap (default: 32)
+    CONVERSATION_MAX_COUNT: Max conversations held in memory (default: 10000)
+    CONVERSATION_DB: Path to a SQLite file for persistence (default: off)
+    CONVERSATION_DB_TIMEOUT: Seconds to wait for another worker's write lock (default: 1)
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Optional, Tuple
+
+from observability.logs import get_logger
+
+logger = get_logger("serving.conversations")
+
+# Rough conversion used for prompt budgeting (no tokenizer needed)
+CHARS_PER_TOKEN = 4
+
+# Fixed per-conversation overhead used for the memory estimate
+_BASE_BYTES = 512
+
+# Longest answer excerpt kept per verbatim turn
+_MAX_ANSWER_CHARS = 600
+
+
+def _first_sentence(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    for stop in (". ", "! ", "? "):
+        idx = text.find(stop)
+        if 0 < idx < limit:
+            return text[:idx + 1]
+    return text[:limit] + ("…" if len(text) > limit else "")
+
+
+def _measure(conv: "Conversation") -> int:
+    """Approximate bytes held by a conversation."""
+    return _BASE_BYTES + len(conv.summary) + sum(len(q) + len(a) for q, a in conv.turns)
+
+
+@dataclass
+class Conversation:
+    """In-memory state for one conversation."""
+    turns: Deque[Tuple[str, str]]
+    summary: str = ""
+    last_access: float = field(default_factory=time.time)
+    size_bytes: int = _BASE_BYTES
+
+
+class ConversationStore:
+    """
+    Bounded conversation memory.
+    All methods are synchronous and thread-safe. With a DB they touch the
+    file, so async code calls them through asyncio.to_thread.
+    """
+
+    def __init__(
+        self,
+        max_turns: int = 6,
+        token_budget: int = 400,
+        ttl: float = 1800.0,
+        max_bytes: int = 32 * 1024 * 1024,
+        max_conversations: int = 10000,
+        db_path: Optional[str] = None,
+        db_timeout: float = 1.0,
+    ):
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.summary_budget = max(token_budget // 4, 32)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_conversations = max_conversations
+
+        self._conversations: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._open_db(db_path, db_timeout)
+
+    # ========================================
+    # Public API
+    # ========================================
+
+    def history(self, conversation_id: str) -> str:
+        """
+        Render the history block for a prompt, newest turns first in
+        priority, bounded by the token budget.
+        """
+        with self._lock:
+            conv = self._get(conversation_id)
+        if conv is None:
+            return ""
+
+        budget = self.token_budget * CHARS_PER_TOKEN
+        summary = f"Earlier: {conv.summary}\n" if conv.summary else ""
+        budget -= len(summary)
+
+        lines = []
+        for question, answer in reversed(conv.turns):
+            line = f"User: {question}\nAssistant: {answer}\n"
+            if len(line) > budget:
+                break
+            lines.append(line)
+            budget -= len(line)
+
+        return (summary + "".join(reversed(lines))).strip()
+
+    def append(self, conversation_id: str, question: str, answer: str) -> None:
+        """Record a finished turn, compacting and evicting as needed."""
+        with self._lock:
+            if self._db is None:
+                self._append(conversation_id, question, answer)
+                return
+            # Read-modify-write under the DB's write lock
+            try:
+                self._db.execute("BEGIN IMMEDIATE")
+            except sqlite3.Error as e:
+                logger.warning("Conversation save failed", extra={"fields": {"error": str(e)}})
+                return
+            try:
+                self._append(conversation_id, question, answer)
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            try:
+                self._db.execute("COMMIT")
+            except sqlite3.Error as e:
+                logger.warning("Conversation save failed", extra={"fields": {"error": str(e)}})
+
+    def forget(self, conversation_id: str) -> None:
+        with self._lock:
+            self._forget(conversation_id)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "conversations": len(self._conversations),
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    # ========================================
+    # Internals
+    # ========================================
+
+    def _append(self, conversation_id: str, question: str, answer: str) -> None:
+        conv = self._get(conversation_id)
+        if conv is None:
+            conv = Conversation(turns=deque(maxlen=self.max_turns))
+            self._conversations[conversation_id] = conv
+            self._total_bytes += conv.size_bytes
+
+        answer = answer[:_MAX_ANSWER_CHARS]
+        if len(conv.turns) == conv.turns.maxlen:
+            self._compact(conv, conv.turns[0])
+        conv.turns.append((question, answer))
+        conv.last_access = time.time()
+        self._resize(conv)
+
+        self._save(conversation_id, conv)
+        self._evict()
+
+    def _forget(self, conversation_id: str) -> None:
+        conv = self._conversations.pop(conversation_id, None)
+        if conv is not None:
+            self._total_bytes -= conv.size_bytes
+        if self._db is not None:
+            self._db.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+
+    def _get(self, conversation_id: str) -> Optional[Conversation]:
+        if self._db is not None:
+            return self._refresh(conversation_id)
+
+        conv = self._conversations.get(conversation_id)
+        now = time.time()
+        if conv is not None:
+            if now - conv.last_access > self.ttl:
+                self._forget(conversation_id)
+                return None
+            self._conversations.move_to_end(conversation_id)
+            conv.last_access = now
+            return conv
+
+        conv = self._load(conversation_id)
+        if conv is not None:
+            self._conversations[conversation_id] = conv
+            self._total_bytes += conv.size_bytes
+            self._evict()
+        return conv
+
+    def _refresh(self, conversation_id: str) -> Optional[Conversation]:
+        """Replace the cached copy with the stored one (another worker may have appended)."""
+        cached = self._conversations.pop(conversation_id, None)
+        if cached is not None:
+            self._total_bytes -= cached.size_bytes
+        conv = self._load(conversation_id)
+        if conv is not None:
+            self._conversations[conversation_id] = conv
+            self._total_bytes += conv.size_bytes
+            self._evict()
+        return conv
+
+    def _compact(self, conv: Conversation, oldest: Tuple[str, str]) -> None:
+        """Fold the turn about to leave the ring buffer into the summary."""
+        question, answer = oldest
+        note = f"asked \"{_first_sentence(question, 80)}\" → {_first_sentence(answer, 120)}"
+        summary = f"{conv.summary} | {note}" if conv.summary else note
+
+        # Keep the most recent notes within the summary budget
+        limit = self.summary_budget * CHARS_PER_TOKEN
+        while len(summary) > limit and " | " in summary:
+            summary = summary.split(" | ", 1)[1]
+        conv.summary = summary[-limit:]
+
+    def _resize(self, conv: Conversation) -> None:
+        size = _measure(conv)
+        self._total_bytes += size - conv.size_bytes
+        conv.size_bytes = size
+
+    def _evict(self) -> None:
+        """Drop expired conversations, then least-recently-used ones over the caps."""
+        now = time.time()
+        while self._conversations:
+            conversation_id, conv = next(iter(self._conversations.items()))
+            expired = now - conv.last_access > self.ttl
+            over_cap = (
+                self._total_bytes > self.max_bytes
+                or len(self._conversations) > self.max_conversations
+            )
+            if not (expired or over_cap):
+                break
+            self._conversations.popitem(last=False)
+            self._total_bytes -= conv.size_bytes
+
+    # ========================================
+    # SQLite persistence (optional)
+    # ========================================
+
+    def _open_db(self, db_path: str, timeout: float) -> None:
+        try:
+            # Autocommit, so append() can open its own BEGIN IMMEDIATE; a
+            # short busy timeout bounds how long a locked file can hold a thread
+            self._db = sqlite3.connect(
+                db_path, timeout=timeout, isolation_level=None, check_same_thread=False
+            )
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS conversations ("
+                "id TEXT PRIMARY KEY, summary TEXT NOT NULL, "
+                "turns TEXT NOT NULL, updated REAL NOT NULL)"
+            )
+            self._db.execute("DELETE FROM conversations WHERE updated < ?", (time.time() - self.ttl,))
+        except sqlite3.Error as e:
+            logger.warning("Conversation DB disabled", extra={"fields": {"error": str(e)}})
+            self._db = None
+
+    def _save(self, conversation_id: str, conv: Conversation) -> None:
+        if self._db is None:
+            return
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO conversations (id, summary, turns, updated) VALUES (?, ?, ?, ?)",
+                (conversation_id, conv.summary, json.dumps(list(conv.turns), ensure_ascii=False), conv.last_access),
+            )
+        except sqlite3.Error as e:
+            logger.warning("Conversation save failed", extra={"fields": {"error": str(e)}})
+
+    def _load(self, conversation_id: str) -> Optional[Conversation]:
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(
+                "SELECT summary, turns, updated FROM conversations WHERE id = ?",
+                (conversation_id,),
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("Conversation load failed", extra={"fields": {"error": str(e)}})
+            return None
+        if row is None or time.time() - row[2] > self.ttl:
+            return None
+
+        turns = deque((tuple(t) for t in json.loads(row[1])), maxlen=self.max_turns)
+        conv = Conversation(turns=turns, summary=row[0], last_access=time.time())
+        conv.size_bytes = _measure(conv)
+        return conv
+
+
+# Global instance (lazy loaded)
+_store: Optional[ConversationStore] = None
+
+
+def get_conversation_store() -> ConversationStore:
+    """Return the process-wide store, configured from env on first use."""
+    global _store
+    if _store is None:
+        _store = ConversationStore(
+            max_turns=int(os.getenv("CONVERSATION_MAX_TURNS", "6")),
+            token_budget=int(os.getenv("CONVERSATION_TOKEN_BUDGET", "400")),
+            ttl=float(os.getenv("CONVERSATION_TTL", "1800")),
+            max_bytes=int(float(os.getenv("CONVERSATION_MAX_MB", "32")) * 1024 * 1024),
+            max_conversations=int(os.getenv("CONVERSATION_MAX_COUNT", "10000")),
+            db_path=os.getenv("CONVERSATION_DB") or None,
+            db_timeout=float(os.getenv("CONVERSATION_DB_TIMEOUT", "1")),
+        )
+    return _store
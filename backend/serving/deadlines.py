@@ -0,0 +1,123 @@
+"""
+Request deadlines and client-disconnect cancellation.
+
+Each chat request gets a time budget (route default, optionally
+shortened by the client's X-Request-Timeout header), counted from the
+request's arrival so lookups and retrieval are inside it. The absolute
+deadline lives in a contextvar so providers can size their own timeouts
+from what is left instead of hard-coded 60/120 s. run_cancellable()
+cancels the whole pipeline when the budget runs out or the client goes
+away.
+
+Env vars:
+    CHAT_DEADLINE: Default budget for /api/chat in seconds (default: 120)
+    BATCH_ITEM_DEADLINE: Budget per /api/chat/batch item (default: CHAT_DEADLINE)
+"""
+import asyncio
+import contextlib
+import contextvars
+import os
+import time
+from typing import Awaitable, Optional, TypeVar
+
+from fastapi import Request
+
+T = TypeVar("T")
+
+# Absolute time.monotonic() deadline for the current request, if any
+deadline_var: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+# Never hand a provider a timeout shorter than this
+MIN_TIMEOUT = 0.5
+
+
+class DeadlineExceeded(Exception):
+    """The request's time budget ran out."""
+
+
+class ClientDisconnected(Exception):
+    """The client went away before the answer was ready."""
+
+
+def route_budget(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+def request_budget(request: Request, default: float) -> float:
+    """
+    Budget for this request: the route default, or less if the client
+    asks for it via X-Request-Timeout (seconds). Clients can't extend it.
+    """
+    header = request.headers.get("x-request-timeout")
+    if header:
+        try:
+            return max(MIN_TIMEOUT, min(float(header), default))
+        except ValueError:
+            pass
+    return default
+
+
+@contextlib.contextmanager
+def deadline_scope(budget: Optional[float], started: Optional[float] = None):
+    """
+    Set the deadline for everything awaited inside the block: `budget`
+    seconds after `started` (the request's arrival, time.monotonic()),
+    or from now if not given.
+    """
+    start = time.monotonic() if started is None else started
+    token = deadline_var.set(start + budget if budget else None)
+    try:
+        yield
+    finally:
+        deadline_var.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current budget, or None without a deadline."""
+    deadline = deadline_var.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def timeout_for(default: float) -> float:
+    """Provider timeout: `default`, capped by what is left of the budget."""
+    left = remaining()
+    if left is None:
+        return default
+    return max(MIN_TIMEOUT, min(default, left))
+
+
+async def _wait_for_disconnect(request: Request) -> None:
+    # The body has been read already, so the next ASGI message we get is
+    # http.disconnect (sent when the client closes the connection)
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def run_cancellable(request: Request, work: Awaitable[T], timeout: Optional[float]) -> T:
+    """
+    Await `work`, cancelling it if `timeout` passes or the client
+    disconnects. Cancellation propagates into the provider (closing the
+    upstream HTTP request or stopping local generation).
+    """
+    task = asyncio.ensure_future(work)
+    watcher = asyncio.ensure_future(_wait_for_disconnect(request))
+    try:
+        done, _ = await asyncio.wait(
+            {task, watcher}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+        )
+        if task in done:
+            return task.result()
+
+        task.cancel()
+        # Let the provider run its cleanup (e.g. cancelling upstream work)
+        with contextlib.suppress(asyncio.CancelledError, Exception):
+            await task
+        if watcher in done:
+            raise ClientDisconnected()
+        raise DeadlineExceeded()
+    finally:
+        watcher.cancel()
@@ -0,0 +1,262 @@
+"""
+Materialized answers for canonical prompts.
+
+The sample prompts and Welcome-screen quick asks make up a large share
+of traffic. Their answers are generated in the background whenever the
+portfolio version changes, stored with their links and chips, and served
+directly by /api/chat on an exact match.
+
+Regeneration is rate-limited, and with several workers only the one
+holding the file lock regenerates; the others pick up the stored file.
+A run where some prompts failed (provider error, shed under load) keeps
+the answers it got but leaves the version stale and unsaved, so the
+missing ones are retried after MATERIALIZE_MIN_INTERVAL.
+
+Env vars:
+    MATERIALIZE_ENABLED: true/false (default: true)
+    MATERIALIZE_PROMPTS_PATH: JSON list of {"question", "section"} (default: portfolio/canonical_prompts.json)
+    MATERIALIZE_MIN_INTERVAL: Min seconds between regeneration runs (default: 300)
+"""
+import asyncio
+import json
+import os
+import pathlib
+import re
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from observability.logs import get_logger
+from retrieval.store import ROOT, portfolio_version
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process election, every process regenerates
+    fcntl = None
+
+logger = get_logger("serving.materialize")
+
+PROMPTS_PATH = ROOT / "portfolio" / "canonical_prompts.json"
+STORE_PATH = ROOT / "portfolio" / "materialized.json"
+
+# (question, section) -> response dict with answer, links, chips
+Generator = Callable[[str, Optional[str]], Awaitable[dict]]
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_prompt(question: str) -> str:
+    """Key used for exact matching: case, quotes, spacing and end punctuation."""
+    q = question.replace("’", "'").replace("“", '"').replace("”", '"')
+    q = _SPACES.sub(" ", q).strip().lower()
+    return q.rstrip(" ?.!")
+
+
+class AnswerMaterializer:
+    """Background-generated answers for a fixed list of prompts."""
+
+    def __init__(
+        self,
+        generate: Generator,
+        prompts_path: pathlib.Path = PROMPTS_PATH,
+        store_path: pathlib.Path = STORE_PATH,
+        min_interval: float = 300.0,
+    ):
+        self.generate = generate
+        self.prompts_path = prompts_path
+        self.store_path = store_path
+        self.min_interval = min_interval
+
+        self._answers: Dict[Tuple[str, Optional[str]], dict] = {}
+        self._version = ""
+        self._partial: Dict[Tuple[str, Optional[str]], dict] = {}  # from a run with failures
+        self._partial_version = ""
+        self._store_mtime = 0.0
+        self._last_run = float("-inf")
+        self._task: Optional[asyncio.Task] = None
+
+    # ========================================
+    # Request path
+    # ========================================
+
+    def lookup(self, question: str, section: Optional[str]) -> Optional[dict]:
+        """Return the stored response for an exact prompt match, if fresh."""
+        version = portfolio_version()
+        key = (normalize_prompt(question), section)
+        if self._version != version:
+            self._load_store(version)
+            if self._version != version:
+                self.ensure_fresh()
+                # A run with failures still serves the answers it got
+                return self._partial.get(key) if self._partial_version == version else None
+        return self._answers.get(key)
+
+    def ensure_fresh(self) -> None:
+        """Schedule regeneration if answers are stale. Never blocks."""
+        if self._task is not None and not self._task.done():
+            return
+        if self._version == portfolio_version():
+            return
+        delay = max(0.0, self._last_run + self.min_interval - time.monotonic())
+        try:
+            self._task = asyncio.get_running_loop().create_task(self._regenerate(delay))
+        except RuntimeError:
+            pass  # no running loop (e.g. called from a script)
+
+    def stats(self) -> dict:
+        return {
+            "answers": len(self._answers),
+            "partial": len(self._partial) if self._partial_version == portfolio_version() else 0,
+            "version": self._version,
+            "regenerating": self._task is not None and not self._task.done(),
+        }
+
+    # ========================================
+    # Regeneration
+    # ========================================
+
+    def _prompts(self) -> List[Tuple[str, Optional[str]]]:
+        try:
+            with open(self.prompts_path, encoding="utf-8") as f:
+                return [(p["question"], p.get("section")) for p in json.load(f)]
+        except Exception as e:
+            logger.warning("Could not read canonical prompts", extra={"fields": {"error": str(e)}})
+            return []
+
+    async def _regenerate(self, delay: float) -> None:
+        if delay:
+            await asyncio.sleep(delay)
+        self._last_run = time.monotonic()
+
+        with _ElectionLock(self.store_path.with_suffix(".lock")) as leader:
+            version = portfolio_version()
+            if not leader or self._load_store(version):
+                # Another worker is (or was) on it; pick up its file later
+                return
+
+            started = time.perf_counter()
+            # Answers a failed run already got for this version are kept
+            answers = dict(self._partial) if self._partial_version == version else {}
+            failed = 0
+            for question, section in self._prompts():
+                key = (normalize_prompt(question), section)
+                if key in answers:
+                    continue
+                try:
+                    response = await self.generate(question, section)
+                except Exception as e:
+                    logger.warning(
+                        "Materialization failed",
+                        extra={"fields": {"question": question, "error": str(e)}}
+                    )
+                    failed += 1
+                    continue
+                # Providers report failures as answer text; don't pin those
+                if response["answer"].startswith("⚠️"):
+                    failed += 1
+                    continue
+                answers[key] = response
+
+            if portfolio_version() != version:
+                return  # changed while generating; the next request reschedules
+
+            fields = {
+                "answers": len(answers), "failed": failed, "version": version,
+                "seconds": round(time.perf_counter() - started, 2),
+            }
+            if failed:
+                # Serve what we have, but stay stale (and unsaved) so the
+                # missing answers are retried after min_interval
+                self._partial, self._partial_version = answers, version
+                logger.warning("Materialized canonical answers partially", extra={"fields": fields})
+            else:
+                self._answers, self._version = answers, version
+                self._partial, self._partial_version = {}, ""
+                self._save_store()
+                logger.info("Materialized canonical answers", extra={"fields": fields})
+
+        if failed:
+            # Once this task is done, so ensure_fresh() doesn't see it running
+            asyncio.get_running_loop().call_soon(self.ensure_fresh)
+
+    # ========================================
+    # Shared file (between workers and restarts)
+    # ========================================
+
+    def _load_store(self, version: str) -> bool:
+        """Adopt the stored answers if they match `version`."""
+        try:
+            mtime = self.store_path.stat().st_mtime
+        except OSError:
+            return False
+        if mtime == self._store_mtime:
+            return self._version == version
+        try:
+            with open(self.store_path, encoding="utf-8") as f:
+                stored = json.load(f)
+        except Exception:
+            return False
+        self._store_mtime = mtime
+        if stored.get("version") != version:
+            return False
+        self._answers = {
+            (item["key"], item.get("section")): item["response"] for item in stored["answers"]
+        }
+        self._version = version
+        return True
+
+    def _save_store(self) -> None:
+        payload = {
+            "version": self._version,
+            "answers": [
+                {"key": key, "section": section, "response": response}
+                for (key, section), response in self._answers.items()
+            ],
+        }
+        tmp = self.store_path.with_suffix(".tmp")
+        try:
+            tmp.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self.store_path)
+            self._store_mtime = self.store_path.stat().st_mtime
+        except OSError as e:
+            logger.warning("Could not save materialized answers", extra={"fields": {"error": str(e)}})
+
+
+class _ElectionLock:
+    """Non-blocking exclusive file lock; `leader` is False if someone else holds it."""
+
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+        self.fd = None
+
+    def __enter__(self) -> bool:
+        if fcntl is None:
+            return True
+        self.fd = os.open(self.path, os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def __exit__(self, *exc):
+        if self.fd is not None:
+            os.close(self.fd)  # releases the lock
+            self.fd = None
+
+
+# Global instance (set up by main)
+_materializer: Optional[AnswerMaterializer] = None
+
+
+def get_materializer(generate: Generator) -> Optional[AnswerMaterializer]:
+    """Return the process-wide materializer, or None when disabled."""
+    global _materializer
+    if os.getenv("MATERIALIZE_ENABLED", "true").lower() != "true":
+        return None
+    if _materializer is None:
+        _materializer = AnswerMaterializer(
+            generate,
+            prompts_path=pathlib.Path(os.getenv("MATERIALIZE_PROMPTS_PATH", str(PROMPTS_PATH))),
+            min_interval=float(os.getenv("MATERIALIZE_MIN_INTERVAL", "300")),
+        )
+    return _materializer
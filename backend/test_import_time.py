@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Cold-start check: time from importing main in a fresh interpreter to an
+app that has run its startup handlers (interpreter start-up itself isn't
+counted), and which modules got imported on the way. The developer's
+.env isn't loaded, so only the settings below apply.
+
+Fails if the app takes longer than the budget to become ready, or if a
+heavy optional dependency is imported for a configuration that doesn't
+use it (rule_based provider, RAG off).
+
+Usage (from backend/):
+    python test_import_time.py                 # prints the slowest imports too
+    python -m pytest test_import_time.py
+
+Env vars:
+    STARTUP_BUDGET_S: Max seconds to a ready app (default: 3.0)
+"""
+import os
+import re
+import subprocess
+import sys
+
+BACKEND = os.path.dirname(os.path.abspath(__file__))
+BUDGET_S = float(os.getenv("STARTUP_BUDGET_S", "3.0"))
+
+# Never needed with PROVIDER=rule_based and ENABLE_RAG=false
+FORBIDDEN = ("httpx", "torch", "transformers", "sentence_transformers", "faiss", "onnxruntime", "tokenizers")
+
+# Import the app and run its startup handlers, as uvicorn would, without
+# reading backend/.env; prints the seconds that took
+READY = (
+    "import asyncio, time, dotenv; dotenv.load_dotenv = lambda *args, **kwargs: False; "
+    "started = time.perf_counter(); import main; asyncio.run(main.app.router.startup()); "
+    "print(time.perf_counter() - started)"
+)
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def measure_startup(env_overrides=None):
+    """Run READY in a fresh interpreter. Returns (seconds, {module: cumulative µs})."""
+    env = dict(
+        os.environ,
+        PROVIDER="rule_based",
+        ENABLE_RAG="false",
+        MATERIALIZE_ENABLED="false",
+        PYTHONPATH=BACKEND,
+        **(env_overrides or {}),
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", READY],
+        cwd=BACKEND, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"App failed to start:\n{result.stderr[-2000:]}")
+    elapsed = float(result.stdout.strip().splitlines()[-1])
+
+    imports = {}
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            imports[match.group(4)] = int(match.group(2))
+    return elapsed, imports
+
+
+def _top_level(imports):
+    return {name.split(".")[0] for name in imports}
+
+
+def test_startup_within_budget():
+    elapsed, _ = measure_startup()
+    assert elapsed <= BUDGET_S, f"App ready after {elapsed:.2f}s (budget {BUDGET_S:.2f}s)"
+
+
+def test_no_heavy_imports_for_rule_based():
+    _, imports = measure_startup()
+    loaded = _top_level(imports) & set(FORBIDDEN)
+    assert not loaded, f"Imported at startup without being needed: {', '.join(sorted(loaded))}"
+
+
+if __name__ == "__main__":
+    elapsed, imports = measure_startup()
+    print(f"App ready in {elapsed:.2f}s (budget {BUDGET_S:.2f}s)")
+    print("\nSlowest imports (cumulative):")
+    roots = {name: us for name, us in imports.items() if "." not in name}
+    for name, us in sorted(roots.items(), key=lambda item: -item[1])[:15]:
+        print(f"   {us / 1000:8.1f} ms  {name}")
+
+    loaded = _top_level(imports) & set(FORBIDDEN)
+    if loaded:
+        print(f"\n❌ Unneeded heavy imports: {', '.join(sorted(loaded))}")
+    if elapsed > BUDGET_S or loaded:
+        sys.exit(1)
+    print("\n✅ Within budget")
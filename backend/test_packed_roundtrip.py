@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Round-trip check for portfolio.pack: a pack compiled from portfolio.json
+must decode to exactly the same data (whole, per section and per list
+item), carry the same version hash, and decode only what is accessed.
+The store must prefer an up-to-date pack and fall back to the JSON when
+the pack is stale.
+
+Usage (from backend/):
+    python test_packed_roundtrip.py
+    python -m pytest test_packed_roundtrip.py
+"""
+import json
+import os
+import pathlib
+import sys
+import tempfile
+
+from retrieval import store
+from retrieval.packed import PackedPortfolio, check, compile_pack, source_version
+
+BACKEND = pathlib.Path(__file__).resolve().parent
+SOURCE = BACKEND / "portfolio" / "portfolio.json"
+
+# Non-ASCII, escapes, nesting, empty and non-list sections
+EDGE_CASES = {
+    "about": "Data engineer — “quotes”, tabs\tand\nnewlines, emoji 🚀, \\ backslash",
+    "skills": [{"name": "C++", "level": "advanced"}, {"name": "Zürich ML", "tags": ["ä", "ß", "日本"]}],
+    "projects": [],
+    "experience": [{"company": "A", "achievements": [{"metric": 1.5e-3, "ok": True, "none": None}]}],
+    "links": {"email": "a@b.c", "nested": {"deep": [1, [2, [3]]]}},
+    "count": 3,
+}
+
+
+def _compile(data, directory: pathlib.Path):
+    source = directory / "portfolio.json"
+    source.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    target = directory / "portfolio.pack"
+    compile_pack(source, target)
+    return source, target
+
+
+def _assert_faithful(source: pathlib.Path, target: pathlib.Path):
+    expected = json.loads(source.read_bytes())
+    packed = PackedPortfolio(target)
+    assert packed.version == source_version(source.read_bytes())
+    assert list(packed) == list(expected)
+    for name, value in expected.items():
+        if isinstance(value, list):
+            assert packed.item_count(name) == len(value)
+            assert [packed.item(name, i) for i in range(len(value))] == value
+    assert dict(packed) == expected
+    assert check(source, target) == []
+
+
+def test_real_portfolio_round_trips():
+    with tempfile.TemporaryDirectory() as tmp:
+        source = pathlib.Path(tmp) / "portfolio.json"
+        source.write_bytes(SOURCE.read_bytes())
+        target = pathlib.Path(tmp) / "portfolio.pack"
+        compile_pack(source, target)
+        _assert_faithful(source, target)
+
+
+def test_edge_cases_round_trip():
+    with tempfile.TemporaryDirectory() as tmp:
+        _assert_faithful(*_compile(EDGE_CASES, pathlib.Path(tmp)))
+
+
+def test_sections_decode_lazily():
+    with tempfile.TemporaryDirectory() as tmp:
+        _, target = _compile(EDGE_CASES, pathlib.Path(tmp))
+        packed = PackedPortfolio(target)
+        assert packed.loaded() == []
+        assert "skills" in packed and len(packed) == len(EDGE_CASES)
+        assert packed.item("skills", 1)["name"] == "Zürich ML"
+        assert packed.loaded() == []
+        assert packed["links"] is packed["links"]
+        assert packed.loaded() == ["links"]
+        # Full walks (search index, snapshot) don't keep the section either
+        assert list(store.section_items(packed, "skills")) == EDGE_CASES["skills"]
+        assert list(store.section_items(packed, "links")) == []
+        assert packed.loaded() == ["links"]
+
+
+def test_store_prefers_fresh_pack():
+    original_path = store.PORTFOLIO_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        source, target = _compile(EDGE_CASES, pathlib.Path(tmp))
+        store.PORTFOLIO_PATH = source
+        try:
+            data = store.reload_portfolio()
+            assert isinstance(data, PackedPortfolio)
+            assert store.portfolio_version() == source_version(source.read_bytes())
+            assert json.loads(store.keyword_context(None, "tell me everything")) == EDGE_CASES
+
+            # Edited JSON, stale pack: the JSON wins until the pack is rebuilt
+            stat = target.stat()
+            os.utime(source, (stat.st_atime, stat.st_mtime + 10))
+            data = store.load_portfolio()
+            assert isinstance(data, dict) and data == EDGE_CASES
+        finally:
+            store.PORTFOLIO_PATH = original_path
+            store.reload_portfolio()
+
+
+def test_store_checks_pack_source_size():
+    original_path = store.PORTFOLIO_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        source, target = _compile(EDGE_CASES, pathlib.Path(tmp))
+        # Same-age files, different content: the mtime check alone passes
+        edited = {**EDGE_CASES, "count": 4000}
+        source.write_text(json.dumps(edited, ensure_ascii=False, indent=2), encoding="utf-8")
+        stat = target.stat()
+        os.utime(source, (stat.st_atime, stat.st_mtime))
+        store.PORTFOLIO_PATH = source
+        try:
+            data = store.reload_portfolio()
+            assert isinstance(data, dict) and data == edited
+        finally:
+            store.PORTFOLIO_PATH = original_path
+            store.reload_portfolio()
+
+
+def test_rejects_foreign_files():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = pathlib.Path(tmp) / "portfolio.pack"
+        path.write_bytes(b'{"not": "a pack"}')
+        try:
+            PackedPortfolio(path)
+        except ValueError:
+            return
+        raise AssertionError("opened a file without the pack header")
+
+
+if __name__ == "__main__":
+    tests = [(name, fn) for name, fn in sorted(globals().items()) if name.startswith("test_")]
+    failed = 0
+    for name, fn in tests:
+        try:
+            fn()
+            print(f"✅ {name}")
+        except Exception as e:
+            failed += 1
+            print(f"❌ {name}: {type(e).__name__}: {e}")
+    sys.exit(1 if failed else 0)
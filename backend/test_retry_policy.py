@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Checks for the shared upstream retry policy (providers/retry.py) against
+httpx MockTransport servers: busy answers are retried and then served,
+streamed error bodies are read before they are inspected, out-of-credit
+429s and an empty retry budget are not retried, HF cold starts retry at
+once with the loading option, and resolved model aliases stick.
+
+Usage (from backend/):
+    python test_retry_policy.py
+    python -m pytest test_retry_policy.py
+"""
+import asyncio
+import json
+import sys
+
+import httpx
+
+from providers import retry
+
+# Keep backoff sleeps negligible
+retry.BASE_DELAY = 0.001
+
+
+class _Body(httpx.AsyncByteStream):
+    """A body that has to be streamed (not pre-read like content=...)."""
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    async def __aiter__(self):
+        yield self.data
+
+
+def _server(*responses):
+    """MockTransport answering with `responses` in turn (the last one repeats)."""
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        status, body, headers = responses[min(len(calls), len(responses)) - 1]
+        return httpx.Response(status, headers=headers, stream=_Body(body))
+
+    return httpx.MockTransport(handler), calls
+
+
+async def _send(transport, provider: str, **kwargs) -> httpx.Response:
+    async with httpx.AsyncClient(transport=transport) as client:
+        response = await retry.send(client, "POST", "http://upstream/v1", provider=provider, **kwargs)
+        try:
+            # Consume it the way the streaming providers do
+            body = b"".join([chunk async for chunk in response.aiter_bytes()])
+        finally:
+            await response.aclose()
+        return response, body
+
+
+def test_streamed_busy_answer_is_retried():
+    transport, calls = _server(
+        (429, b'{"error": "rate limited"}', {"retry-after-ms": "1"}),
+        (200, b"data: hello\n\n", {}),
+    )
+    response, body = asyncio.run(_send(transport, "test_busy", stream=True))
+    assert response.status_code == 200 and body == b"data: hello\n\n"
+    assert len(calls) == 2
+
+
+def test_streamed_quota_429_is_returned_not_raised():
+    error = b'{"error": {"code": "insufficient_quota"}}'
+    transport, calls = _server((429, error, {"content-type": "application/json"}))
+    response, body = asyncio.run(_send(transport, "test_quota", stream=True))
+    assert response.status_code == 429 and body == error
+    assert len(calls) == 1
+
+
+def test_empty_budget_fails_fast():
+    budget = retry.get_budget("test_budget")
+    budget.balance = 0
+    budget.ratio = 0
+    transport, calls = _server((503, b"busy", {}), (200, b"ok", {}))
+    response, _ = asyncio.run(_send(transport, "test_budget"))
+    assert response.status_code == 503 and len(calls) == 1
+    assert retry.stats()["test_budget"]["gave_up_budget"] == 1
+
+
+def test_hf_cold_start_retries_with_wait_for_model():
+    loading = json.dumps({"error": "Model x is currently loading", "estimated_time": 20.0}).encode()
+    transport, calls = _server(
+        (503, loading, {"content-type": "application/json"}),
+        (200, b'[{"generated_text": "hi"}]', {}),
+    )
+
+    def wait_for_model(request: dict) -> None:
+        request["json"]["options"] = {"wait_for_model": True}
+
+    payload = {"inputs": "q", "options": {"wait_for_model": False}}
+    response, _ = asyncio.run(_send(transport, "test_hf", json=payload, on_loading=wait_for_model))
+    assert response.status_code == 200
+    assert [json.loads(c.content)["options"]["wait_for_model"] for c in calls] == [False, True]
+
+
+def test_model_aliases_are_remembered():
+    assert retry.resolved_model("test_alias", "llama3.2") == "llama3.2"
+    retry.remember_alias("test_alias", "llama3.2", "llama3.2:latest")
+    assert retry.resolved_model("test_alias", "llama3.2") == "llama3.2:latest"
+
+
+if __name__ == "__main__":
+    tests = [(name, fn) for name, fn in sorted(globals().items()) if name.startswith("test_")]
+    failed = 0
+    for name, fn in tests:
+        try:
+            fn()
+            print(f"✅ {name}")
+        except Exception as e:
+            failed += 1
+            print(f"❌ {name}: {type(e).__name__}: {e}")
+    sys.exit(1 if failed else 0)
@@ -23,7 +23,7 @@ export default function App() {
   useEffect(() => {
     const loadProfile = async () => {
       try {
-        const data = await apiSections();
+        const data = await apiSections(['about', 'experience', 'education']);
         setProfileData({
           name: data.about?.name || 'John Doe',
           role: data.about?.role || 'Data Scientist',
@@ -11,8 +11,10 @@ export async function apiChat({ question, section, conversationId }) {
   return res.json();               // ← { answer, links[], chips[] }
 }
 
-export async function apiSections() {
-  const res = await fetch(`${API_BASE}/api/sections`);
+export async function apiSections(fields) {
+  // fields: optional list of top-level sections to fetch (default: all)
+  const query = fields?.length ? `?fields=${encodeURIComponent(fields.join(','))}` : '';
+  const res = await fetch(`${API_BASE}/api/sections${query}`);
   if (!res.ok) throw new Error('Sections API failed');
-  return res.json();               // ← full portfolio JSON
+  return res.json();               // ← portfolio JSON (only requested sections)
 }
\ No newline at end of file